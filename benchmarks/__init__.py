@@ -0,0 +1,6 @@
+"""
+Бенчмарки сервиса рекомендаций.
+
+Запуск из корня проекта, например:
+    python -m benchmarks.bench_user_lookup
+"""
@@ -0,0 +1,99 @@
+"""
+Отбор кандидатов по границам скора против полного скоринга каталога
+при росте числа постов.
+
+Для каждого масштаба (кратного --posts) строятся три сервиса с нативным
+оценщиком: без отбора, с точным и с приближённым отбором. Снимаются
+задержки recommend_post_ids, доля посчитанных постов, число
+расхождений точного режима с полным скорингом и recall@limit
+приближённого.
+
+    python -m benchmarks.bench_candidates --scales 1 3 10 \\
+        --out data/benchmarks/candidates.json
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.results import latency_summary, write_results
+from benchmarks.synthetic import make_data_loader, make_requests
+from config.constants import MODELS_DIR
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_loader import load_model
+from src.utils.recommendation_service import RecommendationService
+
+MODES = ("full", "exact", "approx")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=7023, help="Catalog size at scale 1")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--likes", type=int, default=400000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=2000, help="Posts scored in approx mode")
+    parser.add_argument("--model", default=str(MODELS_DIR / "catboost_min_features.cbm"))
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    model = load_model(args.model, scorer="native")
+    sections = {}
+    for scale in args.scales:
+        n_posts = args.posts * scale
+        data_loader = make_data_loader(n_posts, args.users, args.likes)
+        requests = make_requests(data_loader.user_features, args.requests)
+
+        services, build_seconds = {}, {}
+        for mode in MODES:
+            started = time.perf_counter()
+            services[mode] = RecommendationService(
+                data_loader, model, FeatureProcessor(),
+                candidate_mode=None if mode == "full" else mode, candidate_budget=args.budget
+            )
+            build_seconds[mode] = round(time.perf_counter() - started, 3)
+
+        section = {"posts": n_posts, "blocks": services["exact"].candidate_index.n_blocks}
+        answers = {}
+        for mode, service in services.items():
+            # Прогрев: буферы потока
+            for user_id, request_time in requests[:20]:
+                service.recommend_post_ids(user_id, request_time, args.limit)
+            scored_before = service.metrics.counter("candidates_scored")
+            latencies, answers[mode] = [], []
+            for user_id, request_time in requests:
+                started = time.perf_counter()
+                answers[mode].append(service.recommend_post_ids(user_id, request_time, args.limit))
+                latencies.append(time.perf_counter() - started)
+            scored = service.metrics.counter("candidates_scored") - scored_before
+            section[mode] = dict(
+                latency_summary(latencies),
+                build_seconds=build_seconds[mode],
+                scored_share=round(scored / len(requests) / n_posts, 4) if mode != "full" else 1.0
+            )
+
+        section["exact_mismatches"] = sum(a != b for a, b in zip(answers["full"], answers["exact"]))
+        section["approx_recall"] = round(float(np.mean([
+            len(set(a) & set(b)) / len(a) if a else 1.0
+            for a, b in zip(answers["full"], answers["approx"])
+        ])), 4)
+        sections[f"posts_{n_posts}"] = section
+
+        print(f"posts: {n_posts}, blocks: {section['blocks']}, "
+              f"exact mismatches: {section['exact_mismatches']}, "
+              f"approx recall@{args.limit}: {section['approx_recall']}")
+        for mode in MODES:
+            latency = section[mode]
+            print(f"  {mode:6s} p50 {latency['p50_ms']:8.3f} ms, p99 {latency['p99_ms']:8.3f} ms, "
+                  f"scored {latency['scored_share'] * 100:5.1f}%, "
+                  f"build {latency['build_seconds']:.2f} s")
+
+    if args.out:
+        write_results(args.out, sections, parameters=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Обновление лайков: полная перезагрузка liked_posts против LikeIngester
+на локальной SQLite вместо PostgreSQL.
+
+История из --history лайков пишется в feed_data с индексом по времени,
+затем добавляются --new событий, и сравнивается время полной загрузки
+лайков и одного прохода LikeIngester.poll.
+
+    python -m benchmarks.bench_like_ingestion --history 1000000 --new 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from benchmarks.synthetic import make_likes, make_post_features, make_user_features
+from src.utils.like_index import LikeIndex, LiveLikeIndex
+from src.utils.like_ingester import LikeIngester
+
+FEED_TABLE = "feed_data"
+START = pd.Timestamp("2021-10-01")
+
+
+def feed_events(likes: pd.DataFrame, first_second: int, seconds: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    offsets = rng.integers(first_second, first_second + seconds, len(likes))
+    return likes.assign(timestamp=START + pd.to_timedelta(offsets, unit="s"),
+                        action="like", target=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history", type=int, default=1000000)
+    parser.add_argument("--new", type=int, default=1000)
+    args = parser.parse_args()
+
+    users = make_user_features(20000)
+    posts = make_post_features(7023, mean_words=1)
+    history = feed_events(make_likes(users, posts, args.history, seed=1), 0, 86400 * 60, seed=1)
+    new = feed_events(make_likes(users, posts, args.new, seed=2), 86400 * 60, 3600, seed=2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sa.create_engine(f"sqlite:///{os.path.join(tmp, 'feed.db')}")
+        history.to_sql(FEED_TABLE, engine, index=False, chunksize=100000)
+        with engine.begin() as conn:
+            conn.execute(f"CREATE INDEX feed_ts ON {FEED_TABLE} (timestamp, user_id, post_id)")
+
+        started = time.perf_counter()
+        liked = pd.read_sql(
+            f"SELECT DISTINCT post_id, user_id FROM {FEED_TABLE} WHERE action='like'", engine
+        )
+        like_index = LiveLikeIndex(LikeIndex.from_pairs(liked['user_id'], liked['post_id']))
+        full_time = time.perf_counter() - started
+
+        watermark = history['timestamp'].max().to_pydatetime()
+        new.to_sql(FEED_TABLE, engine, index=False, if_exists="append")
+
+        ingester = LikeIngester(engine, like_index, FEED_TABLE, watermark)
+        started = time.perf_counter()
+        added = ingester.poll()
+        poll_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        like_index.compact()
+        compact_time = time.perf_counter() - started
+
+    print(f"history: {len(history)} likes, new events: {len(new)}, new likes: {added}")
+    print(f"full reload of liked_posts: {full_time * 1e3:10.1f} ms")
+    print(f"LikeIngester.poll:          {poll_time * 1e3:10.1f} ms")
+    print(f"delta compaction:           {compact_time * 1e3:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
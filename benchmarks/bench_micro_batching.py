@@ -0,0 +1,83 @@
+"""
+Пропускная способность и задержки с micro-batching и без него.
+
+Клиентские потоки шлют одиночные запросы в течение --duration секунд.
+Для каждого уровня параллелизма печатаются throughput, p50 и p99, что
+позволяет сравнить пропускную способность при одинаковом p99.
+
+    python -m benchmarks.bench_micro_batching --concurrency 1 8 32
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_data_loader, make_requests
+from config.constants import MODELS_DIR
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.micro_batcher import MicroBatcher
+from src.utils.model_loader import load_model
+from src.utils.recommendation_service import RecommendationService
+
+
+def run_load(target, requests: list, concurrency: int, duration: float) -> dict:
+    """Гоняет запросы из concurrency потоков и собирает задержки"""
+    latencies = [[] for _ in range(concurrency)]
+    stop_at = time.perf_counter() + duration
+
+    def client(worker: int):
+        i = worker
+        while time.perf_counter() < stop_at:
+            user_id, request_time = requests[i % len(requests)]
+            started = time.perf_counter()
+            target.get_recommendations(user_id, request_time, 5)
+            latencies[worker].append(time.perf_counter() - started)
+            i += concurrency
+
+    threads = [threading.Thread(target=client, args=(w,)) for w in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    values = np.concatenate([np.asarray(x) for x in latencies]) * 1000
+    return {
+        "throughput_rps": len(values) / elapsed,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=3.0)
+    args = parser.parse_args()
+
+    loader = make_data_loader(args.posts, args.users, n_likes=args.users * 20)
+    model = load_model(str(MODELS_DIR / "catboost_min_features.cbm"))
+    service = RecommendationService(loader, model, FeatureProcessor())
+    requests = make_requests(loader.user_features, 10000)
+
+    batcher = MicroBatcher(lambda: service, args.max_batch_size, args.max_wait_ms)
+    batcher.start()
+
+    print(f"{'mode':<10}{'clients':>8}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for concurrency in args.concurrency:
+        for mode, target in (("direct", service), ("batched", batcher)):
+            stats = run_load(target, requests, concurrency, args.duration)
+            print(f"{mode:<10}{concurrency:>8}{stats['throughput_rps']:>10.1f}"
+                  f"{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    print(f"mean batch size: {batcher.mean_batch_size:.1f}")
+    batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Несколько моделей через ModelRegistry против отдельного сервиса на модель:
+прирост RSS на построение, задержки по моделям и время замены модели
+под нагрузкой.
+
+Модели - варианты базовой модели с разным числом деревьев (shrink),
+запросы маршрутизируются по exp_group по кругу между ними.
+
+    python -m benchmarks.bench_model_registry --models 3 --scorer native \\
+        --out data/benchmarks/registry.json
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import psutil
+from catboost import CatBoostClassifier
+
+from benchmarks.results import latency_summary, write_results
+from benchmarks.synthetic import make_data_loader, make_requests
+from config.constants import MODELS_DIR
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_loader import load_model
+from src.utils.model_registry import DEFAULT_MODEL, EXP_GROUP, ModelRegistry
+from src.utils.recommendation_service import RecommendationService
+
+
+def rss_mb() -> float:
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+def make_models(base_path: str, n_models: int, directory: str) -> dict:
+    """Варианты базовой модели: первые n_trees * (i + 1) / n_models деревьев"""
+    base = CatBoostClassifier()
+    base.load_model(base_path)
+    paths = {}
+    for i in range(n_models):
+        name = DEFAULT_MODEL if i == 0 else f"model{i}"
+        model = base.copy()
+        model.shrink(ntree_end=max(1, base.tree_count_ * (n_models - i) // n_models))
+        paths[name] = os.path.join(directory, f"{name}.cbm")
+        model.save_model(paths[name])
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--users", type=int, default=163205)
+    parser.add_argument("--likes", type=int, default=1000000)
+    parser.add_argument("--models", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--scorer", choices=["catboost", "native"], default="native")
+    parser.add_argument("--model", default=str(MODELS_DIR / "catboost_min_features.cbm"))
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    data_loader = make_data_loader(args.posts, args.users, args.likes)
+    features = FeatureProcessor()
+    requests = make_requests(data_loader.user_features, args.requests)
+    exp_groups = sorted({str(data_loader.user_store.get(user_id)[EXP_GROUP])
+                         for user_id, _ in requests})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_models(args.model, args.models, tmp)
+        names = list(paths)
+        routes = {group: names[i % len(names)] for i, group in enumerate(exp_groups)}
+
+        # Сначала отдельные сервисы, затем реестр; оба остаются в памяти,
+        # поэтому приросты RSS не перекрываются
+        started_rss = rss_mb()
+        separate = {name: RecommendationService(data_loader, load_model(path, args.scorer),
+                                                features)
+                    for name, path in paths.items()}
+        separate_mb = rss_mb() - started_rss
+
+        started_rss = rss_mb()
+        models = ModelRegistry(features.prepare_posts(data_loader.post_features), paths,
+                               routes=routes, scorer=args.scorer)
+        service = RecommendationService(data_loader, models, features)
+        for name in names:
+            models.get(name)
+        registry_mb = rss_mb() - started_rss
+
+        # Задержки по моделям: запрос и модель, в которую он попал
+        for user_id, request_time in requests[:20]:
+            service.recommend_post_ids(user_id, request_time, args.limit)
+        latencies = defaultdict(list)
+        mismatches = 0
+        for user_id, request_time in requests:
+            name = models.route(data_loader.user_store.get(user_id)[EXP_GROUP])
+            started = time.perf_counter()
+            post_ids = service.recommend_post_ids(user_id, request_time, args.limit)
+            latencies[name].append(time.perf_counter() - started)
+            expected = separate[name].recommend_post_ids(user_id, request_time, args.limit)
+            mismatches += post_ids != expected
+
+        # Замена модели по умолчанию, пока другие потоки обслуживают запросы
+        stop = threading.Event()
+        errors = []
+
+        def load():
+            while not stop.is_set():
+                for user_id, request_time in requests[:50]:
+                    try:
+                        service.recommend_post_ids(user_id, request_time, args.limit)
+                    except Exception as e:
+                        errors.append(repr(e))
+
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        swaps = []
+        for _ in range(3):
+            started = time.perf_counter()
+            models.swap(DEFAULT_MODEL)
+            swaps.append(time.perf_counter() - started)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    model_stats = models.stats()
+    sections = {
+        "memory": {
+            "separate_services_mb": round(separate_mb, 1),
+            "registry_mb": round(registry_mb, 1),
+        },
+        "models": {
+            name: dict(latency_summary(latencies[name]),
+                       post_bytes=model_stats[name]["post_bytes"],
+                       model_bytes=model_stats[name]["model_bytes"])
+            for name in names
+        },
+        "swap": dict(latency_summary(swaps), errors=len(errors)),
+        "mismatches": {"count": mismatches},
+    }
+
+    print(f"posts: {args.posts}, models: {args.models}, scorer: {args.scorer}, "
+          f"routes: {routes}")
+    print(f"RSS growth: separate services {separate_mb:.1f} MB, registry {registry_mb:.1f} MB")
+    for name in names:
+        latency = sections["models"][name]
+        print(f"  {name:8s} requests {latency['count']:5d}, p50 {latency['p50_ms']:8.3f} ms, "
+              f"p99 {latency['p99_ms']:8.3f} ms, post arrays {latency['post_bytes'] / 2 ** 20:.1f} MB")
+    print(f"swap under load: p50 {sections['swap']['p50_ms']:.1f} ms, "
+          f"request errors {len(errors)}, mismatches with separate services {mismatches}")
+
+    if args.out:
+        write_results(args.out, sections, parameters=vars(args))
+
+
+if __name__ == "__main__":
+    main()
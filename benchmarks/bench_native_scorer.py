@@ -0,0 +1,69 @@
+"""
+Скоринг всего каталога: CatBoost predict_proba против ObliviousTreeScorer
+с предрасчитанной постовой частью.
+
+    python -m benchmarks.bench_native_scorer --posts 7023 --requests 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_data_loader, make_requests
+from config.constants import MODELS_DIR
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_loader import load_model
+from src.utils.oblivious_scorer import ObliviousTreeScorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--model", default=str(MODELS_DIR / "catboost_min_features.cbm"))
+    args = parser.parse_args()
+
+    data_loader = make_data_loader(n_posts=args.posts, n_users=args.users)
+    model = load_model(args.model, scorer="catboost")
+    features = FeatureProcessor()
+    post_matrix = features.prepare_posts(data_loader.post_features)
+
+    started = time.perf_counter()
+    scorer = ObliviousTreeScorer(model)
+    prepared = scorer.prepare_posts(post_matrix)
+    prepare_time = time.perf_counter() - started
+
+    keys = [
+        (data_loader.user_store.get(user_id), features.time_features(request_time))
+        for user_id, request_time in make_requests(data_loader.user_features, args.requests)
+    ]
+
+    # Прогрев: кэш битов категорий и пулы потоков CatBoost
+    max_diff = 0.0
+    for key in keys:
+        expected = model.predict_proba(post_matrix.fill(*key))[:, 1]
+        max_diff = max(max_diff, float(np.abs(prepared.predict(*key) - expected).max()))
+
+    started = time.perf_counter()
+    for key in keys:
+        model.predict_proba(post_matrix.fill(*key))
+    catboost_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key in keys:
+        prepared.predict(*key)
+    native_time = time.perf_counter() - started
+
+    print(f"posts: {args.posts}, requests: {args.requests}, "
+          f"trees: {scorer.n_trees} (depth {scorer.depth}), "
+          f"per-request trees: {len(prepared.dynamic_trees)}")
+    print(f"conversion + post precompute: {prepare_time * 1e3:8.1f} ms")
+    print(f"CatBoost predict_proba:       {catboost_time / len(keys) * 1e3:8.2f} ms/request")
+    print(f"native scorer:                {native_time / len(keys) * 1e3:8.2f} ms/request")
+    print(f"speedup:                      {catboost_time / native_time:8.1f}x")
+    print(f"max |diff| of probabilities:  {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
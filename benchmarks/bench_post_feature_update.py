@@ -0,0 +1,101 @@
+"""
+Обновление views/view_reach: полный GROUP BY по feed_data, как в ноутбуке,
+против PostFeatureUpdater на локальной SQLite вместо PostgreSQL.
+
+В feed_data пишется --history просмотров с индексом по времени, состояние
+строится bootstrap, затем добавляются --new событий и сравнивается время
+полного пересчёта и одного прохода poll_views + update_table.
+Ошибка view_reach считается относительно точного COUNT(DISTINCT).
+
+    python -m benchmarks.bench_post_feature_update --history 2000000 --new 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from benchmarks.synthetic import make_post_features, make_user_features
+from src.modeling.text_features import TextFeatureModel
+from src.utils.post_feature_updater import PostFeatureUpdater, PostViewState
+
+FEED_TABLE = "feed_data"
+POSTS_TABLE = "post_text_df"
+START = pd.Timestamp("2021-10-01")
+FULL_QUERY = f"""
+    SELECT post_id, COUNT(*) AS views, COUNT(DISTINCT user_id) AS view_reach
+    FROM {FEED_TABLE} WHERE action = 'view' GROUP BY post_id
+"""
+
+
+def view_events(users: pd.DataFrame, posts: pd.DataFrame, n_events: int,
+                first_second: int, seconds: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    popularity = rng.pareto(1.5, len(posts)) + 1
+    return pd.DataFrame({
+        'timestamp': START + pd.to_timedelta(
+            rng.integers(first_second, first_second + seconds, n_events), unit="s"),
+        'user_id': rng.choice(users['user_id'].to_numpy(), n_events),
+        'post_id': rng.choice(posts['post_id'].to_numpy(), n_events,
+                              p=popularity / popularity.sum()),
+        'action': "view",
+        'target': 0,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--history", type=int, default=2000000)
+    parser.add_argument("--new", type=int, default=10000)
+    args = parser.parse_args()
+
+    users = make_user_features(20000)
+    posts = make_post_features(7023, mean_words=20)
+    history = view_events(users, posts, args.history, 0, 86400 * 60, seed=1)
+    new = view_events(users, posts, args.new, 86400 * 60, 3600, seed=2)
+    # В синтетическом словаре 14 слов, поэтому компонент меньше, чем в ноутбуке
+    text_model = TextFeatureModel.fit(posts['text'].tolist(), n_components=10)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sa.create_engine(f"sqlite:///{os.path.join(tmp, 'feed.db')}")
+        history.to_sql(FEED_TABLE, engine, index=False, chunksize=100000)
+        posts[['post_id', 'text', 'topic']].to_sql(POSTS_TABLE, engine, index=False)
+        with engine.begin() as conn:
+            conn.execute(f"CREATE INDEX feed_ts ON {FEED_TABLE} (timestamp, user_id, post_id)")
+
+        started = time.perf_counter()
+        state = PostViewState.bootstrap(engine, FEED_TABLE)
+        bootstrap_time = time.perf_counter() - started
+        updater = PostFeatureUpdater(engine, state, text_model,
+                                     feed_table=FEED_TABLE, posts_table=POSTS_TABLE)
+        updater.poll_views()
+
+        new.to_sql(FEED_TABLE, engine, index=False, if_exists="append")
+
+        started = time.perf_counter()
+        exact = pd.read_sql(FULL_QUERY, engine)
+        full_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        events = updater.poll_views()
+        updated = updater.update_table(posts)
+        update_time = time.perf_counter() - started
+
+    updated = updated.set_index('post_id').loc[exact['post_id']]
+    assert (updated['views'].to_numpy() == exact['views'].to_numpy()).all()
+    error = np.abs(updated['view_reach'].to_numpy() - exact['view_reach'].to_numpy())
+    relative = error / exact['view_reach'].to_numpy()
+
+    print(f"history: {len(history)} views, new events: {events}, "
+          f"sketches: {state.sketches.nbytes / 2 ** 20:.1f} MB")
+    print(f"bootstrap (once):            {bootstrap_time * 1e3:10.1f} ms")
+    print(f"full GROUP BY over feed:     {full_time * 1e3:10.1f} ms")
+    print(f"poll_views + update_table:   {update_time * 1e3:10.1f} ms")
+    print(f"view_reach relative error:   mean {relative.mean():.4f}, max {relative.max():.4f}")
+
+
+if __name__ == "__main__":
+    main()
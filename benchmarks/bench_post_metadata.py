@@ -0,0 +1,81 @@
+"""
+Память и скорость поиска: post_details (to_dict('index')) против
+PostMetadataStore.
+
+Память считается через tracemalloc как прирост аллокаций при построении
+структуры. Строки текстов в dict разделяются с DataFrame, а хранилище
+держит JSON-фрагменты постов (те же, из которых собирается ответ API,
+так что отдельной копии текстов для ответа нет), зато DataLoader после
+его построения удаляет колонку text из post_features; поэтому
+сравниваются и итоги "таблица + кэш" до и после.
+
+    python -m benchmarks.bench_post_metadata --posts 7023
+"""
+import argparse
+import gc
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import make_post_features
+from src.utils.post_metadata import PostMetadataStore
+
+
+def traced(build):
+    """Строит объект и возвращает его вместе с приростом памяти в байтах"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--mean-words", type=int, default=250)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=5, help="Posts per response")
+    args = parser.parse_args()
+
+    post_features = make_post_features(args.posts, mean_words=args.mean_words)
+    post_features['topic'] = post_features['topic'].astype('category')
+
+    post_details, dict_bytes = traced(
+        lambda: post_features.set_index('post_id').to_dict('index')
+    )
+    store, store_bytes = traced(lambda: PostMetadataStore.from_frame(post_features))
+
+    # Поиск, как в RecommendationService.to_posts: по limit постов за ответ
+    rng = np.random.default_rng(0)
+    ids = rng.choice(post_features['post_id'].to_numpy(), args.lookups).tolist()
+    responses = [ids[i:i + args.limit] for i in range(0, len(ids), args.limit)]
+    for post_id in ids[:1000]:
+        details = post_details[post_id]
+        assert store.get(post_id) == (details['text'], details['topic'])
+
+    dict_time = timeit.timeit(lambda: [
+        [(post_details[i]['text'], post_details[i]['topic']) for i in response]
+        for response in responses
+    ], number=1)
+    store_time = timeit.timeit(lambda: [store.get_many(response) for response in responses],
+                               number=1)
+
+    frame_bytes = post_features.memory_usage(deep=True).sum()
+    text_bytes = post_features['text'].memory_usage(deep=True, index=False)
+    print(f"posts: {args.posts}, mean words: {args.mean_words}, "
+          f"post_features (deep): {frame_bytes / 2 ** 20:.1f} MB, "
+          f"of which text: {text_bytes / 2 ** 20:.1f} MB")
+    print(f"post_details dict:   {dict_bytes / 2 ** 20:8.2f} MB, "
+          f"{dict_time / len(responses) * 1e6:6.2f} us/response")
+    print(f"PostMetadataStore:   {store_bytes / 2 ** 20:8.2f} MB "
+          f"(fragments {store.nbytes / 2 ** 20:.2f} MB), "
+          f"{store_time / len(responses) * 1e6:6.2f} us/response")
+    print(f"post_features + cache: {(frame_bytes + dict_bytes) / 2 ** 20:6.2f} MB before, "
+          f"{(frame_bytes - text_bytes + store_bytes) / 2 ** 20:6.2f} MB after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Стоимость сериализации ответа: PostGet + response_model FastAPI
+против конкатенации предсериализованных JSON-фрагментов.
+
+Прежний путь повторяет то, что делает FastAPI с результатом обработчика:
+создание PostGet в сервисе, валидация по response_model,
+jsonable_encoder и JSONResponse.
+
+    python -m benchmarks.bench_serialization --mean-words 1000 --limit 5
+"""
+import argparse
+import timeit
+from typing import List
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import parse_obj_as
+
+from benchmarks.synthetic import make_post_features
+from src.api.schemas import PostGet
+from src.utils.id_index import IdIndex
+from src.utils.post_payloads import PostPayloadStore
+
+
+def pydantic_response(post_details: dict, post_ids: List[int]) -> bytes:
+    """Прежний путь: RecommendationService._to_posts и обработка response_model"""
+    posts = [
+        PostGet(id=post_id, text=post_details[post_id]['text'],
+                topic=post_details[post_id]['topic'])
+        for post_id in post_ids
+        if post_id in post_details
+    ]
+    return JSONResponse(jsonable_encoder(parse_obj_as(List[PostGet], posts))).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--mean-words", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--responses", type=int, default=2000)
+    args = parser.parse_args()
+
+    post_features = make_post_features(args.posts, mean_words=args.mean_words)
+    post_details = post_features.set_index('post_id').to_dict('index')
+    store = PostPayloadStore.from_frame(
+        post_features, IdIndex(post_features['post_id'].to_numpy())
+    )
+
+    rng = np.random.default_rng(0)
+    responses = [
+        rng.choice(post_features['post_id'].to_numpy(), args.limit, replace=False).tolist()
+        for _ in range(args.responses)
+    ]
+    for post_ids in responses[:100]:
+        assert pydantic_response(post_details, post_ids) == store.to_json(post_ids)
+
+    old_time = timeit.timeit(
+        lambda: [pydantic_response(post_details, ids) for ids in responses], number=1
+    )
+    new_time = timeit.timeit(lambda: [store.to_json(ids) for ids in responses], number=1)
+
+    mean_bytes = np.mean([len(store.to_json(ids)) for ids in responses])
+    print(f"posts: {args.posts}, mean words: {args.mean_words}, limit: {args.limit}, "
+          f"mean response: {mean_bytes / 1024:.1f} KB")
+    print(f"PostGet + response_model: {old_time / args.responses * 1e6:10.1f} us/response")
+    print(f"pre-serialized fragments: {new_time / args.responses * 1e6:10.1f} us/response")
+    print(f"speedup:                  {old_time / new_time:10.1f}x")
+    print(f"fragment store:           {store.nbytes / 2 ** 20:10.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Задержки каждой стадии RecommendationService.get_recommendations по
+отдельности и целиком, время старта и пиковый RSS процесса.
+
+Стадии: атрибуты пользователя, временные фичи, заполнение матрицы
+признаков (только CatBoost), скоринг, исключение лайков с топ-N,
+сборка ответа (to_posts и to_json). Данные берутся из синтетических
+таблиц в памяти или, с --db-url, загружаются из БД benchmarks.make_db.
+
+    python -m benchmarks.bench_service_stages --requests 500 --scorer native \\
+        --out data/benchmarks/stages.json
+"""
+import argparse
+import resource
+import time
+from collections import defaultdict
+
+from benchmarks.results import latency_summary, write_results
+from benchmarks.synthetic import make_data_loader, make_requests
+from config.constants import MODELS_DIR
+from src.utils.data_loader import DataLoader
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_loader import load_model
+from src.utils.recommendation_service import RecommendationService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", help="Load data from this database instead of memory")
+    parser.add_argument("--feed-table", default="feed_data")
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--users", type=int, default=163205)
+    parser.add_argument("--likes", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--scorer", choices=["catboost", "native"], default="catboost")
+    parser.add_argument("--model", default=str(MODELS_DIR / "catboost_min_features.cbm"))
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    startup = {}
+    started = time.perf_counter()
+    if args.db_url:
+        data_loader = DataLoader(args.db_url, feed_table=args.feed_table)
+        data_loader.load_features()
+    else:
+        data_loader = make_data_loader(args.posts, args.users, args.likes)
+    startup["data_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    model = load_model(args.model, scorer=args.scorer)
+    startup["model_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    features = FeatureProcessor()
+    service = RecommendationService(data_loader, model, features)
+    startup["service_seconds"] = time.perf_counter() - started
+    startup = {name: round(value, 3) for name, value in startup.items()}
+    startup["total_seconds"] = round(sum(startup.values()), 3)
+
+    requests = make_requests(data_loader.user_features, args.requests)
+    # Прогрев: буферы потока, пулы CatBoost
+    for user_id, request_time in requests[:20]:
+        service.get_recommendations(user_id, request_time, args.limit)
+
+    stages = defaultdict(list)
+    clock = time.perf_counter
+    for user_id, request_time in requests:
+        t0 = clock()
+        user_attributes = data_loader.user_store.get(user_id)
+        t1 = clock()
+        time_values = features.time_features(request_time)
+        t2 = clock()
+        if service.post_scorer is not None:
+            t3 = t2
+            scores = service.post_scorer.predict(user_attributes, time_values)
+        else:
+            matrix = service.post_matrix.fill(user_attributes, time_values)
+            t3 = clock()
+            scores = model.predict_proba(matrix)[:, 1]
+        t4 = clock()
+        post_ids = service._top_post_ids(user_id, scores, args.limit)
+        t5 = clock()
+        service.to_posts(post_ids)
+        t6 = clock()
+        service.to_json(post_ids)
+        t7 = clock()
+
+        stages["user_lookup"].append(t1 - t0)
+        stages["time_features"].append(t2 - t1)
+        if service.post_scorer is None:
+            stages["feature_fill"].append(t3 - t2)
+        stages["scoring"].append(t4 - t3)
+        stages["exclude_top_n"].append(t5 - t4)
+        stages["to_posts"].append(t6 - t5)
+        stages["to_json"].append(t7 - t6)
+
+    for name, method in (("end_to_end", service.get_recommendations),
+                         ("end_to_end_json", service.get_recommendations_json)):
+        for user_id, request_time in requests:
+            started = clock()
+            method(user_id, request_time, args.limit)
+            stages[name].append(clock() - started)
+
+    summary = {name: latency_summary(values) for name, values in stages.items()}
+    peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 1)
+
+    print(f"posts: {len(service.post_ids)}, users: {len(data_loader.user_store)}, "
+          f"scorer: {args.scorer}, requests: {len(requests)}")
+    print(f"startup: {startup}")
+    for name, latency in summary.items():
+        print(f"{name:16s} p50 {latency['p50_ms']:8.3f} ms, p95 {latency['p95_ms']:8.3f} ms, "
+              f"p99 {latency['p99_ms']:8.3f} ms")
+    print(f"peak RSS: {peak_rss_mb} MB")
+
+    if args.out:
+        write_results(args.out, {
+            "startup": startup,
+            "stages": summary,
+            "memory": {"peak_rss_mb": peak_rss_mb},
+        }, parameters=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Пропускная способность TextAnalyzer: analyze по одному тексту против
+потокового analyze_batch (nlp.pipe, общий prefilter-regex, одна
+токенизация на метрики) в одном и нескольких процессах.
+
+Тексты - синтетические посты, в часть которых вставлены телефоны,
+даты, ссылки, упоминания и обрезка "... read more". Перед замером
+проверяется, что analyze_batch возвращает то же, что analyze.
+
+С --cache дополнительно меряется инкрементальный прогон с кэшем
+результатов на диске: холодный кэш, затем повтор после правки
+--edited-share текстов.
+
+    python -m benchmarks.bench_text_analyzer --posts 200000 --processes 1 4
+    python -m benchmarks.bench_text_analyzer --cache /tmp/text_analysis.db
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_post_texts
+from experimental.features.analysis_cache import TextAnalysisCache
+from experimental.features.experimental_text_analyzer import TextAnalyzer
+
+SPECIAL = ["+1 (900) 555-1234", "12/05/2021", "the 1980s", "@user", "#sport",
+           "https://t.co/abc", "mail@example.com", "... read more https://t.co/xyz"]
+
+
+def make_texts(n_posts: int, mean_words: int, special_share: float, seed: int = 42) -> list:
+    rng = np.random.default_rng(seed)
+    texts = make_post_texts(n_posts, seed=seed, mean_words=mean_words)
+    for i in np.flatnonzero(rng.random(n_posts) < special_share):
+        texts[i] = f"{texts[i]} {rng.choice(SPECIAL)}"
+    return texts
+
+
+def docs_per_second(run, n_texts: int) -> float:
+    started = time.perf_counter()
+    run()
+    return n_texts / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200000)
+    parser.add_argument("--mean-words", type=int, default=40)
+    parser.add_argument("--special-share", type=float, default=0.3,
+                        help="Share of posts with phones, dates, links etc.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--single-posts", type=int, default=20000,
+                        help="Posts for the slow per-text baseline")
+    parser.add_argument("--cache", help="Cache file for the incremental run; removed first")
+    parser.add_argument("--edited-share", type=float, default=0.05)
+    args = parser.parse_args()
+
+    analyzer = TextAnalyzer()
+    texts = make_texts(args.posts, args.mean_words, args.special_share)
+    sample = texts[:1000]
+    assert analyzer.analyze_batch(sample, batch_size=args.batch_size) == \
+        [analyzer.analyze(text) for text in sample]
+
+    baseline = texts[:args.single_posts]
+    rate = docs_per_second(lambda: [analyzer.analyze(text) for text in baseline], len(baseline))
+    print(f"{'analyze per text':32s} {rate:10.0f} docs/s")
+    for n_process in args.processes:
+        rate = docs_per_second(
+            lambda: sum(1 for _ in analyzer.iter_analyze(texts, batch_size=args.batch_size,
+                                                         n_process=n_process)),
+            len(texts)
+        )
+        print(f"{f'analyze_batch n_process={n_process}':32s} {rate:10.0f} docs/s")
+
+    if args.cache:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.cache + suffix):
+                os.remove(args.cache + suffix)
+        rng = np.random.default_rng(0)
+        edited = list(texts)
+        for i in np.flatnonzero(rng.random(len(texts)) < args.edited_share):
+            edited[i] += " edited"
+        for name, run_texts in (("cold cache", texts), ("edited", edited)):
+            with TextAnalysisCache(args.cache) as cache:
+                rate = docs_per_second(
+                    lambda: sum(1 for _ in analyzer.iter_analyze(
+                        run_texts, batch_size=args.batch_size, cache=cache)),
+                    len(run_texts)
+                )
+                print(f"{f'cache, {name}':32s} {rate:10.0f} docs/s  {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Пиковая память analyze_dataframe: результат словарями по строкам
+(списки в ячейках, pd.concat со всем входом) против колоночного режима
+(columnar_path: пачки по --chunk-size строк на диск, к датафрейму -
+только числовые колонки).
+
+Каждый вариант запускается в отдельном процессе, чтобы пиковый RSS
+(ru_maxrss) не смешивался.
+
+    python -m benchmarks.bench_text_columns --posts 200000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_text_analyzer import make_texts
+from experimental.features.experimental_text_analyzer import TextAnalyzer
+
+
+def run(args, columnar: bool, results):
+    df = pd.DataFrame({"post_id": range(args.posts),
+                       "text": make_texts(args.posts, args.mean_words, args.special_share)})
+    analyzer = TextAnalyzer()
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        result = analyzer.analyze_dataframe(
+            df, "text", columnar_path=os.path.join(tmp, "columns") if columnar else None,
+            chunk_size=args.chunk_size
+        )
+        seconds = time.perf_counter() - started
+        results[columnar] = (seconds, base_rss,
+                             resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                             int(result.memory_usage(deep=True).sum()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200000)
+    parser.add_argument("--mean-words", type=int, default=40)
+    parser.add_argument("--special-share", type=float, default=0.3)
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    args = parser.parse_args()
+
+    results = multiprocessing.Manager().dict()
+    for columnar in (False, True):
+        process = multiprocessing.Process(target=run, args=(args, columnar, results))
+        process.start()
+        process.join()
+
+    for columnar, name in ((False, "row dicts + pd.concat"), (True, "columnar, numeric join")):
+        seconds, base, peak, frame = results[columnar]
+        print(f"{name:28s} {seconds:8.2f} s, peak RSS {peak / 2 ** 20:8.1f} MB "
+              f"(input {base / 2 ** 20:.1f} MB), result frame {frame / 2 ** 20:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Память и время обучения текстовых фич: вариант ноутбука (плотная матрица,
+PCA + KMeans) против разреженного (TruncatedSVD + MiniBatchKMeans).
+
+Тексты уже лемматизированы: слова из синтетического словаря --vocabulary
+с распределением Ципфа. Каждый вариант запускается в отдельном процессе,
+чтобы пиковый RSS (ru_maxrss) не смешивался.
+
+    python -m benchmarks.bench_text_features --posts 7023 --vocabulary 50000
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+from src.modeling.text_features import fit_text_features
+
+
+def make_lemmas(n_posts: int, vocabulary: int, mean_words: int, seed: int = 42) -> list:
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    lengths = rng.poisson(mean_words, n_posts) + 1
+    ranks = (rng.zipf(1.2, lengths.sum()) - 1) % vocabulary
+    texts = np.split(words[ranks], np.cumsum(lengths)[:-1])
+    return [" ".join(text) for text in texts]
+
+
+def run(args, dense: bool, results):
+    lemmas = make_lemmas(args.posts, args.vocabulary, args.mean_words)
+    started = time.perf_counter()
+    _, tfidf_matrix, _ = fit_text_features(lemmas, dense=dense)
+    results[dense] = (time.perf_counter() - started,
+                      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                      tfidf_matrix.shape)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--mean-words", type=int, default=250)
+    args = parser.parse_args()
+
+    results = multiprocessing.Manager().dict()
+    for dense in (True, False):
+        process = multiprocessing.Process(target=run, args=(args, dense, results))
+        process.start()
+        process.join()
+
+    shape = results[False][2]
+    print(f"posts: {shape[0]}, vocabulary: {shape[1]}, "
+          f"dense matrix would be {shape[0] * shape[1] * 8 / 2 ** 20:.0f} MB")
+    for dense, name in ((True, "dense PCA + KMeans (notebook)"),
+                        (False, "sparse TruncatedSVD + MiniBatchKMeans")):
+        seconds, peak, _ = results[dense]
+        print(f"{name:40s} {seconds:8.2f} s, peak RSS {peak / 2 ** 20:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
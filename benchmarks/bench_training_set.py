@@ -0,0 +1,111 @@
+"""
+Память и время сборки обучающей выборки: merge всей feed_data в памяти,
+как в notebooks/training.ipynb, против TrainingSetBuilder на локальной
+SQLite вместо PostgreSQL.
+
+Каждый вариант запускается в отдельном процессе, чтобы пиковый RSS
+(ru_maxrss) не смешивался. Вариант ноутбука сохраняет выборку pickle,
+как в ноутбуке, TrainingSetBuilder - шардами.
+
+    python -m benchmarks.bench_training_set --events 2000000 --chunksize 200000
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from benchmarks.synthetic import make_post_features, make_user_features
+from src.modeling.build_training_set import TrainingSetBuilder
+
+FEED_TABLE = "feed_data"
+
+
+def make_feed(users: pd.DataFrame, posts: pd.DataFrame, n_events: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp("2021-10-01")
+        + pd.to_timedelta(rng.integers(0, 86400 * 90, n_events), unit="s"),
+        'user_id': rng.choice(users['user_id'].to_numpy(), n_events),
+        'post_id': rng.choice(posts['post_id'].to_numpy(), n_events),
+        'action': "view",
+        'target': (rng.random(n_events) < 0.12).astype(np.int64),
+    })
+
+
+def notebook(engine, posts, users, out):
+    feed_df = pd.read_sql(f"SELECT * FROM {FEED_TABLE} WHERE action = 'view'", engine,
+                          parse_dates=["timestamp"])
+    df = feed_df.merge(posts, on='post_id')
+    df = df.merge(users, on='user_id')
+    df['request_hour'] = df.timestamp.dt.hour
+    df['request_day_of_week'] = df.timestamp.dt.weekday
+    df['request_month'] = df.timestamp.dt.month
+    df['request_week'] = df.timestamp.dt.isocalendar().week.astype('int')
+    df['is_weekend'] = (df['request_day_of_week'] >= 5).astype(int)
+    df['time_of_day'] = pd.cut(
+        df['request_hour'], bins=[0, 6, 12, 18, 24],
+        labels=['night', 'morning', 'afternoon', 'evening'],
+        include_lowest=True, right=False
+    ).fillna('night')
+    with open(os.path.join(out, "training_set.pkl"), "wb") as f:
+        pickle.dump(df, f)
+    return len(df)
+
+
+def run(name, db_path, out, chunksize, results):
+    engine = sa.create_engine(f"sqlite:///{db_path}")
+    posts = make_post_features(7023, mean_words=250)
+    users = make_user_features()
+    started = time.perf_counter()
+    if name == "notebook":
+        rows = notebook(engine, posts, users, out)
+    else:
+        builder = TrainingSetBuilder(engine, posts.drop(columns=['text']), users,
+                                     feed_table=FEED_TABLE, chunksize=chunksize)
+        manifest = builder.build(os.path.join(out, "training_set"))
+        rows = sum(shard["rows"] for shard in manifest["shards"])
+    results[name] = (rows, time.perf_counter() - started,
+                     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--chunksize", type=int, default=200000)
+    args = parser.parse_args()
+
+    results = multiprocessing.Manager().dict()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "feed.db")
+        engine = sa.create_engine(f"sqlite:///{db_path}")
+        feed = make_feed(make_user_features(), make_post_features(7023, mean_words=1),
+                         args.events)
+        feed.to_sql(FEED_TABLE, engine, index=False, chunksize=100000)
+        with engine.begin() as conn:
+            conn.execute(f"CREATE INDEX feed_ts ON {FEED_TABLE} (timestamp)")
+        del feed
+
+        for name in ("notebook", "builder"):
+            process = multiprocessing.Process(
+                target=run, args=(name, db_path, tmp, args.chunksize, results)
+            )
+            process.start()
+            process.join()
+
+    print(f"view events: {args.events}, chunksize: {args.chunksize}")
+    for name, title in (("notebook", "merge in memory + pickle (notebook)"),
+                        ("builder", "TrainingSetBuilder shards")):
+        rows, seconds, peak = results[name]
+        print(f"{title:38s} {rows:9d} rows {seconds:8.1f} s, "
+              f"peak RSS {peak / 2 ** 20:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
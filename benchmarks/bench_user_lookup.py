@@ -0,0 +1,51 @@
+"""
+Сравнение поиска пользователя: скан pandas против UserFeatureStore.
+
+    python -m benchmarks.bench_user_lookup --users 163205 --lookups 2000
+"""
+import argparse
+import timeit
+
+import numpy as np
+
+from benchmarks.synthetic import make_user_features
+from src.utils.user_store import UserFeatureStore
+
+
+def pandas_lookup(user_features, user_id):
+    """Прежний код RecommendationService"""
+    if user_id not in user_features['user_id'].values:
+        return None
+    return user_features[user_features['user_id'] == user_id].iloc[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=163205)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    user_features = make_user_features(args.users)
+    store = UserFeatureStore(user_features)
+
+    rng = np.random.default_rng(0)
+    ids = rng.choice(user_features['user_id'].to_numpy(), args.lookups).tolist()
+    ids[::10] = [-1] * len(ids[::10])  # часть запросов - неизвестные пользователи
+
+    for user_id in ids[:100]:
+        expected = pandas_lookup(user_features, user_id)
+        actual = store.get(user_id)
+        assert (expected is None) == (actual is None)
+
+    pandas_time = timeit.timeit(lambda: [pandas_lookup(user_features, i) for i in ids], number=1)
+    store_time = timeit.timeit(lambda: [store.get(i) for i in ids], number=1)
+
+    print(f"users: {args.users}, lookups: {args.lookups}")
+    print(f"pandas scan:       {pandas_time / args.lookups * 1e6:10.1f} us/lookup")
+    print(f"UserFeatureStore:  {store_time / args.lookups * 1e6:10.1f} us/lookup")
+    print(f"speedup:           {pandas_time / store_time:10.1f}x")
+    print(f"store memory:      {store.nbytes / 2 ** 20:10.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Нагрузочный тест API повтором запросов из файла.
+
+Запросы (JSON Lines с полями id и time, см. benchmarks.make_db) шлются
+на /post/recommendations/ из --concurrency потоков, у каждого своё
+keep-alive соединение. С --serve сервис поднимается в дочернем процессе
+uvicorn на переданных DB_URL/MODEL_PATH и переменных окружения: тогда
+измеряются время старта до готовности /health и пиковый RSS сервиса.
+
+    python -m benchmarks.load_test --serve --db-url sqlite:///data/bench.db \\
+        --replay data/bench_requests.jsonl --concurrency 1 8 32 --requests 2000 \\
+        --out data/benchmarks/load.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import psutil
+
+from benchmarks.results import latency_summary, write_results
+from config.constants import MODELS_DIR
+
+ENDPOINT = "/post/recommendations/"
+
+
+def read_replay(path: str, limit: Optional[int] = None) -> List[Tuple[int, str]]:
+    """Запросы (id, time) из файла повтора"""
+    with open(path) as f:
+        lines = itertools.islice(f, limit) if limit else f
+        return [(item["id"], item["time"]) for item in map(json.loads, lines)]
+
+
+def run_load(base_url: str, requests: List[Tuple[int, str]], concurrency: int,
+             n_requests: int, limit: int = 5, timeout: float = 30.0) -> Dict:
+    """
+    Шлёт n_requests запросов из concurrency потоков по кругу по файлу повтора.
+
+    :return: Задержки p50/p95/p99, пропускная способность и число ошибок
+    """
+    url = urlsplit(base_url)
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    errors: Dict[str, int] = {}
+    errors_lock = threading.Lock()
+    counter = itertools.count()
+
+    def client(worker: int):
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+        while True:
+            i = next(counter)
+            if i >= n_requests:
+                break
+            user_id, request_time = requests[i % len(requests)]
+            path = ENDPOINT + "?" + urlencode({"id": user_id, "time": request_time, "limit": limit})
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                status = str(response.status)
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                status = type(e).__name__
+            if status == "200":
+                latencies[worker].append(time.perf_counter() - started)
+            else:
+                with errors_lock:
+                    errors[status] = errors.get(status, 0) + 1
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(w,)) for w in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(len(values) for values in latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "ok": ok,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2) if elapsed else 0.0,
+        "latency": latency_summary(itertools.chain.from_iterable(latencies)),
+    }
+
+
+class ServerProcess:
+    """Сервис в дочернем процессе uvicorn с замером старта и пикового RSS"""
+
+    def __init__(self, port: int, env: Dict[str, str], poll_interval: float = 0.05):
+        self.port = port
+        self.env = env
+        self.poll_interval = poll_interval
+        self.process: Optional[subprocess.Popen] = None
+        self.startup_seconds: Optional[float] = None
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def rss(self) -> int:
+        """RSS процесса сервиса вместе с дочерними"""
+        try:
+            process = psutil.Process(self.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes)
+        except psutil.Error:
+            return 0
+
+    def _sample(self):
+        while not self._stop.wait(self.poll_interval):
+            self.peak_rss = max(self.peak_rss, self.rss())
+
+    def start(self, timeout: float = 600.0):
+        """Запускает сервис и ждёт, пока /health не ответит status=ok"""
+        started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "src.api.main:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            env={**os.environ, **self.env}
+        )
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+        while time.perf_counter() - started < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            if self._health().get("status") == "ok":
+                self.startup_seconds = time.perf_counter() - started
+                return
+            time.sleep(self.poll_interval)
+        self.stop()
+        raise TimeoutError(f"Server was not ready in {timeout:.0f}s")
+
+    def _health(self) -> Dict:
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=1)
+        try:
+            connection.request("GET", "/health")
+            return json.loads(connection.getresponse().read())
+        except (OSError, ValueError, http.client.HTTPException):
+            return {}
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replay", required=True, help="Request replay file (JSON Lines)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000",
+                        help="Running service; ignored with --serve")
+    parser.add_argument("--serve", action="store_true", help="Start the service with uvicorn")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--db-url", help="DB_URL for the started service")
+    parser.add_argument("--feed-table", default="feed_data")
+    parser.add_argument("--model", default=str(MODELS_DIR / "catboost_min_features.cbm"))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per level")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args()
+
+    requests = read_replay(args.replay)
+    server = None
+    base_url = args.url
+    if args.serve:
+        env = {"MODEL_PATH": args.model, "FEED_TABLE": args.feed_table}
+        if args.db_url:
+            env["DB_URL"] = args.db_url
+        server = ServerProcess(args.port, env)
+        server.start()
+        base_url = server.base_url
+        print(f"startup: {server.startup_seconds:.2f} s, RSS {server.rss() / 2 ** 20:.1f} MB")
+
+    try:
+        run_load(base_url, requests, max(args.concurrency), args.warmup, args.limit)
+        levels = []
+        for concurrency in args.concurrency:
+            result = run_load(base_url, requests, concurrency, args.requests, args.limit)
+            levels.append(result)
+            latency = result["latency"]
+            print(f"concurrency {concurrency:3d}: {result['throughput_rps']:8.1f} rps, "
+                  f"p50 {latency.get('p50_ms', 0):7.1f} ms, p95 {latency.get('p95_ms', 0):7.1f} ms, "
+                  f"p99 {latency.get('p99_ms', 0):7.1f} ms, errors {result['errors']}")
+    finally:
+        if server is not None:
+            server.stop()
+
+    sections = {"load": {f"concurrency_{level['concurrency']}": level for level in levels}}
+    if server is not None:
+        sections["server"] = {
+            "startup_seconds": round(server.startup_seconds, 3),
+            "peak_rss_mb": round(server.peak_rss / 2 ** 20, 1),
+        }
+        print(f"peak RSS: {sections['server']['peak_rss_mb']} MB")
+    if args.out:
+        write_results(args.out, sections, parameters=vars(args))
+
+
+if __name__ == "__main__":
+    main()
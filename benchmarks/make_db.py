@@ -0,0 +1,97 @@
+"""
+Синтетическая БД для нагрузочного теста: таблицы постов и пользователей
+с именами DataLoader по умолчанию и feed_data с просмотрами и лайками.
+
+Пишет в любой URL SQLAlchemy - файл SQLite или локальный PostgreSQL.
+Дополнительно сохраняет файл запросов для повтора (JSON Lines с полями
+id и time) по просмотрам из feed_data.
+
+    python -m benchmarks.make_db --url sqlite:///data/bench.db \\
+        --users 163205 --posts 7023 --likes 1000000 --replay data/bench_requests.jsonl
+
+Сервис поднимается на этой БД с DB_URL=<url> FEED_TABLE=feed_data.
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from benchmarks.synthetic import make_feed, make_likes, make_post_features, make_user_features
+from src.utils.data_loader import DataLoader
+
+logger = logging.getLogger(__name__)
+
+FEED_TABLE = "feed_data"
+WRITE_CHUNKSIZE = 100000
+
+
+def write_database(url: str, n_posts: int = 7023, n_users: int = 163205,
+                   n_likes: int = 1000000, views_per_like: float = 8.0,
+                   seed: int = 42) -> pd.DataFrame:
+    """
+    Записывает синтетические таблицы в БД, заменяя существующие.
+
+    :return: События feed_data, из которых строится файл повтора
+    """
+    users = make_user_features(n_users, seed)
+    posts = make_post_features(n_posts, seed)
+    likes = make_likes(users, posts, n_likes, seed)
+    feed = make_feed(likes, views_per_like, seed=seed)
+
+    # Имена таблиц берутся у DataLoader, чтобы сервис читал их без настройки
+    loader = DataLoader(url, feed_table=FEED_TABLE)
+    engine = loader.engine
+    for name, df in ((loader.post_features_table, posts),
+                     (loader.user_features_table, users),
+                     (FEED_TABLE, feed)):
+        started = time.perf_counter()
+        df.to_sql(name, engine, index=False, if_exists="replace", chunksize=WRITE_CHUNKSIZE)
+        logger.info("%s: %d rows in %.1fs", name, len(df), time.perf_counter() - started)
+    with engine.begin() as conn:
+        # Индексы, на которые рассчитаны догрузка лайков и просмотров
+        conn.execute(sa.text(f"CREATE INDEX feed_time ON {FEED_TABLE} (timestamp, user_id, post_id)"))
+        conn.execute(sa.text(f"CREATE INDEX feed_action ON {FEED_TABLE} (action)"))
+    engine.dispose()
+    return feed
+
+
+def write_replay(feed: pd.DataFrame, path: str, n_requests: int, seed: int = 42) -> int:
+    """Файл повтора: случайные просмотры feed_data как запросы (id, time) по времени"""
+    views = feed[feed['action'] == 'view']
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(views), min(n_requests, len(views)), replace=False))
+    sample = views.iloc[rows]
+    with open(path, "w") as f:
+        for user_id, timestamp in zip(sample['user_id'], sample['timestamp']):
+            f.write(json.dumps({"id": int(user_id), "time": timestamp.isoformat()}) + "\n")
+    return len(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="SQLAlchemy URL of the target database")
+    parser.add_argument("--posts", type=int, default=7023)
+    parser.add_argument("--users", type=int, default=163205)
+    parser.add_argument("--likes", type=int, default=1000000)
+    parser.add_argument("--views-per-like", type=float, default=8.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replay", help="Write sampled view events as a request replay file")
+    parser.add_argument("--replay-requests", type=int, default=100000)
+    args = parser.parse_args()
+
+    feed = write_database(args.url, args.posts, args.users, args.likes,
+                          args.views_per_like, args.seed)
+    print(f"{args.url}: {args.posts} posts, {args.users} users, {len(feed)} feed events")
+    if args.replay:
+        n = write_replay(feed, args.replay, args.replay_requests, args.seed)
+        print(f"{args.replay}: {n} requests")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
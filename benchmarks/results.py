@@ -0,0 +1,129 @@
+"""
+Файл результатов бенчмарков и сравнение двух таких файлов.
+
+Результат - JSON с окружением (коммит, Python, CPU) и секциями метрик.
+Задержки хранятся в миллисекундах, память в мегабайтах, поэтому файлы
+разных коммитов сравниваются по одноимённым числовым полям.
+
+    python -m benchmarks.results base.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Метрики, для которых рост - улучшение; для остальных рост - регрессия
+HIGHER_IS_BETTER = ("throughput_rps", "requests", "ok")
+
+
+def latency_summary(seconds: Iterable[float]) -> Dict[str, float]:
+    """p50/p95/p99, среднее и максимум задержек в миллисекундах"""
+    values = np.asarray(list(seconds), dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(len(values)),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Текущий коммит рабочей копии с пометкой о незакоммиченных изменениях"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def environment() -> Dict:
+    """Окружение запуска для сравнения результатов между коммитами"""
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: str, sections: Dict[str, Dict], parameters: Dict = None):
+    """Записывает секции метрик вместе с окружением и параметрами запуска"""
+    results = {"environment": environment(), "parameters": parameters or {}}
+    results.update(sections)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Числовые поля вложенных секций с ключами вида section.metric"""
+    flat = {}
+    for key, value in results.items():
+        if key in ("environment", "parameters"):
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(base: Dict, new: Dict, threshold: float = 0.1) -> list:
+    """
+    Сравнивает одноимённые метрики двух результатов.
+
+    :param threshold: Относительное ухудшение, начиная с которого метрика
+        помечается как регрессия
+    :return: Строки (метрика, база, новое, изменение, регрессия)
+    """
+    base_flat, new_flat = flatten(base), flatten(new)
+    rows = []
+    for name in sorted(base_flat.keys() & new_flat.keys()):
+        old, value = base_flat[name], new_flat[name]
+        change = (value - old) / old if old else 0.0
+        worse = -change if name.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+        rows.append((name, old, value, change, worse > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base: {base['environment'].get('commit')}, new: {new['environment'].get('commit')}")
+    rows = compare(base, new, args.threshold)
+    for name, old, value, change, regression in rows:
+        mark = "REGRESSION" if regression else ""
+        print(f"{name:50s} {old:12.3f} {value:12.3f} {change * 100:+8.1f}% {mark}")
+    if any(regression for *_, regression in rows):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
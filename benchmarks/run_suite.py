@@ -0,0 +1,86 @@
+"""
+Полный прогон набора бенчмарков в один файл результатов.
+
+Создаёт синтетическую SQLite БД (или использует --db-url), снимает
+задержки стадий сервиса для обоих оценщиков и, если не задан
+--skip-load, поднимает API и гоняет нагрузочный тест. Каждая часть
+работает в отдельном процессе, чтобы пиковый RSS не смешивался.
+Результаты двух коммитов сравниваются python -m benchmarks.results.
+
+    python -m benchmarks.run_suite --out data/benchmarks/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.results import write_results
+
+# Масштабы данных: посты, пользователи, лайки
+SCALES = {
+    "small": (2000, 20000, 100000),
+    "full": (7023, 163205, 1000000),
+}
+
+
+def run_module(module: str, *args: str) -> dict:
+    """Запускает бенчмарк в отдельном процессе и читает его результаты"""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        out = f.name
+    try:
+        subprocess.run([sys.executable, "-m", module, *args, "--out", out], check=True)
+        with open(out) as f:
+            results = json.load(f)
+    finally:
+        os.remove(out)
+    results.pop("environment", None)
+    results.pop("parameters", None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Results JSON")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--db-url", help="Existing database from benchmarks.make_db")
+    parser.add_argument("--replay", help="Replay file for an existing database")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", nargs="+", default=["1", "8", "32"])
+    parser.add_argument("--skip-load", action="store_true", help="Only in-process benchmarks")
+    args = parser.parse_args()
+
+    n_posts, n_users, n_likes = SCALES[args.scale]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url, replay = args.db_url, args.replay
+        if db_url is None:
+            db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            replay = os.path.join(tmp, "requests.jsonl")
+            subprocess.run([
+                sys.executable, "-m", "benchmarks.make_db", "--url", db_url,
+                "--posts", str(n_posts), "--users", str(n_users), "--likes", str(n_likes),
+                "--replay", replay
+            ], check=True)
+
+        sections = {}
+        for scorer in ("catboost", "native"):
+            sections[f"service_{scorer}"] = run_module(
+                "benchmarks.bench_service_stages", "--db-url", db_url,
+                "--scorer", scorer, "--requests", str(args.requests)
+            )
+        if not args.skip_load:
+            if replay is None:
+                parser.error("--replay is required with --db-url unless --skip-load is set")
+            sections["api"] = run_module(
+                "benchmarks.load_test", "--serve", "--db-url", db_url, "--replay", replay,
+                "--requests", str(args.requests * 4), "--concurrency", *args.concurrency
+            )
+
+    write_results(args.out, sections, parameters=vars(args))
+    print(f"results: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Синтетические таблицы постов, пользователей и лайков с реалистичными схемами"""
+import numpy as np
+import pandas as pd
+
+TOPICS = ['business', 'covid', 'entertainment', 'movie', 'politics', 'sport', 'tech']
+COUNTRIES = ['Russia', 'Ukraine', 'Belarus', 'Azerbaijan', 'Kazakhstan',
+             'Finland', 'Turkey', 'Latvia', 'Cyprus', 'Switzerland', 'Estonia']
+N_CLUSTERS = 15
+WORDS = np.array([
+    'market', 'vaccine', 'film', 'election', 'match', 'phone', 'company',
+    'season', 'minister', 'release', 'growth', 'player', 'report', 'people'
+])
+
+
+def make_user_features(n_users: int = 163205, seed: int = 42,
+                       first_id: int = 200) -> pd.DataFrame:
+    """Таблица пользователей как d_okulova_user_features_lesson_22"""
+    rng = np.random.default_rng(seed)
+    cities = np.array([f"city_{i}" for i in range(3915)], dtype=object)
+    return pd.DataFrame({
+        'user_id': np.arange(first_id, first_id + n_users),
+        'country': rng.choice(COUNTRIES, n_users, p=[0.55] + [0.045] * 10),
+        'gender': rng.integers(0, 2, n_users),
+        'age': rng.integers(14, 95, n_users),
+        'city': cities[rng.zipf(1.3, n_users) % len(cities)],
+        'exp_group': rng.integers(0, 5, n_users),
+    })
+
+
+def make_post_texts(n_posts: int, seed: int = 42, mean_words: int = 250) -> list:
+    """Тексты постов со средней длиной mean_words слов"""
+    rng = np.random.default_rng(seed)
+    lengths = rng.poisson(mean_words, n_posts) + 1
+    return [" ".join(rng.choice(WORDS, length)) for length in lengths]
+
+
+def make_post_features(n_posts: int = 7023, seed: int = 42,
+                       mean_words: int = 250) -> pd.DataFrame:
+    """Таблица постов как d_okulova_post_features_lesson_22"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'post_id': np.arange(1, n_posts + 1),
+        'text': make_post_texts(n_posts, seed, mean_words),
+        'topic': rng.choice(TOPICS, n_posts),
+        'views': rng.integers(5000, 25000, n_posts),
+        'view_reach': rng.integers(5000, 22000, n_posts),
+        'TotalTfIdf': rng.gamma(4.0, 1.5, n_posts),
+        'MaxTfIdf': rng.uniform(0.1, 1.0, n_posts),
+        'MeanTfIdf': rng.uniform(0.0, 0.01, n_posts),
+        'TextCluster': rng.integers(0, N_CLUSTERS, n_posts),
+    })
+    for i in range(1, N_CLUSTERS + 1):
+        df[f'DistanceTo{i}thCluster'] = rng.uniform(0.5, 2.0, n_posts)
+    return df
+
+
+def make_likes(user_features: pd.DataFrame, post_features: pd.DataFrame,
+               n_likes: int = 1000000, seed: int = 42) -> pd.DataFrame:
+    """Уникальные пары лайков post_id, user_id с популярными постами"""
+    rng = np.random.default_rng(seed)
+    users = user_features['user_id'].to_numpy()
+    posts = post_features['post_id'].to_numpy()
+    popularity = rng.pareto(1.5, len(posts)) + 1
+    popularity /= popularity.sum()
+    return pd.DataFrame({
+        'post_id': rng.choice(posts, n_likes, p=popularity),
+        'user_id': rng.choice(users, n_likes),
+    }).drop_duplicates(ignore_index=True)
+
+
+def make_data_loader(n_posts: int = 7023, n_users: int = 163205,
+                     n_likes: int = 1000000, seed: int = 42):
+    """DataLoader, заполненный синтетическими таблицами без обращения к БД"""
+    from src.utils.data_loader import DataLoader
+
+    users = make_user_features(n_users, seed)
+    posts = make_post_features(n_posts, seed)
+    likes = make_likes(users, posts, n_likes, seed)
+
+    loader = DataLoader("sqlite://")
+    loader.load_frames(posts, users, likes)
+    return loader
+
+
+def make_requests(user_features: pd.DataFrame, n_requests: int,
+                  seed: int = 42) -> list:
+    """Запросы (user_id, request_time) в пределах одного месяца"""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.choice(user_features['user_id'].to_numpy(), n_requests)
+    start = pd.Timestamp("2021-12-01")
+    offsets = rng.integers(0, 30 * 24 * 3600, n_requests)
+    return [
+        (int(user_id), (start + pd.Timedelta(seconds=int(offset))).to_pydatetime())
+        for user_id, offset in zip(user_ids, offsets)
+    ]
+
+
+def make_feed(likes: pd.DataFrame, views_per_like: float = 8.0,
+              start: str = "2021-10-01", days: int = 90, seed: int = 42) -> pd.DataFrame:
+    """
+    События feed_data: просмотры всех лайкнутых постов с лайками
+    и views_per_like просмотров без лайка на каждый лайк, по времени.
+    """
+    rng = np.random.default_rng(seed)
+    n_likes = len(likes)
+    n_views = int(n_likes * views_per_like)
+    user_ids = likes['user_id'].to_numpy()
+    post_ids = likes['post_id'].to_numpy()
+    seconds = rng.integers(0, days * 86400, n_likes + n_views)
+    # Просмотры без лайка - пары из тех же пользователей и постов вразнобой
+    view_users = rng.choice(user_ids, n_views) if n_likes else np.empty(0, dtype=np.int64)
+    view_posts = rng.choice(post_ids, n_views) if n_likes else np.empty(0, dtype=np.int64)
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(seconds, unit="s")
+
+    liked_views = pd.DataFrame({
+        'timestamp': timestamps[:n_likes], 'user_id': user_ids, 'post_id': post_ids,
+        'action': 'view', 'target': 1,
+    })
+    feed = pd.concat([
+        liked_views,
+        liked_views.assign(action='like', timestamp=liked_views['timestamp']
+                           + pd.to_timedelta(rng.integers(1, 60, n_likes), unit="s")),
+        pd.DataFrame({
+            'timestamp': timestamps[n_likes:], 'user_id': view_users, 'post_id': view_posts,
+            'action': 'view', 'target': 0,
+        }),
+    ], ignore_index=True)
+    return feed.sort_values('timestamp', ignore_index=True, kind='stable')
@@ -0,0 +1,152 @@
+"""
+Персистентный кэш результатов TextAnalyzer.
+
+Ключ записи - хэш текста и отпечаток анализатора (конфигурация,
+версия spaCy, модель и её компоненты), значение - результат analyze,
+сериализованный в JSON и сжатый zlib. Записи хранятся в локальной
+SQLite-таблице без rowid, поэтому повторный прогон по каталогу
+анализирует только новые и изменённые тексты, а смена конфигурации
+просто перестаёт находить старые записи (их удаляет prune).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Максимум параметров в одном SELECT ... IN (...) для старых сборок SQLite
+MAX_VARIABLES = 900
+
+
+def text_key(text: str) -> bytes:
+    """128-битный хэш текста"""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def dump_result(result: Dict) -> bytes:
+    return zlib.compress(json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+                         .encode("utf-8", "surrogatepass"), 1)
+
+
+def load_result(blob: bytes) -> Dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8", "surrogatepass"))
+
+
+class TextAnalysisCache:
+    """
+    Кэш результатов анализа текстов на диске.
+
+    Счётчики попаданий и времени анализа промахов накапливаются за время
+    жизни объекта, поэтому stats() после прогона - статистика этого прогона.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " fingerprint TEXT NOT NULL, text_hash BLOB NOT NULL, result BLOB NOT NULL,"
+            " PRIMARY KEY (fingerprint, text_hash)) WITHOUT ROWID"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)"
+        )
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        # Время анализа промахов, по нему оценивается сэкономленное время
+        self.analyze_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        # Среднее время анализа текста сохраняется для оценки прогонов без промахов
+        if self.misses:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('seconds_per_text', ?)",
+                    (self.analyze_seconds / self.misses,)
+                )
+        self.connection.close()
+
+    def get_many(self, fingerprint: str, keys: Iterable[bytes]) -> Dict[bytes, Dict]:
+        """Найденные результаты по хэшам текстов"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), MAX_VARIABLES):
+            part = keys[start:start + MAX_VARIABLES]
+            rows = self.connection.execute(
+                "SELECT text_hash, result FROM results WHERE fingerprint = ? "
+                f"AND text_hash IN ({','.join('?' * len(part))})",
+                [fingerprint, *part]
+            )
+            found.update((key, load_result(blob)) for key, blob in rows)
+        return found
+
+    def put_many(self, fingerprint: str, items: Iterable[Tuple[bytes, Dict]]):
+        """Сохраняет результаты одной транзакцией"""
+        rows = [(fingerprint, key, dump_result(result)) for key, result in items]
+        if not rows:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results (fingerprint, text_hash, result) VALUES (?, ?, ?)",
+                rows
+            )
+        self.writes += len(rows)
+
+    def prune(self, keep: List[str]) -> int:
+        """Удаляет записи всех отпечатков, кроме keep; возвращает число удалённых"""
+        with self.connection:
+            deleted = self.connection.execute(
+                f"DELETE FROM results WHERE fingerprint NOT IN ({','.join('?' * len(keep))})",
+                keep
+            ).rowcount
+        self.connection.execute("VACUUM")
+        return deleted
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def seconds_per_text(self) -> Optional[float]:
+        """Среднее время анализа промаха: этого прогона или сохранённое прошлым"""
+        if self.misses:
+            return self.analyze_seconds / self.misses
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'seconds_per_text'"
+        ).fetchone()
+        return row[0] if row else None
+
+    @property
+    def time_saved_seconds(self) -> Optional[float]:
+        """Оценка: попадания, умноженные на среднее время анализа текста"""
+        seconds = self.seconds_per_text()
+        return self.hits * seconds if seconds is not None else None
+
+    def stats(self) -> Dict:
+        saved = self.time_saved_seconds
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "writes": self.writes,
+            "analyze_seconds": round(self.analyze_seconds, 3),
+            "time_saved_seconds": round(saved, 3) if saved is not None else None,
+        }
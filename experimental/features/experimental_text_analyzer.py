@@ -7,17 +7,45 @@ Retained for potential future use.
 
 Full documentation: docs/text_analyzer_en.md
 """
+import os
 import re
+import json
+import time
+import hashlib
 import logging
-from typing import Dict, List, Union, Optional, Tuple
-from collections import defaultdict
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Union, Optional, Tuple
+from collections import defaultdict, deque
 import spacy
 from functools import lru_cache
 import pandas as pd
 
+from experimental.features.analysis_cache import TextAnalysisCache, text_key
+from experimental.features.text_columns import (
+    AnalysisColumns, RecordBatchBuilder, Schema, result_schema, write_columns
+)
+
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+# Флаги config.yaml и их однобуквенные inline-формы для объединённого regex
+REGEX_FLAGS = {"VERBOSE": (re.VERBOSE, "x"), "IGNORECASE": (re.IGNORECASE, "i"),
+               "MULTILINE": (re.MULTILINE, "m")}
+
+# Версия формата результата analyze; входит в отпечаток кэша
+RESULT_VERSION = 1
+
+# Анализатор для процессов-воркеров analyze_batch; наследуется при fork
+_WORKER_ANALYZER: Optional["TextAnalyzer"] = None
+
+
+def _analyze_in_worker(texts: List, include_tokens: bool, batch_size: int) -> List[Dict]:
+    return _WORKER_ANALYZER._analyze_chunk(texts, include_tokens, batch_size)
+
+
 class TextAnalyzer:
     def __init__(self, config: Dict = None):
         """
@@ -35,6 +63,15 @@ class TextAnalyzer:
         # Компилируем паттерны
         self.patterns = self._compile_patterns()
         self.truncation_regexes = self._compile_truncation_patterns()
+        # Однопроходные варианты: все паттерны токенов и все паттерны усечения
+        self.scanner = self._compile_scanner()
+        self.truncation_regex = self._combine(
+            [(pattern.pattern, "i") for pattern in self.truncation_regexes]
+        )
+        
+        # Без компонента, заполняющего doc.ents, сущностей не бывает,
+        # и spaCy для них можно не вызывать
+        self.extracts_entities = self._pipeline_assigns_entities()
         
         # Инициализируем стоп-слова
         self.stop_words = set(self.config.get("stop_words", []))
@@ -65,9 +102,8 @@ class TextAnalyzer:
                 flags = 0
                 if pattern_config.get("flags"):
                     for flag in pattern_config["flags"].split("|"):
-                        if flag == "VERBOSE": flags |= re.VERBOSE
-                        if flag == "IGNORECASE": flags |= re.IGNORECASE
-                        if flag == "MULTILINE": flags |= re.MULTILINE
+                        if flag in REGEX_FLAGS:
+                            flags |= REGEX_FLAGS[flag][0]
                 
                 compiled.append((
                     re.compile(pattern_config["pattern"], flags),
@@ -90,6 +126,61 @@ class TextAnalyzer:
                 logger.error("Error compiling truncation pattern '%s': %s", pattern, str(e))
         return compiled
     
+    @staticmethod
+    def _combine(patterns: List[Tuple[str, str]]) -> Optional[re.Pattern]:
+        """
+        Объединяет паттерны в одну альтернативу с флагами каждого паттерна.
+        
+        Объединённый regex находит совпадение тогда и только тогда, когда
+        его находит хотя бы один из паттернов. Паттерны с группами или
+        inline-флагами не объединяются: возвращается None.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                combined = re.compile("|".join(
+                    f"(?{flags}:{pattern})" if flags else f"(?:{pattern})"
+                    for pattern, flags in patterns
+                ))
+        except (re.error, Warning):
+            return None
+        return combined if patterns and combined.groups == 0 else None
+    
+    def _compile_scanner(self) -> Optional[re.Pattern]:
+        """Один regex для проверки, есть ли в тексте хоть один специальный токен"""
+        inline_flags = {flag: letter for flag, letter in REGEX_FLAGS.values()}
+        return self._combine([
+            (pattern.pattern, "".join(letter for flag, letter in inline_flags.items()
+                                      if pattern.flags & flag))
+            for pattern, _ in self.patterns
+        ])
+    
+    def _pipeline_assigns_entities(self) -> bool:
+        """Есть ли в активном конвейере spaCy компонент, заполняющий doc.ents"""
+        try:
+            return any("doc.ents" in self.nlp.get_pipe_meta(name).assigns
+                       for name in self.nlp.pipe_names)
+        except Exception:
+            return True
+    
+    def fingerprint(self, include_tokens: bool = True) -> str:
+        """
+        Отпечаток всего, от чего зависит результат analyze: конфигурации
+        (паттерны, стоп-слова, модель), версий spaCy и модели и активных
+        компонентов конвейера. Ключ пространства записей кэша.
+        """
+        meta = getattr(self.nlp, "meta", {}) or {}
+        state = {
+            "result_version": RESULT_VERSION,
+            "config": self.config,
+            "spacy": getattr(spacy, "__version__", None),
+            "model": [meta.get("lang"), meta.get("name"), meta.get("version")],
+            "pipes": list(self.nlp.pipe_names),
+            "include_tokens": include_tokens,
+        }
+        payload = json.dumps(state, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+    
     @staticmethod
     def get_default_config() -> Dict:
         """Возвращает конфигурацию по умолчанию"""
@@ -141,7 +232,11 @@ class TextAnalyzer:
     
     def _is_truncated(self, text: str) -> bool:
         """Проверяет, является ли текст усечённым с ссылкой для продолжения"""
-        return any(pattern.search(text) for pattern in self.truncation_regexes) or (
+        if self.truncation_regex is not None:
+            truncated = self.truncation_regex.search(text) is not None
+        else:
+            truncated = any(pattern.search(text) for pattern in self.truncation_regexes)
+        return truncated or (
             re.search(r'https?://\S+$', text) and len(text) < 100
         )
     
@@ -159,22 +254,41 @@ class TextAnalyzer:
     
     def _extract_entities(self, text: str) -> Dict[str, List[str]]:
         """Извлекает именованные сущности из текста"""
+        if not self.extracts_entities:
+            return {}
         try:
-            doc = self.nlp(text)
-            entities = defaultdict(list)
-            
-            for ent in doc.ents:
-                if ent.label_ in {"PERSON", "GPE", "LOC", "ORG"}:
-                    entity_type = ent.label_.lower() + "s"
-                    entities[entity_type].append(ent.text)
-                    
-            return dict(entities)
+            return self._doc_entities(self.nlp(text))
         except Exception as e:
             logger.error("Error extracting entities: %s", str(e))
             return {}
     
-    def _calculate_metrics(self, text: str) -> Dict[str, Union[float, int]]:
-        """Вычисляет лингвистические метрики текста"""
+    @staticmethod
+    def _doc_entities(doc) -> Dict[str, List[str]]:
+        """Сущности PERSON, GPE, LOC, ORG документа spaCy по типам"""
+        entities = defaultdict(list)
+        for ent in doc.ents:
+            if ent.label_ in {"PERSON", "GPE", "LOC", "ORG"}:
+                entity_type = ent.label_.lower() + "s"
+                entities[entity_type].append(ent.text)
+        return dict(entities)
+    
+    def _pipe_entities(self, texts: List[str], batch_size: int) -> List[Dict[str, List[str]]]:
+        """Сущности текстов одним проходом nlp.pipe"""
+        if not self.extracts_entities:
+            return [{} for _ in texts]
+        try:
+            return [self._doc_entities(doc) for doc in self.nlp.pipe(texts, batch_size=batch_size)]
+        except Exception as e:
+            logger.error("Error extracting entities in batch, falling back to texts: %s", str(e))
+            return [self._extract_entities(text) for text in texts]
+    
+    def _calculate_metrics(self, text: str,
+                           words: Optional[List[str]] = None) -> Dict[str, Union[float, int]]:
+        """
+        Вычисляет лингвистические метрики текста
+        
+        :param words: Слова \\w+ текста в нижнем регистре, если уже найдены
+        """
         if not text.strip():
             return {
                 'word_count': 0,
@@ -187,16 +301,18 @@ class TextAnalyzer:
             }
         
         try:
-            # Разделение на абзацы и предложения
-            paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
-            sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
-            
-            # Токенизация слов
-            words = [
-                word.lower() for word in re.findall(r'\w+', text.lower()) 
-                if word.lower() not in self.stop_words
+            # Число абзацев; слова всех абзацев - это слова всего текста,
+            # так как перевод строки тоже пробельный символ
+            paragraph_count = sum(1 for p in text.split('\n') if p.strip())
+            sentence_lengths = [
+                len(sentence.split()) for sentence in re.split(r'[.!?]+', text) if sentence.strip()
             ]
             
+            # Токенизация слов; текст уже в нижнем регистре, повторный lower не нужен
+            if words is None:
+                words = re.findall(r'\w+', text.lower())
+            words = [word for word in words if word not in self.stop_words]
+            
             # Расчёт метрик
             word_count = len(words)
             avg_word_length = round(sum(len(word) for word in words) / word_count, 2) if words else 0.0
@@ -204,10 +320,10 @@ class TextAnalyzer:
             return {
                 'word_count': word_count,
                 'avg_word_length': avg_word_length,
-                'paragraph_count': len(paragraphs),
-                'avg_paragraph_length': round(sum(len(p.split()) for p in paragraphs) / len(paragraphs), 2) if paragraphs else 0.0,
-                'sentence_count': len(sentences),
-                'avg_sentence_length': round(sum(len(s.split()) for s in sentences) / len(sentences), 2) if sentences else 0.0,
+                'paragraph_count': paragraph_count,
+                'avg_paragraph_length': round(len(text.split()) / paragraph_count, 2) if paragraph_count else 0.0,
+                'sentence_count': len(sentence_lengths),
+                'avg_sentence_length': round(sum(sentence_lengths) / len(sentence_lengths), 2) if sentence_lengths else 0.0,
                 'is_truncated': self._is_truncated(text)
             }
         except Exception as e:
@@ -234,56 +350,259 @@ class TextAnalyzer:
             return {}
             
         try:
-            # Базовые метрики
-            metrics = self._calculate_metrics(text)
-            result = {'metrics': metrics}
-            
-            # Извлечение специальных токенов
-            special_tokens = defaultdict(list)
-            remaining_text = text
-            
-            for pattern, token_type in self.patterns:
-                for match in pattern.finditer(remaining_text):
-                    token = match.group()
-                    if token_type == 'years':
-                        years = self._expand_decade_year(token)
-                        special_tokens[token_type].extend(years)
-                    else:
-                        special_tokens[token_type].append(token)
-                        # Заменяем только первое вхождение для безопасности
-                        remaining_text = remaining_text.replace(token, ' ', 1)
-            
-            result['special_tokens'] = dict(special_tokens)
-            
-            # Извлечение сущностей
-            result['named_entities'] = self._extract_entities(text)
-            
-            # URL продолжения для усечённых текстов
-            if metrics['is_truncated']:
-                result['continuation_url'] = self._extract_continuation_url(text)
-            
-            # Дополнительная информация о токенах
-            if include_tokens:
-                words = [
-                    word for word in re.findall(r'\b\w+\b', remaining_text.lower())
-                    if word not in self.stop_words and len(word) > 1
-                ]
-                
-                all_tokens = []
-                for token_list in special_tokens.values():
-                    all_tokens.extend(token_list if isinstance(token_list, list) else [token_list])
-                all_tokens.extend(words)
-                
-                result.update({
-                    'tokens': words,
-                    'all_tokens': all_tokens
-                })
-            return result
+            return self._build_result(text, self._extract_entities(text), include_tokens)
         
         except Exception as e:
             logger.exception("Error during text analysis")
             return {}
+    
+    def _special_tokens(self, text: str) -> Tuple[Dict[str, list], str]:
+        """
+        Специальные токены по типам и текст без них.
+        
+        Паттерны применяются по порядку конфигурации, и найденный токен
+        удаляется из текста до поиска следующих типов. Текст без единого
+        совпадения объединённого regex отсекается за один проход.
+        """
+        if self.scanner is not None and self.scanner.search(text) is None:
+            return {}, text
+        
+        special_tokens = defaultdict(list)
+        remaining_text = text
+        
+        for pattern, token_type in self.patterns:
+            for match in pattern.finditer(remaining_text):
+                token = match.group()
+                if token_type == 'years':
+                    years = self._expand_decade_year(token)
+                    special_tokens[token_type].extend(years)
+                else:
+                    special_tokens[token_type].append(token)
+                    # Заменяем только первое вхождение для безопасности
+                    remaining_text = remaining_text.replace(token, ' ', 1)
+        
+        return dict(special_tokens), remaining_text
+    
+    def _build_result(self, text: str, entities: Dict[str, List[str]],
+                      include_tokens: bool) -> Dict:
+        """Результат analyze по тексту и уже извлечённым сущностям"""
+        # Слова текста ищутся один раз для метрик и, без специальных токенов, для tokens
+        words = re.findall(r'\w+', text.lower())
+        
+        # Базовые метрики
+        metrics = self._calculate_metrics(text, words)
+        result = {'metrics': metrics}
+        
+        # Извлечение специальных токенов
+        special_tokens, remaining_text = self._special_tokens(text)
+        result['special_tokens'] = special_tokens
+        
+        # Извлечение сущностей
+        result['named_entities'] = entities
+        
+        # URL продолжения для усечённых текстов
+        if metrics['is_truncated']:
+            result['continuation_url'] = self._extract_continuation_url(text)
+        
+        # Дополнительная информация о токенах
+        if include_tokens:
+            if remaining_text is not text:
+                words = re.findall(r'\w+', remaining_text.lower())
+            words = [
+                word for word in words
+                if word not in self.stop_words and len(word) > 1
+            ]
+            
+            all_tokens = []
+            for token_list in special_tokens.values():
+                all_tokens.extend(token_list if isinstance(token_list, list) else [token_list])
+            all_tokens.extend(words)
+            
+            result.update({
+                'tokens': words,
+                'all_tokens': all_tokens
+            })
+        return result
+    
+    def _analyze_chunk(self, texts: List, include_tokens: bool, batch_size: int) -> List[Dict]:
+        """analyze для списка текстов с одним вызовом nlp.pipe"""
+        results: List[Optional[Dict]] = [None] * len(texts)
+        valid = [i for i, text in enumerate(texts) if isinstance(text, str) and text]
+        entities = self._pipe_entities([texts[i] for i in valid], batch_size)
+        
+        for i, text_entities in zip(valid, entities):
+            try:
+                results[i] = self._build_result(texts[i], text_entities, include_tokens)
+            except Exception:
+                logger.exception("Error during text analysis")
+                results[i] = {}
+        
+        # Пустые и нестроковые значения - как в analyze
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self.analyze(texts[i], include_tokens)
+        return results
+    
+    def iter_analyze(self, texts: Iterable, include_tokens: bool = True,
+                     batch_size: int = 256, n_process: int = 1,
+                     cache: Optional[TextAnalysisCache] = None) -> Iterator[Dict]:
+        """
+        Потоковый analyze: результаты по одному в порядке текстов.
+        
+        Тексты читаются пачками по batch_size, сущности каждой пачки
+        извлекаются одним nlp.pipe. При n_process > 1 пачки обрабатываются
+        в процессах-воркерах (fork), в работе держится не больше
+        2 * n_process пачек, поэтому память не зависит от числа текстов.
+        
+        :param texts: Тексты, в том числе генератор
+        :param include_tokens: Включать ли информацию о токенах
+        :param batch_size: Размер пачки текстов
+        :param n_process: Число процессов; -1 - по числу ядер
+        :param cache: Кэш результатов на диске; анализируются только промахи
+        :return: Итератор словарей, совпадающих с результатом analyze
+        """
+        iterator = iter(texts)
+        chunks = iter(lambda: list(islice(iterator, batch_size)), [])
+        if cache is not None:
+            yield from self._iter_cached(chunks, include_tokens, batch_size, n_process, cache)
+            return
+        for results in self._map_chunks(chunks, include_tokens, batch_size, n_process):
+            yield from results
+    
+    def _map_chunks(self, chunks: Iterable[List], include_tokens: bool,
+                    batch_size: int, n_process: int) -> Iterator[List[Dict]]:
+        """Результаты пачек в их порядке, при n_process > 1 - в воркерах"""
+        global _WORKER_ANALYZER
+        
+        if n_process == -1:
+            n_process = os.cpu_count() or 1
+        if n_process <= 1:
+            for chunk in chunks:
+                yield self._analyze_chunk(chunk, include_tokens, batch_size)
+            return
+        
+        _WORKER_ANALYZER = self
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=n_process, mp_context=context) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_analyze_in_worker, chunk, include_tokens, batch_size))
+                if len(pending) >= 2 * n_process:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def _iter_cached(self, chunks: Iterable[List], include_tokens: bool, batch_size: int,
+                     n_process: int, cache: TextAnalysisCache) -> Iterator[Dict]:
+        """
+        iter_analyze с кэшем: в анализ уходят только тексты без записи.
+        
+        Пачка промахов и найденные результаты пачки складываются в очередь,
+        пачки анализируются в исходном порядке, поэтому результаты
+        собираются обратно по очереди. Нестроковые и пустые значения
+        не кэшируются, результаты с ошибкой ({}) не сохраняются.
+        """
+        fingerprint = self.fingerprint(include_tokens)
+        pending = deque()
+        lookup_seconds = 0.0
+        
+        def misses() -> Iterator[List]:
+            nonlocal lookup_seconds
+            for chunk in chunks:
+                started = time.perf_counter()
+                keys = [text_key(text) if isinstance(text, str) and text else None
+                        for text in chunk]
+                found = cache.get_many(fingerprint, [key for key in keys if key is not None])
+                lookup_seconds += time.perf_counter() - started
+                
+                hits = sum(1 for key in keys if key in found)
+                cache.hits += hits
+                cache.misses += sum(1 for key in keys if key is not None) - hits
+                pending.append((chunk, keys, found))
+                yield [text for text, key in zip(chunk, keys) if key not in found]
+        
+        analyzed = self._map_chunks(misses(), include_tokens, batch_size, n_process)
+        while True:
+            started = time.perf_counter()
+            lookups_before = lookup_seconds
+            fresh = next(analyzed, None)
+            cache.analyze_seconds += (time.perf_counter() - started
+                                      - (lookup_seconds - lookups_before))
+            if fresh is None:
+                break
+            
+            chunk, keys, found = pending.popleft()
+            fresh = iter(fresh)
+            results, new = [], {}
+            for key in keys:
+                if key in found:
+                    results.append(found[key])
+                    continue
+                result = next(fresh)
+                if key is not None and result:
+                    new[key] = result
+                results.append(result)
+            cache.put_many(fingerprint, new.items())
+            yield from results
+    
+    def analyze_batch(self, texts: Iterable, include_tokens: bool = True,
+                      batch_size: int = 256, n_process: int = 1) -> List[Dict]:
+        """
+        Анализ многих текстов; результат совпадает с [analyze(t) for t in texts]
+        
+        :param batch_size: Размер пачки текстов для nlp.pipe
+        :param n_process: Число процессов; -1 - по числу ядер
+        """
+        return list(self.iter_analyze(texts, include_tokens, batch_size, n_process))
+        
+    def column_schema(self, include_tokens: bool = True) -> Schema:
+        """Схема колоночного результата для паттернов этого анализатора"""
+        token_types = list(dict.fromkeys(token_type for _, token_type in self.patterns))
+        return result_schema(token_types, include_tokens)
+    
+    def iter_record_batches(self, texts: Iterable, include_tokens: bool = True,
+                            chunk_size: int = 65536, batch_size: int = 256,
+                            n_process: int = 1,
+                            cache: Optional[TextAnalysisCache] = None) -> Iterator[Dict]:
+        """
+        Результаты iter_analyze колонками по chunk_size текстов.
+        
+        Словари результатов не накапливаются: каждый сразу раскладывается
+        в колонки пачки, в памяти одновременно одна пачка.
         
+        :return: Итератор record batch (см. text_columns)
+        """
+        schema = self.column_schema(include_tokens)
+        builder = RecordBatchBuilder(schema)
+        for result in self.iter_analyze(texts, include_tokens, batch_size, n_process, cache):
+            builder.append(result)
+            if len(builder) == chunk_size:
+                yield builder.finish()
+                builder = RecordBatchBuilder(schema)
+        if len(builder):
+            yield builder.finish()
+    
+    def analyze_to_columns(self, texts: Iterable, path: str, include_tokens: bool = True,
+                           chunk_size: int = 65536, batch_size: int = 256,
+                           n_process: int = 1,
+                           cache: Optional[TextAnalysisCache] = None) -> Dict:
+        """
+        Пишет результаты анализа в колоночный каталог path пачками по chunk_size.
+        
+        Тексты могут быть генератором, поэтому корпус не обязан помещаться
+        в память. Результат читается AnalysisColumns(path).
+        
+        :return: Манифест каталога
+        """
+        batches = self.iter_record_batches(texts, include_tokens, chunk_size,
+                                           batch_size, n_process, cache)
+        manifest = write_columns(path, batches, self.column_schema(include_tokens),
+                                 metadata={"fingerprint": self.fingerprint(include_tokens)})
+        logger.info("Text analysis columns: %d rows in %d parts written to %s",
+                    sum(part["rows"] for part in manifest["parts"]),
+                    len(manifest["parts"]), path)
+        return manifest
+    
     def analyze_dataframe(
         self,
         df: pd.DataFrame,
@@ -291,7 +610,11 @@ class TextAnalyzer:
         include_tokens: bool = True,
         drop_original: bool = False,
         parallel: bool = False,
-        n_jobs: int = -1
+        n_jobs: int = -1,
+        batch_size: int = 256,
+        cache: Optional[Union[str, TextAnalysisCache]] = None,
+        columnar_path: Optional[str] = None,
+        chunk_size: int = 65536
     ) -> pd.DataFrame:
         """
         Анализирует текстовую колонку в датафрейме и возвращает новый датафрейм с результатами.
@@ -310,6 +633,18 @@ class TextAnalyzer:
             Использовать ли параллельную обработку
         n_jobs : int
             Количество ядер для параллельной обработки (-1 = все ядра)
+        batch_size : int
+            Размер пачки текстов для nlp.pipe и воркеров
+        cache : str или TextAnalysisCache, optional
+            Путь к кэшу результатов на диске (или открытый кэш): повторно
+            анализируются только новые и изменённые тексты
+        columnar_path : str, optional
+            Каталог колоночного результата. Если задан, все поля пишутся
+            туда пачками по chunk_size строк, а к датафрейму добавляются
+            только числовые колонки (метрики и счётчики) типизированными
+            массивами - без списков и словарей в памяти
+        chunk_size : int
+            Строк в пачке колоночного результата
 
         Возвращает:
         -----------
@@ -320,23 +655,31 @@ class TextAnalyzer:
             raise ValueError(f"Колонка '{text_column}' не найдена в датафрейме")
 
         
-        # Параллельная обработка при необходимости
-        if parallel:
+        analysis_cache = TextAnalysisCache(cache) if isinstance(cache, str) else cache
+        
+        if columnar_path is not None:
             try:
-                from pandarallel import pandarallel
-                pandarallel.initialize(nb_workers=n_jobs)
-                analysis_results = df[text_column].parallel_apply(
-                    lambda x: self.analyze(x, include_tokens=include_tokens)
-                )
-            except ImportError:
-                logger.warning("pandarallel не установлен, используется обычная обработка")
-                analysis_results = df[text_column].apply(
-                    lambda x: self.analyze(x, include_tokens=include_tokens)
+                self.analyze_to_columns(
+                    df[text_column], columnar_path, include_tokens=include_tokens,
+                    chunk_size=chunk_size, batch_size=batch_size,
+                    n_process=n_jobs if parallel else 1, cache=analysis_cache
                 )
-        else:
-            analysis_results = df[text_column].apply(
-                lambda x: self.analyze(x, include_tokens=include_tokens)
-            )
+            finally:
+                if analysis_cache is not None:
+                    logger.info("Text analysis cache: %s", analysis_cache.stats())
+                    if isinstance(cache, str):
+                        analysis_cache.close()
+            numeric = AnalysisColumns(columnar_path).numeric_frame()
+            result_df = pd.concat([df.reset_index(drop=True), numeric], axis=1)
+            if drop_original:
+                result_df = result_df.drop(columns=[text_column])
+            return result_df
+        
+        # Пакетная обработка, при parallel - в n_jobs процессах
+        analysis_results = self.iter_analyze(
+            df[text_column], include_tokens=include_tokens, batch_size=batch_size,
+            n_process=n_jobs if parallel else 1, cache=analysis_cache
+        )
 
         # Преобразуем результаты в DataFrame
         expanded_data = []
@@ -368,6 +711,11 @@ class TextAnalyzer:
                 row['text_continuation_url'] = result['continuation_url']
             
             expanded_data.append(row)
+        
+        if analysis_cache is not None:
+            logger.info("Text analysis cache: %s", analysis_cache.stats())
+            if isinstance(cache, str):
+                analysis_cache.close()
 
         expanded_df = pd.DataFrame(expanded_data)
         
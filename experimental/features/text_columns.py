@@ -0,0 +1,294 @@
+"""
+Колоночное представление результатов TextAnalyzer.
+
+Результаты пачки текстов собираются в record batch - словарь колонок:
+    - метрики и счётчики по типам - типизированные numpy-массивы;
+    - списки (токены, упоминания, сущности) - смещения (n + 1) в общий
+      массив значений: годы - int64, остальное - UTF-8 буфер со смещениями;
+    - строки (continuation_url) - UTF-8 буфер со смещениями, как TextColumn
+      снапшота.
+all_tokens не хранится: это значения special_tokens в порядке паттернов
+и затем tokens.
+
+На диске каждая пачка - отдельный каталог part-XXXXX с файлами колонок,
+manifest.json описывает схему и пачки. Числовые колонки открываются
+через mmap, поэтому к фичам постов присоединяются без чтения списков.
+"""
+import json
+import shutil
+from array import array
+from itertools import accumulate
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.utils.snapshot import TextColumn
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+METRIC_TYPES = {
+    "word_count": "int32",
+    "avg_word_length": "float64",
+    "paragraph_count": "int32",
+    "avg_paragraph_length": "float64",
+    "sentence_count": "int32",
+    "avg_sentence_length": "float64",
+    "is_truncated": "bool",
+}
+ENTITY_TYPES = ["persons", "gpes", "locs", "orgs"]
+
+# Описание колонки: (имя, вид, тип значений); вид - numeric, text или list
+Schema = List[Tuple[str, str, str]]
+
+
+class ListColumn:
+    """Колонка списков: смещения строк в массив значений"""
+
+    def __init__(self, offsets: np.ndarray, values: Union[np.ndarray, TextColumn]):
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> list:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if isinstance(self.values, TextColumn):
+            return [self.values[i] for i in range(start, end)]
+        return self.values[start:end].tolist()
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+
+def result_schema(token_types: List[str], include_tokens: bool) -> Schema:
+    """Схема колонок для типов специальных токенов в порядке паттернов"""
+    schema = [(f"text_{name}", "numeric", dtype) for name, dtype in METRIC_TYPES.items()]
+    for name in token_types + ENTITY_TYPES:
+        schema.append((f"text_{name}_count", "numeric", "int32"))
+        schema.append((f"text_{name}", "list", "int64" if name == "years" else "text"))
+    schema.append(("text_continuation_url", "text", "text"))
+    if include_tokens:
+        schema.append(("text_tokens", "list", "text"))
+    schema.append(("text_analyzed", "numeric", "bool"))
+    return schema
+
+
+class TextBuffer:
+    """Строки, сразу закодированные в UTF-8 буфер: без python-объекта на строку"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def append(self, value: str):
+        self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def extend(self, values: Iterable[str]):
+        encoded = [value.encode("utf-8") for value in values]
+        start = len(self.data)
+        self.offsets.extend(start + end for end in accumulate(map(len, encoded)))
+        self.data += b"".join(encoded)
+
+    def finish(self) -> TextColumn:
+        return TextColumn(np.frombuffer(self.offsets, dtype=np.int64),
+                          np.frombuffer(self.data, dtype=np.uint8))
+
+
+class RecordBatchBuilder:
+    """
+    Накопление результатов analyze в колонки одной пачки.
+
+    Строки сразу кодируются в буферы, числа - в array, поэтому пачка
+    занимает в памяти примерно столько же, сколько её файлы.
+    """
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        self.rows = 0
+        self._values: Dict[str, Union[list, array, TextBuffer]] = {}
+        self._offsets: Dict[str, array] = {}
+        for name, kind, dtype in schema:
+            if kind == "numeric":
+                self._values[name] = []
+            elif kind == "list" and dtype != "text":
+                self._values[name] = array("q")
+            else:
+                self._values[name] = TextBuffer()
+            if kind == "list":
+                self._offsets[name] = array("q", [0])
+        # Счётчик по типу - длина списка этого типа
+        self._count_of = {f"{name}_count": name for name in self._offsets
+                          if f"{name}_count" in self._values}
+        self._metric_columns = [(f"text_{name}", name) for name in METRIC_TYPES]
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def append(self, result: Dict):
+        metrics = result.get("metrics", {})
+        for name, key in self._metric_columns:
+            self._values[name].append(metrics.get(key, 0) or 0)
+
+        lists = {f"text_{name}": values
+                 for group in ("special_tokens", "named_entities")
+                 for name, values in result.get(group, {}).items()}
+        if "tokens" in result:
+            lists["text_tokens"] = result["tokens"]
+        for name, offsets in self._offsets.items():
+            values = lists.get(name)
+            if values:
+                self._values[name].extend(values)
+            offsets.append(len(self._values[name]))
+        for name, list_name in self._count_of.items():
+            self._values[name].append(len(lists.get(list_name, ())))
+
+        self._values["text_continuation_url"].append(result.get("continuation_url") or "")
+        self._values["text_analyzed"].append(bool(result))
+        self.rows += 1
+
+    def finish(self) -> Dict[str, Union[np.ndarray, TextColumn, ListColumn]]:
+        batch = {}
+        for name, kind, dtype in self.schema:
+            values = self._values[name]
+            if kind == "numeric":
+                batch[name] = np.array(values, dtype=dtype)
+            elif kind == "text":
+                batch[name] = values.finish()
+            else:
+                offsets = np.frombuffer(self._offsets[name], dtype=np.int64)
+                items = (values.finish() if dtype == "text"
+                         else np.frombuffer(values, dtype=np.int64).astype(dtype))
+                batch[name] = ListColumn(offsets, items)
+        return batch
+
+
+def _save_text(column: TextColumn, base: Path):
+    np.save(f"{base}.offsets.npy", np.asarray(column.offsets))
+    np.asarray(column.data).tofile(f"{base}.data.bin")
+
+
+def _load_text(base: Path) -> TextColumn:
+    offsets = np.load(f"{base}.offsets.npy", mmap_mode="r")
+    if offsets[-1] == 0:
+        # mmap пустого файла невозможен
+        return TextColumn(offsets, np.empty(0, dtype=np.uint8))
+    return TextColumn(offsets, np.memmap(f"{base}.data.bin", dtype=np.uint8, mode="r"))
+
+
+def write_batch(batch: Dict, schema: Schema, path: Path):
+    """Пишет одну пачку: файл на колонку, списки - смещения и значения"""
+    path.mkdir(parents=True)
+    for name, kind, dtype in schema:
+        column = batch[name]
+        if kind == "numeric":
+            np.save(path / f"{name}.npy", column)
+        elif kind == "text":
+            _save_text(column, path / name)
+        else:
+            np.save(path / f"{name}.offsets.npy", column.offsets)
+            if dtype == "text":
+                _save_text(column.values, path / f"{name}.values")
+            else:
+                np.save(path / f"{name}.values.npy", column.values)
+
+
+def write_columns(path: Union[str, Path], batches: Iterable[Dict], schema: Schema,
+                  metadata: Optional[Dict] = None) -> Dict:
+    """
+    Пишет пачки в каталог path, заменяя его целиком.
+
+    В памяти одновременно одна пачка; каталог появляется под итоговым
+    именем только после записи всех пачек.
+
+    :return: Манифест
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".tmp-{path.name}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "metadata": metadata or {},
+        "schema": [list(column) for column in schema],
+        "parts": [],
+    }
+    try:
+        for i, batch in enumerate(batches):
+            name = f"part-{i:05d}"
+            write_batch(batch, schema, tmp_path / name)
+            manifest["parts"].append({"name": name, "rows": len(batch[schema[0][0]])})
+        with open(tmp_path / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.rename(path)
+    return manifest
+
+
+class AnalysisColumns:
+    """Колоночные результаты на диске: пачки как record batch поверх mmap"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+        if self.manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported text columns format version: {self.manifest['format_version']}"
+            )
+        self.schema: Schema = [tuple(column) for column in self.manifest["schema"]]
+        self.parts = self.manifest["parts"]
+
+    def __len__(self) -> int:
+        return sum(part["rows"] for part in self.parts)
+
+    @property
+    def numeric_columns(self) -> List[str]:
+        return [name for name, kind, _ in self.schema if kind == "numeric"]
+
+    def read_batch(self, part: Dict, columns: Optional[List[str]] = None) -> Dict:
+        """Колонки одной пачки; columns=None - все"""
+        base = self.path / part["name"]
+        batch = {}
+        for name, kind, dtype in self.schema:
+            if columns is not None and name not in columns:
+                continue
+            if kind == "numeric":
+                batch[name] = np.load(base / f"{name}.npy", mmap_mode="r")
+            elif kind == "text":
+                batch[name] = _load_text(base / name)
+            else:
+                offsets = np.load(base / f"{name}.offsets.npy", mmap_mode="r")
+                values = (_load_text(base / f"{name}.values") if dtype == "text"
+                          else np.load(base / f"{name}.values.npy", mmap_mode="r"))
+                batch[name] = ListColumn(offsets, values)
+        return batch
+
+    def iter_batches(self, columns: Optional[List[str]] = None) -> Iterator[Dict]:
+        for part in self.parts:
+            yield self.read_batch(part, columns)
+
+    def numeric_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Числовые колонки всех пачек одним DataFrame для join с фичами постов"""
+        columns = columns or self.numeric_columns
+        batches = list(self.iter_batches(columns))
+        if not batches:
+            return pd.DataFrame({name: np.array([], dtype=dtype)
+                                 for name, kind, dtype in self.schema if name in columns})
+        return pd.DataFrame({
+            name: np.concatenate([batch[name] for batch in batches]) for name in columns
+        })
@@ -1,43 +1,198 @@
 import os
+import time
 import logging
+from typing import Optional
 from dotenv import load_dotenv
 from src.utils.data_loader import DataLoader
 from src.utils.model_loader import load_model
-from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_registry import DEFAULT_MODEL, ModelRegistry, parse_mapping
+from src.utils.feature_processor import FeatureProcessor, PostFeatureMatrix
 from src.utils.recommendation_service import RecommendationService
-from fastapi import Depends
+from src.utils.answer_table import AnswerTable
+from src.utils.like_ingester import LikeIngester
+from src.utils.metrics import ServiceMetrics
+from src.utils.micro_batcher import MicroBatcher
+from src.utils.profiler import SamplingProfiler
+from src.utils.score_cache import ScoreCache
+from src.api.executor import ScoringExecutor
+from src.api.state import ServingSnapshot, ServingState
+from fastapi import Depends, HTTPException
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 def get_db_url() -> str:
-    """Формирует URL для подключения к БД из переменных окружения"""
+    """Формирует URL для подключения к БД из переменных окружения; DB_URL задаёт его целиком"""
+    if os.getenv("DB_URL"):
+        return os.getenv("DB_URL")
     return f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}" \
            f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 
 def get_data_loader() -> DataLoader:
-    """Зависимость для загрузчика данных"""
-    loader = DataLoader(get_db_url())
-    loader.load_features()
+    """Создает загрузчик и загружает данные из снапшота на диске или из БД"""
+    loader = DataLoader(get_db_url(), feed_table=os.getenv("FEED_TABLE", "public.feed_data"))
+    snapshot_path = os.getenv("DATA_SNAPSHOT_PATH")
+    if snapshot_path and os.path.exists(snapshot_path):
+        loader.load_snapshot(snapshot_path)
+    else:
+        loader.load_features()
     return loader
 
 def get_model():
-    """Зависимость для ML модели"""
+    """Загружает модель по умолчанию (MODEL_PATH) для офлайн-задач"""
     return load_model(os.getenv("MODEL_PATH", "catboost_model.cbm"))
 
+def get_model_registry(post_matrix: PostFeatureMatrix) -> ModelRegistry:
+    """
+    Модели над общей матрицей признаков постов: MODEL_PATH - модель по
+    умолчанию, MODEL_PATHS="name=path,..." - дополнительные (загружаются
+    при первом запросе), MODEL_ROUTES="exp_group=name,..." - маршруты
+    """
+    paths = parse_mapping(os.getenv("MODEL_PATHS"))
+    paths[DEFAULT_MODEL] = os.getenv("MODEL_PATH", "catboost_model.cbm")
+    models = ModelRegistry(
+        post_matrix, paths,
+        routes=parse_mapping(os.getenv("MODEL_ROUTES")),
+        # Отбор кандидатов по границам скора: exact или approx, пусто - выключен
+        candidate_mode=os.getenv("CANDIDATE_MODE") or None
+    )
+    models.get(DEFAULT_MODEL)
+    return models
+
+def start_model_watch(models: ModelRegistry):
+    """Проверка файлов моделей каждые MODEL_WATCH_SECONDS секунд; 0 отключает её"""
+    interval = float(os.getenv("MODEL_WATCH_SECONDS", "0"))
+    if interval > 0:
+        models.start_watching(interval)
+
 def get_feature_processor() -> FeatureProcessor:
     """Зависимость для обработки признаков"""
     return FeatureProcessor()
 
-def get_recommendation_service(
-    data_loader: DataLoader = Depends(get_data_loader),
-    model = Depends(get_model),
-    feature_processor: FeatureProcessor = Depends(get_feature_processor)
-) -> RecommendationService:
-    """Зависимость для сервиса рекомендаций"""
-    return RecommendationService(
+def get_score_cache() -> Optional[ScoreCache]:
+    """Кэш скоров по сегментам пользователей; SCORE_CACHE_MB=0 отключает его"""
+    max_mb = float(os.getenv("SCORE_CACHE_MB", "128"))
+    if max_mb <= 0:
+        return None
+    return ScoreCache(max_bytes=int(max_mb * 2 ** 20))
+
+def get_answer_table(data_loader: DataLoader, models: ModelRegistry) -> Optional[AnswerTable]:
+    """
+    Предрассчитанная таблица ответов из ANSWER_TABLE_PATH, если она посчитана
+    для загруженного снапшота данных и модели по умолчанию
+    """
+    path = os.getenv("ANSWER_TABLE_PATH")
+    if not path or not os.path.exists(path):
+        return None
+
+    table = AnswerTable(path)
+    reason = table.mismatch(
+        data_loader.snapshot.version if data_loader.snapshot else None,
+        models.get(models.default).checksum
+    )
+    if reason is not None:
+        logger.warning("Answer table %s is not used: %s", path, reason)
+        return None
+    return table
+
+def start_like_ingester(data_loader: DataLoader) -> Optional[LikeIngester]:
+    """Догрузка новых лайков каждые LIKE_INGEST_SECONDS секунд; 0 отключает её"""
+    interval = float(os.getenv("LIKE_INGEST_SECONDS", "0"))
+    if interval <= 0:
+        return None
+    if data_loader.like_watermark is None:
+        logger.warning("No like watermark for the loaded data; like ingestion is disabled")
+        return None
+
+    ingester = LikeIngester(
+        data_loader.engine, data_loader.like_index, data_loader.feed_table,
+        watermark=data_loader.like_watermark,
+        batch_size=int(os.getenv("LIKE_INGEST_BATCH_SIZE", "50000"))
+    )
+    ingester.start(interval)
+    return ingester
+
+# Метрики общие для всех снапшотов, чтобы переживать перезагрузку данных
+service_metrics = ServiceMetrics()
+
+def build_serving_snapshot(version: int) -> ServingSnapshot:
+    """Загружает данные и модель и собирает из них снапшот для обслуживания"""
+    data_loader = get_data_loader()
+    feature_processor = get_feature_processor()
+    models = get_model_registry(feature_processor.prepare_posts(data_loader.post_features))
+    service = RecommendationService(
         data_loader=data_loader,
-        model=model,
-        feature_processor=feature_processor
-    )
\ No newline at end of file
+        model=models,
+        feature_processor=feature_processor,
+        score_cache=get_score_cache(),
+        answer_table=get_answer_table(data_loader, models),
+        metrics=service_metrics,
+        candidate_budget=int(os.getenv("CANDIDATE_BUDGET", "2000"))
+    )
+    start_model_watch(models)
+    return ServingSnapshot(
+        data_loader=data_loader,
+        models=models,
+        service=service,
+        version=version,
+        loaded_at=time.time(),
+        like_ingester=start_like_ingester(data_loader)
+    )
+
+# Единственное на процесс состояние, загружается при старте приложения
+serving_state = ServingState(build_serving_snapshot)
+
+# Опциональное объединение одиночных запросов в пакеты (MICRO_BATCH_MAX_SIZE > 1)
+micro_batcher = None
+if int(os.getenv("MICRO_BATCH_MAX_SIZE", "0")) > 1:
+    micro_batcher = MicroBatcher(
+        lambda: serving_state.snapshot.service,
+        max_batch_size=int(os.getenv("MICRO_BATCH_MAX_SIZE")),
+        max_wait_ms=float(os.getenv("MICRO_BATCH_WAIT_MS", "2"))
+    )
+
+# Ограниченный пул для скоринга: SCORING_WORKERS потоков, очередь SCORING_QUEUE_SIZE,
+# дедлайн одиночного запроса REQUEST_DEADLINE_MS
+scoring_executor = ScoringExecutor(
+    workers=int(os.getenv("SCORING_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("SCORING_QUEUE_SIZE", "64")),
+    deadline_seconds=float(os.getenv("REQUEST_DEADLINE_MS", "500")) / 1000
+)
+
+# Сэмплирующий профайлер включается только при PROFILER_ENABLED=1;
+# запускается и останавливается через /admin/profiler/*
+profiler = None
+if os.getenv("PROFILER_ENABLED", "0") == "1":
+    profiler = SamplingProfiler(
+        interval=float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000,
+        thread_prefix=os.getenv("PROFILER_THREAD_PREFIX") or None
+    )
+
+def get_serving_state() -> ServingState:
+    """Зависимость для состояния сервиса"""
+    return serving_state
+
+def get_micro_batcher() -> Optional[MicroBatcher]:
+    """Micro-batcher, если он включен"""
+    return micro_batcher
+
+def get_scoring_executor() -> ScoringExecutor:
+    """Пул потоков для скоринга"""
+    return scoring_executor
+
+def get_service_metrics() -> ServiceMetrics:
+    """Задержки стадий и счётчики сервиса"""
+    return service_metrics
+
+def get_profiler() -> Optional[SamplingProfiler]:
+    """Профайлер, если он включен"""
+    return profiler
+
+def get_batch_recommendation_service(
+    state: ServingState = Depends(get_serving_state)
+) -> RecommendationService:
+    """Зависимость для сервиса рекомендаций из текущего снапшота"""
+    if not state.is_ready:
+        raise HTTPException(status_code=503, detail="Service is not ready")
+    return state.snapshot.service
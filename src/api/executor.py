@@ -0,0 +1,174 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних ожиданий в очереди хранится для перцентилей
+WAIT_WINDOW = 2048
+
+
+class QueueFullError(Exception):
+    """Очередь скоринга заполнена, запрос не принят"""
+
+
+class DeadlineExceededError(Exception):
+    """Бюджет времени запроса исчерпан"""
+
+
+class ScoringExecutor:
+    """
+    Ограниченный пул потоков для скоринга с очередью допуска и дедлайном.
+
+    Одновременно выполняется не больше workers задач, и ещё не больше
+    max_queue ждут в очереди; сверх этого запрос сразу отклоняется
+    QueueFullError, а не замедляет всех остальных. Задача, которая
+    не успела начаться до дедлайна, снимается из очереди; уже начатый
+    расчёт дорабатывает, но его результат отбрасывается. Запросы,
+    ожидающие micro-batcher (wait), занимают место в допуске, но не поток.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 64,
+                 deadline_seconds: Optional[float] = 0.5):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scoring")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._waits = deque(maxlen=WAIT_WINDOW)
+
+        self.accepted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.timed_out = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Число принятых задач, которые ещё не начали выполняться"""
+        return self._in_flight - self._running
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"Scoring queue is full ({self.queue_depth} waiting)")
+            self._in_flight += 1
+            self.accepted += 1
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn: Callable, *args, with_deadline: bool = True):
+        """
+        Выполняет fn(*args) в пуле и ждёт результат не дольше дедлайна.
+
+        :param with_deadline: False - ждать без дедлайна (пакетные запросы)
+        :raises QueueFullError: Очередь заполнена
+        :raises DeadlineExceededError: Дедлайн истёк в очереди или во время расчёта
+        """
+        deadline_seconds = self.deadline_seconds if with_deadline else None
+
+        self._admit()
+        submitted = time.monotonic()
+        deadline = submitted + deadline_seconds if deadline_seconds is not None else None
+
+        def task():
+            started = time.monotonic()
+            expired = deadline is not None and started >= deadline
+            with self._lock:
+                self._running += 1
+                self._waits.append(started - submitted)
+                self.expired += expired
+            try:
+                if expired:
+                    raise DeadlineExceededError("Deadline exceeded while queued")
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        future = self._executor.submit(task)
+        future.add_done_callback(self._release)
+
+        timeout = deadline - time.monotonic() if deadline is not None else None
+        try:
+            # Отмена ожидания отменяет и задачу, если она ещё в очереди
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+                # Задача снята из очереди, так и не начавшись
+                self.expired += future.cancelled()
+            raise DeadlineExceededError(
+                f"Deadline of {deadline_seconds * 1000:.0f} ms exceeded"
+            ) from None
+
+    async def wait(self, submit: Callable[[Optional[float]], Future],
+                   with_deadline: bool = True):
+        """
+        Ждёт Future, который ставит в свою очередь submit(deadline), с тем же
+        допуском и дедлайном, что run, но без потока пула на время ожидания
+        (micro-batcher сам считает запросы и выбрасывает просроченные).
+
+        :param submit: Ставит задачу с моментом дедлайна по time.monotonic()
+        :raises QueueFullError: Очередь заполнена
+        :raises DeadlineExceededError: Дедлайн истёк
+        """
+        deadline_seconds = self.deadline_seconds if with_deadline else None
+
+        self._admit()
+        deadline = (time.monotonic() + deadline_seconds
+                    if deadline_seconds is not None else None)
+        try:
+            future = submit(deadline)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        timeout = deadline - time.monotonic() if deadline is not None else None
+        try:
+            # Отмена ожидания отменяет и Future, если расчёт ещё не начат
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except (asyncio.TimeoutError, TimeoutError):
+            with self._lock:
+                self.timed_out += 1
+                self.expired += future.cancelled()
+            raise DeadlineExceededError(
+                f"Deadline of {deadline_seconds * 1000:.0f} ms exceeded"
+            ) from None
+
+    def stats(self) -> Dict:
+        """Глубина очереди, ожидание в очереди и счётчики исходов"""
+        with self._lock:
+            waits = np.array(self._waits, dtype=np.float64)
+            running = self._running
+            queue_depth = self._in_flight - self._running
+
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queue_depth": queue_depth,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "expired_in_queue": self.expired,
+            "deadline_exceeded": self.timed_out,
+            "queue_wait_ms": {
+                "p50": round(float(np.percentile(waits, 50)) * 1000, 2),
+                "p99": round(float(np.percentile(waits, 99)) * 1000, 2),
+                "max": round(float(waits.max()) * 1000, 2)
+            } if len(waits) else None
+        }
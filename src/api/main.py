@@ -1,33 +1,219 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Response
 from . import schemas
-from .dependencies import get_recommendation_service
+from .dependencies import (
+    get_batch_recommendation_service, get_micro_batcher, get_profiler,
+    get_scoring_executor, get_serving_state, get_service_metrics
+)
+from .executor import DeadlineExceededError, QueueFullError, ScoringExecutor
+from .metrics import CONTENT_TYPE, render_metrics
+from .state import ServingState
+from src.utils.metrics import ServiceMetrics
+from src.utils.micro_batcher import MicroBatcher
+from src.utils.recommendation_service import RecommendationService
+from src.utils.profiler import SamplingProfiler
 from datetime import datetime
 import logging
-from typing import List
+import os
+from time import perf_counter
+from typing import List, Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Social Media Recommendation System")
 
+@app.on_event("startup")
+def load_serving_state():
+    """Загружает данные и модель один раз при старте приложения"""
+    state = get_serving_state()
+    state.load()
+
+    refresh_interval = float(os.getenv("SNAPSHOT_REFRESH_SECONDS", "0"))
+    if refresh_interval > 0:
+        state.start_periodic_refresh(refresh_interval)
+
+    micro_batcher = get_micro_batcher()
+    if micro_batcher is not None:
+        micro_batcher.start()
+
+@app.on_event("shutdown")
+def stop_serving_state():
+    """Останавливает фоновую перезагрузку данных и micro-batcher"""
+    get_serving_state().stop()
+
+    micro_batcher = get_micro_batcher()
+    if micro_batcher is not None:
+        micro_batcher.stop()
+
+    get_scoring_executor().shutdown()
+
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.stop()
+
+async def run_scoring(executor: ScoringExecutor, fn, *args, with_deadline: bool = True,
+                      micro_batcher: Optional[MicroBatcher] = None):
+    """
+    Скоринг в ограниченном пуле; перегрузка и дедлайн отдаются как 503/504.
+
+    С micro_batcher fn не вызывается: запрос (args - user_id, time, limit)
+    ставится в батчер с дедлайном, и ожидание не занимает поток пула.
+    """
+    started = perf_counter()
+    try:
+        if micro_batcher is not None:
+            return await executor.wait(
+                lambda deadline: micro_batcher.submit(*args, deadline=deadline),
+                with_deadline=with_deadline
+            )
+        return await executor.run(fn, *args, with_deadline=with_deadline)
+    except QueueFullError as e:
+        logger.warning(f"Request rejected: {e}")
+        raise HTTPException(status_code=503, detail="Service is overloaded, retry later",
+                            headers={"Retry-After": "1"})
+    except DeadlineExceededError as e:
+        elapsed_ms = (perf_counter() - started) * 1000
+        logger.warning(f"{e} after {elapsed_ms:.0f} ms")
+        raise HTTPException(status_code=504,
+                            detail=f"Request deadline exceeded after {elapsed_ms:.0f} ms")
+    except Exception:
+        elapsed_ms = (perf_counter() - started) * 1000
+        logger.exception(f"Recommendation failed after {elapsed_ms:.0f} ms")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def batched_recommendations(micro_batcher: MicroBatcher, executor: ScoringExecutor,
+                                  service_metrics: ServiceMetrics,
+                                  user_id: int, request_time: datetime, limit: int) -> bytes:
+    """
+    Запрос через MicroBatcher с замером задержки "request" от постановки
+    в очередь до готового JSON, как у RecommendationService без батчера.
+    Отказ по переполнению (503) в задержку не входит: сервис его не видит.
+    """
+    started = perf_counter()
+    accepted = True
+    try:
+        # Посты собираются тем же снапшотом, которым посчитаны
+        service, post_ids = await run_scoring(executor, None, user_id, request_time, limit,
+                                              micro_batcher=micro_batcher)
+        with service_metrics.span("serialize"):
+            return service.to_json(post_ids)
+    except HTTPException as e:
+        accepted = e.status_code != 503
+        raise
+    finally:
+        if accepted:
+            service_metrics.observe("request", perf_counter() - started)
+
 @app.get("/post/recommendations/", response_model=List[schemas.PostGet])
-def recommended_posts(
+async def recommended_posts(
     id: int = Query(..., example=201),
     time: datetime = Query(..., example="2021-10-15T12:00:00Z"),
     limit: int = Query(5, example=5),
-    recommendation_service = Depends(get_recommendation_service)
-) -> List[schemas.PostGet]:
+    recommendation_service: RecommendationService = Depends(get_batch_recommendation_service),
+    micro_batcher: Optional[MicroBatcher] = Depends(get_micro_batcher),
+    executor: ScoringExecutor = Depends(get_scoring_executor),
+    service_metrics: ServiceMetrics = Depends(get_service_metrics)
+) -> Response:
     """Возвращает персонализированные рекомендации постов"""
-    try:
-        return recommendation_service(
-            user_id=id,
-            request_time=time,
-            limit=limit
+    # Ответ собирается из предсериализованных постов; response_model остаётся для схемы
+    if micro_batcher is not None:
+        content = await batched_recommendations(micro_batcher, executor, service_metrics,
+                                                id, time, limit)
+    else:
+        content = await run_scoring(
+            executor, recommendation_service.get_recommendations_json, id, time, limit
         )
-    except Exception:
-        raise HTTPException(status_code=500, detail="Internal server error")
+    return Response(content=content, media_type="application/json")
+
+@app.post("/post/recommendations/batch", response_model=List[List[schemas.PostGet]])
+async def recommended_posts_batch(
+    request: schemas.BatchRecommendationRequest,
+    recommendation_service = Depends(get_batch_recommendation_service),
+    executor: ScoringExecutor = Depends(get_scoring_executor)
+) -> Response:
+    """Возвращает рекомендации для нескольких пар (id, time) одним вызовом модели"""
+    # Пакет проходит через тот же пул, но без дедлайна одиночного запроса
+    content = await run_scoring(
+        executor, recommendation_service.get_recommendations_batch_json,
+        [(item.id, item.time, request.limit) for item in request.requests],
+        with_deadline=False
+    )
+    return Response(content=content, media_type="application/json")
+
+@app.post("/admin/reload", status_code=202)
+def reload_data(state: ServingState = Depends(get_serving_state)):
+    """Запускает фоновую перезагрузку данных и модели"""
+    started = state.refresh_in_background()
+    return {"status": "started" if started else "in_progress"}
+
+@app.get("/admin/models")
+def list_models(state: ServingState = Depends(get_serving_state)):
+    """Модели реестра: версии, маршруты exp_group, память"""
+    if not state.is_ready:
+        raise HTTPException(status_code=503, detail="Service is not ready")
+    return state.snapshot.models.stats()
+
+@app.post("/admin/models/{name}/reload")
+def reload_model(name: str, path: Optional[str] = None,
+                 state: ServingState = Depends(get_serving_state)):
+    """
+    Загружает модель заново (из path или прежнего файла) и подменяет её
+    без перезагрузки данных; запросы в процессе дорабатывают на старой версии
+    """
+    if not state.is_ready:
+        raise HTTPException(status_code=503, detail="Service is not ready")
+    models = state.snapshot.models
+    if name not in models.names:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+    try:
+        ranker = models.swap(name, path)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=f"Model {name} was not reloaded: {e}")
+    return dict(ranker.stats(), name=name)
 
 @app.get("/health")
-def health_check():
+def health_check(state: ServingState = Depends(get_serving_state)):
     """Проверка работоспособности сервиса"""
-    return {"status": "ok", "message": "Service is operational"}
\ No newline at end of file
+    if not state.is_ready:
+        return {"status": "loading", "message": "Serving snapshot is not loaded yet"}
+
+    snapshot = state.snapshot
+    score_cache = snapshot.service.score_cache
+    return {
+        "status": "ok",
+        "message": "Service is operational",
+        "snapshot_version": snapshot.version,
+        "snapshot_age_seconds": round(snapshot.age_seconds, 1),
+        "last_refresh_error": state.last_error,
+        "score_cache": score_cache.stats() if score_cache is not None else None,
+        "scoring_executor": get_scoring_executor().stats(),
+        "like_ingester": snapshot.like_ingester.stats() if snapshot.like_ingester else None,
+        "models": snapshot.models.stats()
+    }
+
+@app.get("/metrics")
+def metrics(
+    state: ServingState = Depends(get_serving_state),
+    service_metrics: ServiceMetrics = Depends(get_service_metrics),
+    executor: ScoringExecutor = Depends(get_scoring_executor)
+) -> Response:
+    """Метрики в текстовом формате Prometheus"""
+    content = render_metrics(state, service_metrics, executor, get_micro_batcher())
+    return Response(content=content, media_type=CONTENT_TYPE)
+
+def require_profiler(profiler: Optional[SamplingProfiler] = Depends(get_profiler)) -> SamplingProfiler:
+    """Профайлер доступен только при PROFILER_ENABLED=1"""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler is disabled, set PROFILER_ENABLED=1")
+    return profiler
+
+@app.post("/admin/profiler/start")
+def start_profiler(profiler: SamplingProfiler = Depends(require_profiler)):
+    """Запускает сэмплирующий профайлер стеков"""
+    profiler.start()
+    return profiler.stats()
+
+@app.post("/admin/profiler/stop")
+def stop_profiler(profiler: SamplingProfiler = Depends(require_profiler)) -> Response:
+    """Останавливает профайлер и отдаёт стеки в формате collapsed stacks"""
+    return Response(content=profiler.stop(), media_type="text/plain")
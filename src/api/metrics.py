@@ -0,0 +1,105 @@
+import logging
+from typing import Dict, List, Optional
+
+import psutil
+
+from src.api.executor import ScoringExecutor
+from src.api.state import ServingState
+from src.utils.metrics import ServiceMetrics, gauge_lines, metric_line
+from src.utils.micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Тип содержимого текстового формата Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+PREFIX = "recommender"
+
+
+def model_lines(models: Dict[str, Dict]) -> List[str]:
+    """Версия и память каждой модели реестра с меткой model"""
+    lines = []
+    for metric, field, help_text in (
+        ("model_version", "version", "Loaded version of the model, 0 - not loaded"),
+        ("model_file_bytes", "model_bytes", "Size of the model file"),
+        ("model_post_bytes", "post_bytes", "Memory of arrays built for the posts of the snapshot"),
+    ):
+        name = f"{PREFIX}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [metric_line(name, stats.get(field) or 0, (("model", model),))
+                  for model, stats in models.items()]
+    return lines
+
+
+def render_metrics(state: ServingState, service_metrics: ServiceMetrics,
+                   executor: ScoringExecutor,
+                   micro_batcher: Optional[MicroBatcher] = None) -> str:
+    """
+    Метрики процесса в текстовом формате Prometheus.
+
+    Гистограммы стадий и счётчики берутся из ServiceMetrics, остальное -
+    из статистики кэша скоров, таблицы ответов, пула скоринга,
+    догрузки лайков и снапшота на момент запроса.
+    """
+    lines: List[str] = service_metrics.render(PREFIX)
+
+    lines += gauge_lines(f"{PREFIX}_ready", int(state.is_ready),
+                         "Whether a serving snapshot is loaded")
+    if state.is_ready:
+        snapshot = state.snapshot
+        lines += gauge_lines(f"{PREFIX}_snapshot_version", snapshot.version,
+                             "Version of the serving snapshot")
+        lines += gauge_lines(f"{PREFIX}_snapshot_age_seconds", round(snapshot.age_seconds, 3),
+                             "Age of the serving snapshot")
+
+        score_cache = snapshot.service.score_cache
+        if score_cache is not None:
+            stats = score_cache.stats()
+            lines += gauge_lines(f"{PREFIX}_score_cache_hits_total", stats["hits"],
+                                 "Score cache hits", "counter")
+            lines += gauge_lines(f"{PREFIX}_score_cache_misses_total", stats["misses"],
+                                 "Score cache misses", "counter")
+            lines += gauge_lines(f"{PREFIX}_score_cache_hit_ratio", stats["hit_rate"],
+                                 "Score cache hit ratio since start")
+            lines += gauge_lines(f"{PREFIX}_score_cache_bytes", stats["bytes"],
+                                 "Memory held by cached score vectors")
+
+        answer_table = snapshot.service.answer_table
+        if answer_table is not None:
+            stats = answer_table.stats()
+            lines += gauge_lines(f"{PREFIX}_answer_table_hits_total", stats["hits"],
+                                 "Requests answered from the precomputed table", "counter")
+            lines += gauge_lines(f"{PREFIX}_answer_table_misses_total", stats["misses"],
+                                 "Requests not covered by the precomputed table", "counter")
+
+        lines += model_lines(snapshot.models.stats())
+
+        if snapshot.like_ingester is not None:
+            stats = snapshot.like_ingester.stats()
+            lines += gauge_lines(f"{PREFIX}_like_delta_size", stats["delta_size"],
+                                 "Likes in the live index delta")
+            lines += gauge_lines(f"{PREFIX}_like_ingested_total", stats["new_likes"],
+                                 "Likes added by the ingester", "counter")
+
+    stats = executor.stats()
+    lines += gauge_lines(f"{PREFIX}_scoring_queue_depth", stats["queue_depth"],
+                         "Accepted scoring tasks waiting for a worker")
+    lines += gauge_lines(f"{PREFIX}_scoring_running", stats["running"],
+                         "Scoring tasks being executed")
+    lines += gauge_lines(f"{PREFIX}_scoring_rejected_total", stats["rejected"],
+                         "Requests rejected with a full queue", "counter")
+    lines += gauge_lines(f"{PREFIX}_scoring_deadline_exceeded_total",
+                         stats["deadline_exceeded"] + stats["expired_in_queue"],
+                         "Requests that missed their deadline", "counter")
+
+    if micro_batcher is not None:
+        lines += gauge_lines(f"{PREFIX}_micro_batch_mean_size",
+                             round(micro_batcher.mean_batch_size, 3),
+                             "Mean micro-batch size")
+        lines += gauge_lines(f"{PREFIX}_micro_batch_expired_total", micro_batcher.expired,
+                             "Micro-batched requests dropped after their deadline", "counter")
+
+    memory = psutil.Process().memory_info()
+    lines += gauge_lines("process_resident_memory_bytes", memory.rss,
+                         "Resident memory size in bytes")
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,21 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
 from datetime import datetime
 
+# Максимальное число запросов в одном пакетном вызове
+MAX_BATCH_SIZE = 1000
+
 class PostGet(BaseModel):
     id: int
     text: str
     topic: str
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class RecommendationRequest(BaseModel):
+    id: int
+    time: datetime
+
+class BatchRecommendationRequest(BaseModel):
+    requests: conlist(RecommendationRequest, min_items=1, max_items=MAX_BATCH_SIZE)
+    limit: int = 5
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.utils.data_loader import DataLoader
+from src.utils.like_ingester import LikeIngester
+from src.utils.model_registry import ModelRegistry
+from src.utils.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ServingSnapshot:
+    """
+    Неизменяемый набор данных и моделей, которым обслуживаются запросы.
+    Отдельные модели реестра заменяются без перезагрузки данных.
+    """
+    data_loader: DataLoader
+    models: ModelRegistry
+    service: RecommendationService
+    version: int
+    loaded_at: float
+    like_ingester: Optional[LikeIngester] = None
+
+    @property
+    def age_seconds(self) -> float:
+        """Возраст снапшота в секундах"""
+        return time.time() - self.loaded_at
+
+
+class ServingState:
+    """
+    Состояние сервиса на время жизни приложения.
+
+    Данные и модель загружаются один раз при старте. Обработчики запросов
+    читают текущий снапшот по одной ссылке, а перезагрузка сначала целиком
+    строит новый снапшот и только затем подменяет ссылку, поэтому запросы
+    в процессе обработки никогда не видят частично обновлённые данные.
+    """
+
+    def __init__(self, builder: Callable[[int], ServingSnapshot]):
+        self._builder = builder
+        self._snapshot: Optional[ServingSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._periodic_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.last_error: Optional[str] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def snapshot(self) -> ServingSnapshot:
+        """Текущий снапшот; ссылка читается один раз на запрос"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Serving state is not loaded")
+        return snapshot
+
+    def load(self) -> ServingSnapshot:
+        """Синхронно строит новый снапшот и атомарно подменяет текущий"""
+        with self._refresh_lock:
+            previous = self._snapshot
+            version = previous.version + 1 if previous else 1
+            started = time.perf_counter()
+
+            snapshot = self._builder(version)
+            self._snapshot = snapshot
+            self.last_error = None
+
+            logger.info("Serving snapshot v%d loaded in %.2fs",
+                        version, time.perf_counter() - started)
+
+        if previous is not None:
+            # Пул соединений старого снапшота больше не нужен:
+            # запросы работают только с данными в памяти
+            if previous.like_ingester is not None:
+                previous.like_ingester.stop()
+            previous.models.stop()
+            previous.data_loader.engine.dispose()
+        return snapshot
+
+    def refresh_in_background(self) -> bool:
+        """
+        Запускает перезагрузку в фоновом потоке.
+
+        :return: False, если перезагрузка уже выполняется
+        """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return False
+
+        self._refresh_thread = threading.Thread(
+            target=self._safe_refresh, name="snapshot-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+        return True
+
+    def start_periodic_refresh(self, interval_seconds: float):
+        """Периодически перезагружает снапшот в фоне"""
+        if self._periodic_thread is not None:
+            return
+
+        def loop():
+            while not self._stop_event.wait(interval_seconds):
+                self._safe_refresh()
+
+        self._periodic_thread = threading.Thread(
+            target=loop, name="snapshot-periodic-refresh", daemon=True
+        )
+        self._periodic_thread.start()
+
+    def stop(self):
+        """Останавливает периодическую перезагрузку, догрузку лайков и проверку моделей"""
+        self._stop_event.set()
+        snapshot = self._snapshot
+        if snapshot is not None:
+            if snapshot.like_ingester is not None:
+                snapshot.like_ingester.stop()
+            snapshot.models.stop()
+
+    def _safe_refresh(self):
+        """Перезагрузка, при ошибке которой продолжает работать старый снапшот"""
+        try:
+            self.load()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("Snapshot refresh failed, keeping previous snapshot")
@@ -0,0 +1,325 @@
+"""
+Сборка таблицы фич постов (как d_okulova_post_features_lesson_22) из
+post_text_df и feed_data без плотных матриц размером со словарь.
+
+Шаги:
+    1. Тексты читаются из БД чанками и лемматизируются nlp.pipe пачками
+       в n_process процессов; леммы сбрасываются во временный файл
+       по строке на пост, в памяти остаются только post_id.
+    2. TF-IDF обучается за один проход по файлу лемм, матрица остаётся
+       разреженной; TruncatedSVD и MiniBatchKMeans работают с ней
+       и с компонентами (n_posts x 20) напрямую (см. src.modeling.text_features).
+    3. views и view_reach - тот же GROUP BY по feed_data, что в ноутбуке.
+    4. Таблица пишется чанками: тексты и темы читаются из БД повторно,
+       к ним присоединяются посчитанные фичи. С --snapshot таблица
+       публикуется новой версией снапшота (остальные таблицы переносятся
+       жёсткими ссылками) вместе с sha256 файла --text-model: по нему
+       post_feature_updater проверяет, что считает кластеры новых постов
+       той же моделью.
+
+--dense с --stats notebook повторяет процедуру ноутбука (PCA + KMeans
+на плотной матрице), но не гарантирует тех же фич, на которых обучены
+модели в models/: метки KMeans зависят от порядка строк и инициализации,
+а посты здесь читаются в порядке post_id, тогда как ноутбук брал их
+неупорядоченным SELECT *. Номера TextCluster (и порядок колонок
+DistanceTo*Cluster) нужно сверить с развёрнутой таблицей фич, прежде
+чем отдавать таблицу текущим .cbm моделям. Разреженный вариант
+(TruncatedSVD + MiniBatchKMeans) и --stats tfidf дают заведомо другие
+фичи, и модель нужно переобучить; поэтому без --dense скрипт пишет
+таблицу только с флагом --retrain, подтверждающим переобучение.
+Для каждого шага в лог пишутся время и пиковый RSS процесса и дочерних
+процессов лемматизации.
+
+    # Процедура ноутбука; кластеры сверяются с развёрнутой таблицей
+    python -m src.modeling.build_post_features --dense \\
+        --out data/processed/post_features.csv \\
+        --text-model models/text_features.joblib --n-process 4
+
+    # Разреженный вариант для большого корпуса; после него модель переобучается
+    python -m src.modeling.build_post_features --retrain \\
+        --out data/processed/post_features_retrain.csv \\
+        --text-model models/text_features_retrain.joblib --n-process 4
+"""
+import time
+import logging
+import argparse
+import resource
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from src.modeling.text_features import (
+    LEMMATIZE_BATCH_SIZE, N_CLUSTERS, N_COMPONENTS, STAT_COLUMNS, TEXT_MODEL_CHECKSUM,
+    fit_text_features, lemmatize, load_nlp, tfidf_stat_features, view_stat_features
+)
+from src.utils.bulk_loader import stream_query
+from src.utils.feature_processor import TIME_FEATURES, USER_FEATURES, FeatureProcessor
+from src.utils.id_index import IdIndex
+from src.utils.snapshot import open_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+POSTS_CHUNKSIZE = 10000
+
+
+@dataclass
+class StageReport:
+    """Время шага и пиковый RSS к его концу (ru_maxrss монотонен)"""
+    name: str
+    seconds: float
+    peak_rss_bytes: int
+    peak_children_rss_bytes: int
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.seconds:.2f}s, "
+                f"peak RSS {self.peak_rss_bytes / 2 ** 20:.1f} MB, "
+                f"children {self.peak_children_rss_bytes / 2 ** 20:.1f} MB")
+
+
+def _peak_rss(who: int) -> int:
+    # На Linux ru_maxrss в килобайтах
+    return resource.getrusage(who).ru_maxrss * 1024
+
+
+class PostFeatureBuilder:
+    """Построение фич постов по шагам с отчётом о времени и памяти"""
+
+    def __init__(self, engine, posts_table: str = "public.post_text_df",
+                 feed_table: str = "public.feed_data",
+                 nlp=None, n_process: int = 1,
+                 batch_size: int = LEMMATIZE_BATCH_SIZE,
+                 chunksize: int = POSTS_CHUNKSIZE):
+        self.engine = engine
+        self.posts_table = posts_table
+        self.feed_table = feed_table
+        self.nlp = nlp
+        self.n_process = n_process
+        self.batch_size = batch_size
+        self.chunksize = chunksize
+        self.reports: List[StageReport] = []
+
+    def _stage(self, name: str, started: float):
+        report = StageReport(name, time.perf_counter() - started,
+                             _peak_rss(resource.RUSAGE_SELF),
+                             _peak_rss(resource.RUSAGE_CHILDREN))
+        self.reports.append(report)
+        logger.info("%s", report)
+
+    def _posts(self, columns: str) -> Iterator[pd.DataFrame]:
+        query = f"SELECT {columns} FROM {self.posts_table} ORDER BY post_id"
+        return stream_query(self.engine, query, self.chunksize)
+
+    def spool_lemmas(self, path: Path) -> np.ndarray:
+        """
+        Лемматизирует все тексты в файл по строке на пост.
+
+        :return: post_id в порядке строк файла
+        """
+        started = time.perf_counter()
+        nlp = self.nlp or load_nlp()
+        post_ids = []
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in self._posts("post_id, text"):
+                texts = chunk['text'].fillna("").tolist()
+                for lemmas in lemmatize(texts, nlp, self.batch_size, self.n_process):
+                    f.write(lemmas.replace("\n", " "))
+                    f.write("\n")
+                post_ids.append(chunk['post_id'].to_numpy(dtype=np.int64))
+        self._stage("lemmatize", started)
+        return np.concatenate(post_ids) if post_ids else np.empty(0, dtype=np.int64)
+
+    def view_counts(self, post_ids: np.ndarray) -> pd.DataFrame:
+        """views и view_reach постов; 0 для постов без просмотров, как fillna(0)"""
+        started = time.perf_counter()
+        counts = pd.read_sql(f"""
+            SELECT
+                post_id,
+                SUM(CASE WHEN action = 'view' THEN 1 ELSE 0 END) AS views,
+                COUNT(DISTINCT CASE WHEN action = 'view' THEN user_id END) AS view_reach
+            FROM {self.feed_table}
+            GROUP BY 1
+        """, self.engine)
+        rows = IdIndex(post_ids).lookup_many(counts['post_id'].to_numpy())
+        known = rows >= 0
+        result = pd.DataFrame({
+            'views': np.zeros(len(post_ids), dtype=np.int64),
+            'view_reach': np.zeros(len(post_ids), dtype=np.int64),
+        })
+        result.loc[rows[known], 'views'] = counts['views'].to_numpy()[known]
+        result.loc[rows[known], 'view_reach'] = counts['view_reach'].to_numpy()[known]
+        self._stage("view counts", started)
+        return result
+
+    def build(self, lemmas_path: Path, stats: str = "notebook",
+              n_components: int = N_COMPONENTS, n_clusters: int = N_CLUSTERS,
+              dense: bool = False):
+        """
+        Строит фичи всех постов без текстов и тем.
+
+        :return: (DataFrame фич по post_id, обученная TextFeatureModel)
+        """
+        post_ids = self.spool_lemmas(lemmas_path)
+
+        started = time.perf_counter()
+        with open(lemmas_path, encoding="utf-8") as f:
+            model, tfidf_matrix, components = fit_text_features(
+                (line.rstrip("\n") for line in f),
+                n_components=n_components, n_clusters=n_clusters, dense=dense
+            )
+        logger.info("TF-IDF matrix %s with %d non-zeros (%.1f MB)", tfidf_matrix.shape,
+                    tfidf_matrix.nnz, tfidf_matrix.data.nbytes / 2 ** 20)
+        self._stage("tfidf + reduce + cluster", started)
+
+        views = self.view_counts(post_ids)
+
+        started = time.perf_counter()
+        if stats == "notebook":
+            stat_features = view_stat_features(post_ids, views['views'], views['view_reach'])
+        elif stats == "tfidf":
+            stat_features = tfidf_stat_features(tfidf_matrix)
+        else:
+            raise ValueError(f"Unknown stats mode: {stats}")
+        del tfidf_matrix
+
+        features = pd.concat([
+            pd.DataFrame({'post_id': post_ids}),
+            views,
+            stat_features[STAT_COLUMNS],
+            model.cluster_features(components)
+        ], axis=1)
+        self._stage("features", started)
+        return features, model
+
+    def _parts(self, features: pd.DataFrame) -> Iterator[pd.DataFrame]:
+        """
+        Чанки итоговой таблицы: тексты и темы из БД с посчитанными фичами.
+
+        Посты, появившиеся после лемматизации, пропускаются до следующей сборки.
+        """
+        index = IdIndex(features['post_id'].to_numpy())
+        feature_columns = [column for column in features.columns if column != 'post_id']
+        for chunk in self._posts("post_id, text, topic"):
+            rows = index.lookup_many(chunk['post_id'].to_numpy())
+            known = rows >= 0
+            if not known.all():
+                logger.warning("Skipping %d posts added after lemmatization",
+                               int((~known).sum()))
+            part = chunk[known].reset_index(drop=True)
+            yield pd.concat(
+                [part, features[feature_columns].iloc[rows[known]].reset_index(drop=True)],
+                axis=1
+            )
+
+    def write(self, features: pd.DataFrame, out: Optional[str] = None,
+              table: Optional[str] = None) -> int:
+        """
+        Пишет таблицу чанками в CSV и/или таблицу БД.
+
+        :return: Число записанных строк
+        """
+        started = time.perf_counter()
+        written = 0
+        for i, part in enumerate(self._parts(features)):
+            if out:
+                part.to_csv(out, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            if table:
+                part.to_sql(table, self.engine, index=False,
+                            if_exists="replace" if i == 0 else "append")
+            written += len(part)
+        self._stage("write", started)
+        return written
+
+    def publish(self, features: pd.DataFrame, snapshot_root: str,
+                text_model_checksum: str, keep: int = 3) -> Path:
+        """
+        Публикует таблицу новой версией снапшота с sha256 модели текстов
+        в метаданных; остальные таблицы переносятся из текущей версии.
+        """
+        started = time.perf_counter()
+        snapshot = open_snapshot(snapshot_root)
+        tables = dict(snapshot.tables)
+        tables["post_features"] = pd.concat(list(self._parts(features)), ignore_index=True)
+        metadata = dict(snapshot.metadata, **{TEXT_MODEL_CHECKSUM: text_model_checksum})
+        path = write_snapshot(snapshot_root, tables, keep=keep, metadata=metadata)
+        self._stage("publish", started)
+        return path
+
+
+def check_columns(columns: List[str]):
+    """Проверяет, что таблица содержит все постовые признаки FeatureProcessor"""
+    post_features = [
+        name for name in FeatureProcessor().features
+        if name not in USER_FEATURES and name not in TIME_FEATURES
+    ]
+    missing = [name for name in post_features if name not in columns]
+    if missing:
+        raise ValueError(f"Post features are missing columns: {missing}")
+
+
+def main():
+    from src.api.dependencies import get_db_url
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--out", help="Output CSV file")
+    parser.add_argument("--table", help="Output table in the database")
+    parser.add_argument("--snapshot",
+                        help="Publish the table as a new version of this snapshot, "
+                             "recording the --text-model checksum")
+    parser.add_argument("--keep", type=int, default=3, help="Snapshot versions to keep")
+    parser.add_argument("--text-model", required=True, help="Where to save TextFeatureModel")
+    parser.add_argument("--posts-table", default="public.post_text_df")
+    parser.add_argument("--feed-table", default="public.feed_data")
+    parser.add_argument("--stats", choices=["notebook", "tfidf"], default="notebook",
+                        help="How to compute TotalTfIdf/MaxTfIdf/MeanTfIdf; "
+                             "tfidf requires --retrain")
+    parser.add_argument("--dense", action="store_true",
+                        help="PCA + KMeans on the dense matrix, the notebook's procedure; "
+                             "TextCluster ids depend on row order and init, so validate "
+                             "them against the deployed table before serving current models")
+    parser.add_argument("--retrain", action="store_true",
+                        help="Confirm that the model will be retrained on the output: "
+                             "required without --dense or with --stats tfidf, because "
+                             "TextCluster/DistanceTo*Cluster/TfIdf features then differ "
+                             "from the ones the current models were trained on")
+    parser.add_argument("--n-process", type=int, default=1, help="Lemmatization processes")
+    parser.add_argument("--batch-size", type=int, default=LEMMATIZE_BATCH_SIZE)
+    parser.add_argument("--chunksize", type=int, default=POSTS_CHUNKSIZE)
+    args = parser.parse_args()
+    if not args.out and not args.table and not args.snapshot:
+        parser.error("--out, --table or --snapshot is required")
+    if (not args.dense or args.stats != "notebook") and not args.retrain:
+        parser.error("Without --dense and --stats notebook the features differ from the "
+                     "notebook's; pass --dense, or --retrain if the model will be "
+                     "retrained on this table")
+
+    builder = PostFeatureBuilder(
+        sa.create_engine(get_db_url()), posts_table=args.posts_table,
+        feed_table=args.feed_table, n_process=args.n_process,
+        batch_size=args.batch_size, chunksize=args.chunksize
+    )
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        features, model = builder.build(Path(tmp) / "lemmas.txt", stats=args.stats,
+                                        dense=args.dense)
+    check_columns(['topic'] + list(features.columns))
+    model.save(args.text_model)
+    written = builder.write(features, args.out, args.table) if args.out or args.table else 0
+    if args.snapshot:
+        path = builder.publish(features, args.snapshot, model.checksum, keep=args.keep)
+        print(f"Snapshot written to {path}")
+
+    for report in builder.reports:
+        print(report)
+    print(f"{written} posts in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,351 @@
+"""
+Потоковая сборка обучающей выборки вместо merge всей feed_data
+в памяти (notebooks/training.ipynb).
+
+Просмотры из feed_data читаются чанками в порядке времени. Фичи
+пользователей и постов присоединяются выборкой строк по IdIndex вместо
+hash-merge, временные фичи считаются векторно на чанк
+(time_feature_columns). Каждый чанк пишется отдельным шардом в колоночном
+формате снапшота (типизированные .npy, строки - кодами со словарём),
+поэтому память ограничена размером чанка, а не всей выборкой.
+
+TrainingSet отдаёт шарды как catboost.Pool по одному (для дообучения
+через init_model) или склеенными по диапазону времени.
+
+Опционально негативы прореживаются по пользователям: у каждого остаётся
+в среднем не больше negative_ratio негативов на позитив (на один, если
+позитивов нет), оставленные негативы получают вес 1 / доля.
+
+    python -m src.modeling.build_training_set --out data/processed/training_set \\
+        --snapshot data/snapshot --negative-ratio 3
+"""
+import json
+import time
+import shutil
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+from catboost import Pool
+
+from src.utils.bulk_loader import CHUNKSIZE, load_table
+from src.utils.feature_processor import (
+    TIME_FEATURES, USER_FEATURES, FeatureProcessor, time_feature_columns
+)
+from src.utils.id_index import IdIndex
+from src.utils.snapshot import SnapshotTable, open_snapshot, write_table
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+LABEL = "target"
+WEIGHT = "weight"
+KEY_COLUMNS = ['timestamp', 'user_id', 'post_id']
+
+
+class FeatureTable:
+    """Колонки таблицы фич, из которых строки выбираются по id без копии таблицы"""
+
+    def __init__(self, df: pd.DataFrame, id_column: str, columns: List[str]):
+        self.index = IdIndex(df[id_column].to_numpy())
+        self._columns = {}
+        for name in columns:
+            column = df[name]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                self._columns[name] = (column.cat.codes.to_numpy(), column.cat.categories)
+            elif column.dtype == object:
+                codes, categories = pd.factorize(column)
+                self._columns[name] = (codes.astype(np.int32), pd.Index(categories))
+            else:
+                self._columns[name] = (column.to_numpy(), None)
+
+    def take(self, rows: np.ndarray) -> Dict[str, Union[np.ndarray, pd.Categorical]]:
+        """Значения колонок для строк rows; строки - pd.Categorical"""
+        result = {}
+        for name, (values, categories) in self._columns.items():
+            if categories is None:
+                result[name] = values[rows]
+            else:
+                result[name] = pd.Categorical.from_codes(values[rows], categories=categories)
+        return result
+
+
+class TrainingSetBuilder:
+    """Сборка обучающей выборки из feed_data чанками по времени"""
+
+    def __init__(self, engine, post_features: pd.DataFrame, user_features: pd.DataFrame,
+                 feed_table: str = "public.feed_data",
+                 chunksize: int = CHUNKSIZE,
+                 negative_ratio: Optional[float] = None,
+                 seed: int = 42):
+        processor = FeatureProcessor()
+        self.features = processor.features
+        self.cat_features = processor.cat_features
+        post_columns = [
+            name for name in self.features
+            if name not in USER_FEATURES and name not in TIME_FEATURES
+        ]
+        self.posts = FeatureTable(post_features, 'post_id', post_columns)
+        self.users = FeatureTable(user_features, 'user_id', USER_FEATURES)
+
+        self.engine = engine
+        self.feed_table = feed_table
+        self.chunksize = chunksize
+        self.negative_ratio = negative_ratio
+        self.rng = np.random.default_rng(seed)
+        self._keep_rates: Optional[np.ndarray] = None
+
+    def negative_keep_rates(self) -> np.ndarray:
+        """Доля оставляемых негативов по строкам пользователей"""
+        counts = pd.read_sql(f"""
+            SELECT user_id, SUM(target) AS positives, COUNT(*) - SUM(target) AS negatives
+            FROM {self.feed_table}
+            WHERE action = 'view'
+            GROUP BY user_id
+        """, self.engine)
+        rates = np.ones(len(self.users.index))
+        rows = self.users.index.lookup_many(counts['user_id'].to_numpy())
+        known = rows >= 0
+        allowed = self.negative_ratio * np.maximum(counts['positives'].to_numpy(), 1)
+        negatives = np.maximum(counts['negatives'].to_numpy(), 1)
+        rates[rows[known]] = np.minimum(allowed / negatives, 1.0)[known]
+        return rates
+
+    def events(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               limit: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Просмотры из feed_data чанками в порядке времени, [start, end)"""
+        conditions = ["action = 'view'"]
+        params = {}
+        bounds = []
+        if start is not None:
+            conditions.append("timestamp >= :start")
+            params["start"] = start
+            bounds.append(sa.bindparam("start", type_=sa.DateTime()))
+        if end is not None:
+            conditions.append("timestamp < :end")
+            params["end"] = end
+            bounds.append(sa.bindparam("end", type_=sa.DateTime()))
+        query = f"""
+            SELECT timestamp, user_id, post_id, target FROM {self.feed_table}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY timestamp
+        """
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            yield from pd.read_sql(sa.text(query).bindparams(*bounds), conn, params=params,
+                                   chunksize=self.chunksize, parse_dates=["timestamp"])
+
+    def chunk_frame(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Строки выборки для чанка событий.
+
+        События с неизвестными пользователем или постом отбрасываются,
+        как при inner merge в ноутбуке.
+        """
+        user_rows = self.users.index.lookup_many(chunk['user_id'].to_numpy())
+        post_rows = self.posts.index.lookup_many(chunk['post_id'].to_numpy())
+        keep = (user_rows >= 0) & (post_rows >= 0)
+
+        target = chunk['target'].to_numpy()
+        weight = None
+        if self.negative_ratio is not None:
+            if self._keep_rates is None:
+                self._keep_rates = self.negative_keep_rates()
+            rates = np.ones(len(chunk))
+            rates[keep] = self._keep_rates[user_rows[keep]]
+            rates[target == 1] = 1.0
+            keep &= self.rng.random(len(chunk)) < rates
+            weight = 1.0 / rates[keep]
+
+        columns = {name: chunk[name].to_numpy()[keep] for name in KEY_COLUMNS}
+        columns.update(self.posts.take(post_rows[keep]))
+        columns.update(self.users.take(user_rows[keep]))
+        columns.update(time_feature_columns(columns['timestamp']))
+        frame = pd.DataFrame({
+            name: columns[name] for name in KEY_COLUMNS + self.features
+        }, copy=False)
+        frame[LABEL] = target[keep]
+        if weight is not None:
+            frame[WEIGHT] = weight
+        return frame
+
+    def build(self, out: Union[str, Path], start: Optional[datetime] = None,
+              end: Optional[datetime] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Пишет выборку шардами в каталог out, заменяя его целиком.
+
+        :return: Манифест выборки
+        """
+        out = Path(out)
+        tmp_path = out.with_name(f".tmp-{out.name}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "features": self.features,
+            "cat_features": self.cat_features,
+            "label": LABEL,
+            "weight": WEIGHT if self.negative_ratio is not None else None,
+            "negative_ratio": self.negative_ratio,
+            "shards": []
+        }
+        started = time.perf_counter()
+        events = 0
+        try:
+            for i, chunk in enumerate(self.events(start, end, limit)):
+                events += len(chunk)
+                frame = self.chunk_frame(chunk)
+                if frame.empty:
+                    continue
+                name = f"part-{i:05d}"
+                table = write_table(frame, tmp_path / name, name)
+                manifest["shards"].append({
+                    "name": name,
+                    "rows": len(frame),
+                    "positives": int(frame[LABEL].sum()),
+                    "min_timestamp": frame['timestamp'].iloc[0].isoformat(),
+                    "max_timestamp": frame['timestamp'].iloc[-1].isoformat(),
+                    "table": table
+                })
+                logger.info("Shard %s: %d of %d events", name, len(frame), len(chunk))
+
+            with open(tmp_path / MANIFEST_FILE, "w") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        shutil.rmtree(out, ignore_errors=True)
+        tmp_path.rename(out)
+        rows = sum(shard["rows"] for shard in manifest["shards"])
+        logger.info("Training set with %d rows from %d events in %d shards written "
+                    "to %s in %.1fs", rows, events, len(manifest["shards"]), out,
+                    time.perf_counter() - started)
+        return manifest
+
+
+class TrainingSet:
+    """Выборка на диске: шарды как DataFrame поверх mmap или catboost.Pool"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+        if self.manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported training set format version: {self.manifest['format_version']}"
+            )
+        self.features = self.manifest["features"]
+        self.cat_features = self.manifest["cat_features"]
+        self.shards = self.manifest["shards"]
+
+    def __len__(self) -> int:
+        return sum(shard["rows"] for shard in self.shards)
+
+    def frame(self, shard: Dict, start: Optional[datetime] = None,
+              end: Optional[datetime] = None) -> pd.DataFrame:
+        """Строки шарда с timestamp в [start, end)"""
+        frame = SnapshotTable(self.path / shard["name"], shard["table"]).to_frame()
+        if start is None and end is None:
+            return frame
+        timestamps = frame['timestamp']
+        mask = np.ones(len(frame), dtype=bool)
+        if start is not None:
+            mask &= (timestamps >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (timestamps < pd.Timestamp(end)).to_numpy()
+        return frame[mask]
+
+    def _overlapping(self, start: Optional[datetime], end: Optional[datetime]) -> List[Dict]:
+        return [
+            shard for shard in self.shards
+            if (start is None or pd.Timestamp(shard["max_timestamp"]) >= pd.Timestamp(start))
+            and (end is None or pd.Timestamp(shard["min_timestamp"]) < pd.Timestamp(end))
+        ]
+
+    def make_pool(self, frame: pd.DataFrame) -> Pool:
+        weight = self.manifest["weight"]
+        return Pool(
+            data=frame[self.features],
+            label=frame[self.manifest["label"]].to_numpy(),
+            weight=frame[weight].to_numpy() if weight else None,
+            cat_features=self.cat_features
+        )
+
+    def iter_pools(self, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Iterator[Pool]:
+        """Pool на каждый шард диапазона; в памяти одновременно один шард"""
+        for shard in self._overlapping(start, end):
+            frame = self.frame(shard, start, end)
+            if not frame.empty:
+                yield self.make_pool(frame)
+
+    def pool(self, start: Optional[datetime] = None,
+             end: Optional[datetime] = None) -> Pool:
+        """Один Pool по всем шардам диапазона [start, end)"""
+        frames = [self.frame(shard, start, end) for shard in self._overlapping(start, end)]
+        return self.make_pool(pd.concat(frames, ignore_index=True))
+
+    def time_quantile(self, q: float) -> datetime:
+        """Квантиль timestamp по всей выборке, как граница train/test в ноутбуке"""
+        timestamps = np.concatenate([
+            SnapshotTable(self.path / shard["name"], shard["table"]).column('timestamp')
+            for shard in self.shards
+        ])
+        return pd.Timestamp(np.quantile(timestamps.view(np.int64), q)).to_pydatetime()
+
+
+def main():
+    from src.api.dependencies import get_db_url
+    from src.utils.data_loader import DataLoader
+
+    parser = argparse.ArgumentParser(description="Build the training set from feed_data")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--snapshot", help="Take post and user features from a snapshot")
+    parser.add_argument("--post-features-table", default="d_okulova_post_features_lesson_22")
+    parser.add_argument("--user-features-table", default="d_okulova_user_features_lesson_22")
+    parser.add_argument("--feed-table", default="public.feed_data")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--limit", type=int, help="Maximum number of view events")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Events per shard")
+    parser.add_argument("--negative-ratio", type=float,
+                        help="Keep at most this many negatives per positive for each user")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(get_db_url())
+    if args.snapshot:
+        snapshot = open_snapshot(args.snapshot)
+        post_features = snapshot.table("post_features").to_frame()
+        user_features = snapshot.table("user_features").to_frame()
+    else:
+        categorical = DataLoader.CATEGORICAL_COLUMNS
+        post_features, _ = load_table(engine, "post_features",
+                                      f"SELECT * FROM {args.post_features_table}",
+                                      categorical=categorical)
+        user_features, _ = load_table(engine, "user_features",
+                                      f"SELECT * FROM {args.user_features_table}",
+                                      categorical=categorical)
+
+    builder = TrainingSetBuilder(engine, post_features, user_features,
+                                 feed_table=args.feed_table, chunksize=args.chunksize,
+                                 negative_ratio=args.negative_ratio, seed=args.seed)
+    manifest = builder.build(args.out, args.start, args.end, args.limit)
+    rows = sum(shard["rows"] for shard in manifest["shards"])
+    print(f"{rows} rows in {len(manifest['shards'])} shards written to {args.out}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,267 @@
+"""
+Офлайн-оценка HitRate@k по отложенному окну feed_data для нескольких моделей.
+
+Запрос - пара (пользователь, час), в которой у пользователя были просмотры
+в окне [start, end); время запроса - начало часа. Попадание, если среди
+k рекомендаций есть пост, лайкнутый пользователем в течение horizon
+часов после начала запроса. Из рекомендаций, как в API, исключаются
+лайки, сделанные до начала запроса: до окна и внутри окна раньше запроса.
+
+Временные фичи постоянны в пределах часа, поэтому запросы группируются
+по (атрибуты пользователя, час) и каждая группа скорится один раз
+через RecommendationService.score_many; порядок кандидатов группы
+считается один раз, из него для каждого пользователя убираются его лайки.
+Так офлайн-число совпадает с тем, что отдаёт продакшн для тех же данных.
+Все модели оцениваются на одних и тех же запросах за один проход.
+
+    python -m src.modeling.evaluate_hitrate --models models/a.cbm models/b.cbm \\
+        --start 2021-12-20T00:00 --end 2021-12-30T00:00 --k 5 --workers 4
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from src.utils.data_loader import DataLoader
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.like_index import LikeIndex
+from src.utils.ranking import exclude_sorted, top_k_indices
+from src.utils.recommendation_service import RecommendationService
+from src.utils.user_store import USER_ATTRIBUTES
+
+logger = logging.getLogger(__name__)
+
+# Групп в одной задаче воркера и в одном вызове модели
+GROUPS_PER_TASK = 512
+GROUPS_PER_PREDICT = 32
+
+# Состояние оценки; воркеры наследуют его при fork
+_STATE: Dict = {}
+
+
+class EvaluationRequests:
+    """Запросы окна с исключаемыми и целевыми постами каждого запроса"""
+
+    def __init__(self, user_ids: np.ndarray, hours: np.ndarray,
+                 excluded: List[np.ndarray], relevant: List[np.ndarray]):
+        self.user_ids = user_ids
+        self.hours = hours
+        self.excluded = excluded
+        self.relevant = relevant
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def from_feed(cls, data_loader: DataLoader, start: datetime, end: datetime,
+                  horizon_hours: int = 1) -> "EvaluationRequests":
+        """Строит запросы окна [start, end) по feed_data загрузчика"""
+        feed_table = data_loader.feed_table
+        horizon_end = end + timedelta(hours=horizon_hours)
+        bounds = (sa.bindparam("start", type_=sa.DateTime()),
+                  sa.bindparam("end", type_=sa.DateTime()))
+
+        with data_loader.engine.connect() as conn:
+            views = pd.read_sql(sa.text(f"""
+                SELECT DISTINCT user_id, timestamp FROM {feed_table}
+                WHERE action = 'view' AND timestamp >= :start AND timestamp < :end
+            """).bindparams(*bounds), conn, params={"start": start, "end": end},
+                parse_dates=["timestamp"])
+            likes = pd.read_sql(sa.text(f"""
+                SELECT user_id, post_id, timestamp FROM {feed_table}
+                WHERE action = 'like' AND timestamp >= :start AND timestamp < :end
+            """).bindparams(*bounds), conn, params={"start": start, "end": horizon_end},
+                parse_dates=["timestamp"])
+            prior = pd.read_sql(sa.text(f"""
+                SELECT DISTINCT user_id, post_id FROM {feed_table}
+                WHERE action = 'like' AND timestamp < :start
+            """).bindparams(bounds[0]), conn, params={"start": start})
+
+        requests = (views.assign(hour=views['timestamp'].dt.floor('H'))
+                    [['user_id', 'hour']].drop_duplicates()
+                    .sort_values(['user_id', 'hour'], ignore_index=True))
+        known = data_loader.user_store.index.lookup_many(requests['user_id'].to_numpy()) >= 0
+        requests = requests[known].reset_index(drop=True)
+
+        prior_index = LikeIndex.from_pairs(prior['user_id'].to_numpy(),
+                                           prior['post_id'].to_numpy())
+        likes = likes.sort_values(['user_id', 'timestamp'], ignore_index=True)
+        by_user = {
+            user_id: (group['timestamp'].to_numpy(), group['post_id'].to_numpy())
+            for user_id, group in likes.groupby('user_id', sort=False)
+        }
+        empty = (np.empty(0, dtype='datetime64[ns]'), np.empty(0, dtype=np.int64))
+        horizon = np.timedelta64(horizon_hours, 'h')
+
+        excluded, relevant = [], []
+        for user_id, hour in zip(requests['user_id'].to_numpy(), requests['hour'].to_numpy()):
+            times, post_ids = by_user.get(user_id, empty)
+            before = times.searchsorted(hour)
+            after = times.searchsorted(hour + horizon)
+            excluded.append(np.union1d(prior_index.liked_posts(user_id), post_ids[:before]))
+            relevant.append(post_ids[before:after])
+
+        logger.info("%d requests of %d users, %d with likes in the horizon",
+                    len(requests), requests['user_id'].nunique(),
+                    sum(len(posts) > 0 for posts in relevant))
+        return cls(requests['user_id'].to_numpy(), requests['hour'].to_numpy(),
+                   excluded, relevant)
+
+
+def request_groups(requests: EvaluationRequests,
+                   data_loader: DataLoader) -> List[Tuple[Tuple, datetime, np.ndarray]]:
+    """Группирует запросы по (атрибуты пользователя, час)"""
+    store = data_loader.user_store
+    rows = store.index.lookup_many(requests.user_ids)
+    columns = {name: store.column(name)[rows] for name in USER_ATTRIBUTES}
+    columns['hour'] = requests.hours
+    groups = pd.DataFrame(columns).groupby(
+        list(USER_ATTRIBUTES) + ['hour'], sort=False, dropna=False
+    ).indices
+    return [
+        (store.attributes(rows[indices[0]]),
+         pd.Timestamp(requests.hours[indices[0]]).to_pydatetime(),
+         indices)
+        for indices in groups.values()
+    ]
+
+
+def _run_task(first_group: int) -> Tuple[int, Dict[str, np.ndarray], Dict[str, float]]:
+    """Попадания запросов группы задач по каждой модели и время оценки"""
+    groups = _STATE["groups"][first_group:first_group + GROUPS_PER_TASK]
+    requests: EvaluationRequests = _STATE["requests"]
+    k = _STATE["k"]
+
+    request_ids = np.concatenate([indices for _, _, indices in groups])
+    hits = {}
+    seconds = {}
+    for name, service in _STATE["services"].items():
+        started = time.perf_counter()
+        model_hits = {}
+        for start in range(0, len(groups), GROUPS_PER_PREDICT):
+            batch = groups[start:start + GROUPS_PER_PREDICT]
+            keys = [(attributes, service.features.time_features(hour))
+                    for attributes, hour, _ in batch]
+            for (_, _, indices), scores in zip(batch, service.score_many(keys)):
+                depth = k + max(len(requests.excluded[i]) for i in indices)
+                candidates = service.post_ids[top_k_indices(scores, depth)]
+                for i in indices:
+                    recommended = exclude_sorted(candidates, requests.excluded[i], k)
+                    model_hits[i] = bool(np.isin(recommended, requests.relevant[i]).any())
+        seconds[name] = time.perf_counter() - started
+        hits[name] = np.array([model_hits[i] for i in request_ids], dtype=bool)
+    return first_group, dict(request_ids=request_ids, **hits), seconds
+
+
+def evaluate(services: Dict[str, RecommendationService], requests: EvaluationRequests,
+             k: int = 5, workers: int = 1) -> Dict:
+    """
+    HitRate@k всех моделей на одних запросах.
+
+    :param services: Сервисы рекомендаций по именам моделей; данные общие
+    :param requests: Запросы окна
+    :param k: Число рекомендаций
+    :param workers: Число процессов
+    :return: Отчёт с метрикой и временем по каждой модели
+    """
+    data_loader = next(iter(services.values())).data
+    groups = request_groups(requests, data_loader)
+    _STATE.clear()
+    _STATE.update(services=services, requests=requests, groups=groups, k=k)
+
+    hits = {name: np.zeros(len(requests), dtype=bool) for name in services}
+    seconds = {name: 0.0 for name in services}
+
+    def collect(result):
+        _, task_hits, task_seconds = result
+        request_ids = task_hits.pop("request_ids")
+        for name, values in task_hits.items():
+            hits[name][request_ids] = values
+            seconds[name] += task_seconds[name]
+
+    tasks = range(0, len(groups), GROUPS_PER_TASK)
+    logger.info("Evaluating %d models on %d requests in %d groups, %d tasks",
+                len(services), len(requests), len(groups), len(tasks))
+    started = time.perf_counter()
+    if workers > 1:
+        # fork: воркеры наследуют данные, модели и запросы без копирования
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_run_task, first) for first in tasks]
+            for future in as_completed(futures):
+                collect(future.result())
+    else:
+        for first in tasks:
+            collect(_run_task(first))
+    _STATE.clear()
+
+    with_likes = np.array([len(posts) > 0 for posts in requests.relevant], dtype=bool)
+    return {
+        "k": k,
+        "requests": len(requests),
+        "requests_with_likes": int(with_likes.sum()),
+        "groups": len(groups),
+        "seconds": round(time.perf_counter() - started, 2),
+        "models": {
+            name: {
+                f"hitrate@{k}": float(model_hits.mean()) if len(requests) else None,
+                "ms_per_request": (round(seconds[name] / len(requests) * 1e3, 4)
+                                   if len(requests) else None),
+                "cpu_seconds": round(seconds[name], 2)
+            }
+            for name, model_hits in hits.items()
+        }
+    }
+
+
+def main():
+    from src.api.dependencies import get_data_loader
+    from src.utils.model_loader import load_model
+
+    parser = argparse.ArgumentParser(description="Offline HitRate@k evaluation")
+    parser.add_argument("--models", nargs="+", required=True, help="Paths to .cbm files")
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat,
+                        help="Start of the held-out window")
+    parser.add_argument("--end", required=True, type=datetime.fromisoformat,
+                        help="End of the held-out window (exclusive)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--horizon-hours", type=int, default=1,
+                        help="Likes within this many hours of a request count as hits")
+    parser.add_argument("--scorer", choices=["catboost", "native"],
+                        help="Model scorer, MODEL_SCORER by default")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    data_loader = get_data_loader()
+    features = FeatureProcessor()
+    services = {
+        path: RecommendationService(data_loader, load_model(path, args.scorer), features)
+        for path in args.models
+    }
+    requests = EvaluationRequests.from_feed(data_loader, args.start, args.end,
+                                            args.horizon_hours)
+    report = evaluate(services, requests, k=args.k, workers=args.workers)
+
+    print(f"{report['requests']} requests ({report['requests_with_likes']} with likes), "
+          f"{report['groups']} groups, {report['seconds']}s")
+    for name, metrics in report["models"].items():
+        print(f"{name}: HitRate@{args.k} {metrics[f'hitrate@{args.k}']:.4f}, "
+              f"{metrics['ms_per_request']} ms/request")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,220 @@
+"""
+Офлайн-расчёт топ-N постов для всех пользователей на горизонт часов.
+
+Пользователи с одинаковыми атрибутами получают одинаковые скоры, поэтому
+модель вызывается один раз на сегмент и час. Порядок постов сегмента
+считается один раз, а для каждого пользователя из него убираются его
+лайки. Результат пишется в AnswerTable, из которой отвечает API.
+
+    DATA_SNAPSHOT_PATH=data/snapshots python -m src.modeling.precompute_top_n \\
+        --out data/processed/answers \\
+        --start 2021-12-01T00:00 --hours 24 --top-n 5 --workers 4
+"""
+import os
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.utils.answer_table import AnswerTable, AnswerTableWriter, table_checksum
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_loader import model_checksum
+from src.utils.ranking import exclude_sorted, top_k_indices
+from src.utils.recommendation_service import RecommendationService
+from src.utils.user_store import USER_ATTRIBUTES
+
+logger = logging.getLogger(__name__)
+
+# Сегментов в одной задаче воркера и в одном вызове модели
+SEGMENTS_PER_TASK = 256
+SEGMENTS_PER_PREDICT = 32
+
+# Состояние задачи; воркеры наследуют его при fork
+_STATE: Dict = {}
+
+
+def user_segments(service: RecommendationService) -> List[Tuple[Tuple, np.ndarray]]:
+    """Группирует строки пользователей по кортежу атрибутов модели"""
+    store = service.data.user_store
+    attributes = pd.DataFrame({name: store.column(name) for name in USER_ATTRIBUTES})
+    groups = attributes.groupby(list(USER_ATTRIBUTES), sort=False, dropna=False).indices
+    return [(store.attributes(rows[0]), rows) for rows in groups.values()]
+
+
+def _likes_per_user_row(service: RecommendationService) -> np.ndarray:
+    """Число лайков каждого пользователя по строкам UserFeatureStore"""
+    user_ids, like_counts = service.data.like_index.counts()
+    counts = np.zeros(len(service.data.user_store), dtype=np.int64)
+    rows = service.data.user_store.index.lookup_many(user_ids)
+    known = rows >= 0
+    counts[rows[known]] = like_counts[known]
+    return counts
+
+
+def _run_task(hour_index: int, first_segment: int) -> int:
+    """Заполняет таблицу для одного часа и группы сегментов"""
+    service: RecommendationService = _STATE["service"]
+    segments = _STATE["segments"][first_segment:first_segment + SEGMENTS_PER_TASK]
+    top_n = _STATE["top_n"]
+
+    table = _STATE.get("table")
+    if table is None:
+        table = _STATE["table"] = _STATE["writer"].open_table()
+
+    request_time = _STATE["start_hour"] + timedelta(hours=hour_index)
+    time_values = service.features.time_features(request_time)
+    like_index = service.data.like_index
+    likes_per_row = _STATE["likes_per_row"]
+    row_user_ids = _STATE["user_ids"]
+
+    written = 0
+    for start in range(0, len(segments), SEGMENTS_PER_PREDICT):
+        batch = segments[start:start + SEGMENTS_PER_PREDICT]
+        scores = service.score_many([(attributes, time_values) for attributes, _ in batch])
+
+        for (_, rows), segment_scores in zip(batch, scores):
+            depth = top_n + int(likes_per_row[rows].max())
+            candidates = service.post_ids[top_k_indices(segment_scores, depth)]
+            for row in rows:
+                post_ids = exclude_sorted(
+                    candidates, like_index.liked_posts(row_user_ids[row]), top_n
+                )
+                table[row, hour_index, :len(post_ids)] = post_ids
+            written += len(rows)
+
+    table.flush()
+    return written
+
+
+def precompute(service: RecommendationService, writer: AnswerTableWriter,
+               workers: int = 1) -> Dict:
+    """Считает таблицу ответов и возвращает отчёт о прогоне"""
+    segments = user_segments(service)
+    _STATE.clear()
+    _STATE.update(
+        service=service,
+        writer=writer,
+        segments=segments,
+        top_n=writer.top_n,
+        start_hour=writer.start_hour,
+        likes_per_row=_likes_per_user_row(service),
+        user_ids=writer.user_ids
+    )
+    writer.create()
+
+    tasks = [
+        (hour, first)
+        for hour in range(writer.horizon_hours)
+        for first in range(0, len(segments), SEGMENTS_PER_TASK)
+    ]
+    total_cells = len(writer.user_ids) * writer.horizon_hours
+    logger.info("Precomputing %d users x %d hours, %d segments, %d tasks",
+                len(writer.user_ids), writer.horizon_hours, len(segments), len(tasks))
+
+    started = time.perf_counter()
+    done = 0
+
+    def report_progress(written: int):
+        nonlocal done
+        done += written
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total_cells - done) / rate if rate else float("inf")
+        logger.info("Progress %.1f%%: %d user-hours, %.0f user-hours/s, ETA %.0fs",
+                    100 * done / total_cells, done, rate, eta)
+
+    if workers > 1:
+        # fork: воркеры наследуют загруженные данные и модель без копирования
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_run_task, *task) for task in tasks]
+            for future in as_completed(futures):
+                report_progress(future.result())
+    else:
+        for task in tasks:
+            report_progress(_run_task(*task))
+    _STATE.pop("table", None)
+
+    elapsed = time.perf_counter() - started
+    path = writer.finalize()
+    return {
+        "path": str(path),
+        "segments": len(segments),
+        "user_hours": total_cells,
+        "seconds": round(elapsed, 2),
+        "user_hours_per_second": round(total_cells / elapsed, 1) if elapsed else None,
+        "checksum": table_checksum(path)
+    }
+
+
+def verify(table: AnswerTable, service: RecommendationService,
+           samples: int = 200, seed: int = 42) -> Dict:
+    """Сравнивает случайные ячейки таблицы с живым расчётом сервиса"""
+    rng = np.random.default_rng(seed)
+    user_ids = np.load(table.path / "user_ids.npy")
+    mismatches = 0
+    for _ in range(samples):
+        user_id = int(rng.choice(user_ids))
+        request_time = table.start_hour + timedelta(hours=int(rng.integers(table.horizon_hours)))
+        expected = service.recommend_post_ids(user_id, request_time, table.top_n)
+        actual = table.lookup(user_id, request_time, table.top_n).tolist()
+        if expected != actual:
+            mismatches += 1
+            logger.warning("Mismatch for user %d at %s: %s != %s",
+                           user_id, request_time, actual, expected)
+    return {"samples": samples, "mismatches": mismatches}
+
+
+def main():
+    from src.api.dependencies import get_data_loader, get_model
+
+    parser = argparse.ArgumentParser(description="Precompute top-N answer table")
+    parser.add_argument("--out", required=True, help="Answer table directory")
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat,
+                        help="First hour of the horizon, e.g. 2021-12-01T00:00")
+    parser.add_argument("--hours", type=int, default=24, help="Horizon in hours")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--verify-samples", type=int, default=200)
+    args = parser.parse_args()
+
+    # API принимает таблицу только для того же снапшота данных; без него
+    # данные читаются из БД, и весь расчёт дал бы непригодную таблицу
+    snapshot_path = os.getenv("DATA_SNAPSHOT_PATH")
+    if not snapshot_path or not os.path.exists(snapshot_path):
+        parser.error("Answer table needs a data snapshot: set DATA_SNAPSHOT_PATH "
+                     "to the snapshot the API serves")
+    data_loader = get_data_loader()
+    model_path = os.getenv("MODEL_PATH", "catboost_model.cbm")
+    model = get_model()
+    service = RecommendationService(data_loader, model, FeatureProcessor())
+
+    writer = AnswerTableWriter(
+        args.out,
+        user_ids=data_loader.user_features['user_id'].to_numpy(),
+        start_hour=args.start,
+        horizon_hours=args.hours,
+        top_n=args.top_n,
+        metadata={
+            "snapshot_version": data_loader.snapshot.version,
+            # API отвечает из таблицы, только пока обслуживает модель с тем же sha256
+            "model_path": model_path,
+            "model_checksum": model_checksum(model_path)
+        }
+    )
+    report = precompute(service, writer, workers=args.workers)
+    print(f"Answer table: {report}")
+
+    if args.verify_samples:
+        print(f"Verification: {verify(AnswerTable(args.out), service, args.verify_samples)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
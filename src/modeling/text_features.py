@@ -0,0 +1,228 @@
+"""
+Текстовые фичи постов как в notebooks/posts_features.ipynb.
+
+Лемматизация spacy (en_core_web_sm без parser и ner) -> TF-IDF ->
+понижение размерности до 20 компонент -> 15 кластеров: номер кластера
+TextCluster и расстояния DistanceTo{i}thCluster до всех центров.
+
+По умолчанию всё считается на разреженной матрице: TruncatedSVD вместо
+PCA (PCA в sklearn требует плотную матрицу размером n_posts x словарь)
+и MiniBatchKMeans вместо KMeans. Это другие компоненты и кластеры, чем
+те, на которых обучены модели в models/: фичи разреженного варианта
+годятся только для переобучения модели. Процедура ноутбука (PCA + KMeans
+на плотной матрице) - dense=True; номера кластеров KMeans зависят от
+порядка строк и инициализации, поэтому и они совпадают с обученными
+моделями только после сверки с развёрнутой таблицей фич.
+
+Обученные vectorizer, reducer и clusterer сохраняются одним joblib-файлом,
+чтобы фичи новых постов считались тем же преобразованием без переобучения.
+sha256 этого файла записывается в метаданные снапшота (TEXT_MODEL_CHECKSUM):
+по нему инкрементальное обновление проверяет, что новые посты получат
+ту же нумерацию кластеров, что и посты таблицы.
+spacy нужен только для лемматизации и импортируется лениво.
+
+TotalTfIdf, MaxTfIdf и MeanTfIdf в ноутбуке считаются построчно
+по числовым колонкам post_df, а не по TF-IDF матрице (post_df.sum(axis=1)
+при текстовых колонках отбрасывает их). Модель обучена на этих значениях,
+поэтому view_stat_features воспроизводит именно их:
+    TotalTfIdf = post_id + views + view_reach
+    MaxTfIdf   = TotalTfIdf
+    MeanTfIdf  = (post_id + views + view_reach + TotalTfIdf + MaxTfIdf) / 5
+Статистики по самой TF-IDF матрице считает tfidf_stat_features.
+"""
+import hashlib
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+SPACY_MODEL = "en_core_web_sm"
+N_COMPONENTS = 20
+N_CLUSTERS = 15
+RANDOM_STATE = 42
+LEMMATIZE_BATCH_SIZE = 256
+KMEANS_BATCH_SIZE = 4096
+
+STAT_COLUMNS = ['TotalTfIdf', 'MaxTfIdf', 'MeanTfIdf']
+CLUSTER_COLUMN = 'TextCluster'
+
+# Ключ метаданных снапшота: sha256 файла TextFeatureModel, которым
+# посчитаны TextCluster и DistanceTo*Cluster таблицы post_features
+TEXT_MODEL_CHECKSUM = "text_model_checksum"
+
+
+def distance_columns(n_clusters: int = N_CLUSTERS) -> List[str]:
+    return [f'DistanceTo{i}thCluster' for i in range(1, n_clusters + 1)]
+
+
+def load_nlp():
+    """Пайплайн spacy для лемматизации; spacy - необязательная зависимость"""
+    try:
+        import spacy
+    except ImportError as e:
+        raise ImportError(
+            f"Lemmatization requires spacy and the {SPACY_MODEL} model"
+        ) from e
+    return spacy.load(SPACY_MODEL, disable=["parser", "ner"])
+
+
+def lemmatize(texts: Iterable[str], nlp=None,
+              batch_size: int = LEMMATIZE_BATCH_SIZE,
+              n_process: int = 1) -> List[str]:
+    """
+    Леммы текстов через пробел, как lemmatize_text в ноутбуке.
+
+    :param texts: Тексты постов
+    :param nlp: Пайплайн spacy; по умолчанию load_nlp()
+    :param batch_size: Размер пачки nlp.pipe
+    :param n_process: Число процессов nlp.pipe
+    """
+    nlp = nlp or load_nlp()
+    return [
+        " ".join(
+            token.text if token.text.isdigit() else token.lemma_.lower()
+            for token in doc
+            if not token.is_space and not token.is_punct
+        )
+        for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+    ]
+
+
+def view_stat_features(post_ids, views, view_reach) -> pd.DataFrame:
+    """TotalTfIdf, MaxTfIdf и MeanTfIdf по формуле ноутбука (см. модуль)"""
+    total = (np.asarray(post_ids, dtype=np.float64)
+             + np.asarray(views, dtype=np.float64)
+             + np.asarray(view_reach, dtype=np.float64))
+    return pd.DataFrame({
+        'TotalTfIdf': total,
+        'MaxTfIdf': total,
+        'MeanTfIdf': 3 * total / 5,
+    })
+
+
+def tfidf_stat_features(tfidf_matrix: sparse.spmatrix) -> pd.DataFrame:
+    """Сумма, максимум и среднее TF-IDF по строкам разреженной матрицы"""
+    matrix = sparse.csr_matrix(tfidf_matrix)
+    total = np.asarray(matrix.sum(axis=1), dtype=np.float64).ravel()
+    return pd.DataFrame({
+        'TotalTfIdf': total,
+        'MaxTfIdf': matrix.max(axis=1).toarray().ravel().astype(np.float64),
+        # Среднее по всему словарю, как tfidf_df.mean(axis=1)
+        'MeanTfIdf': total / max(matrix.shape[1], 1),
+    })
+
+
+class TextFeatureModel:
+    """Обученные TF-IDF, понижение размерности и кластеризация постов"""
+
+    def __init__(self, vectorizer, reducer, clusterer, checksum: Optional[str] = None):
+        self.vectorizer = vectorizer
+        self.reducer = reducer
+        self.clusterer = clusterer
+        # sha256 файла модели; известна после save или load
+        self.checksum = checksum
+
+    @classmethod
+    def fit(cls, lemmas: Iterable[str], **kwargs) -> "TextFeatureModel":
+        """Обучение на лемматизированных текстах; параметры как у fit_text_features"""
+        return fit_text_features(lemmas, **kwargs)[0]
+
+    @property
+    def n_clusters(self) -> int:
+        return self.clusterer.n_clusters
+
+    @property
+    def dense(self) -> bool:
+        """PCA в sklearn принимает только плотную матрицу"""
+        return isinstance(self.reducer, PCA)
+
+    def vectorize(self, lemmas: Iterable[str]) -> sparse.csr_matrix:
+        return self.vectorizer.transform(lemmas)
+
+    def reduce(self, tfidf_matrix: sparse.spmatrix) -> np.ndarray:
+        return self.reducer.transform(tfidf_matrix.toarray() if self.dense else tfidf_matrix)
+
+    def cluster_features(self, components: np.ndarray) -> pd.DataFrame:
+        """TextCluster и расстояния до центров по компонентам"""
+        distances = self.clusterer.transform(components)
+        result = pd.DataFrame(distances, columns=distance_columns(self.n_clusters))
+        result.insert(0, CLUSTER_COLUMN, distances.argmin(axis=1))
+        return result
+
+    def transform(self, lemmas: List[str]) -> pd.DataFrame:
+        """TextCluster и расстояния до центров для лемматизированных текстов"""
+        return self.cluster_features(self.reduce(self.vectorize(lemmas)))
+
+    def save(self, path: Union[str, Path]):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({
+            "format_version": FORMAT_VERSION,
+            "vectorizer": self.vectorizer,
+            "reducer": self.reducer,
+            "clusterer": self.clusterer,
+        }, path)
+        self.checksum = file_checksum(path)
+        logger.info("Text feature model saved to %s", path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "TextFeatureModel":
+        bundle = joblib.load(path)
+        version = bundle.get("format_version")
+        checksum = file_checksum(path)
+        if version == 1:
+            return cls(bundle["vectorizer"], bundle["pca"], bundle["kmeans"], checksum)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported text feature model version: {version}")
+        return cls(bundle["vectorizer"], bundle["reducer"], bundle["clusterer"], checksum)
+
+
+def file_checksum(path: Union[str, Path]) -> str:
+    """sha256 файла TextFeatureModel"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fit_text_features(lemmas: Iterable[str], n_components: int = N_COMPONENTS,
+                      n_clusters: int = N_CLUSTERS, random_state: int = RANDOM_STATE,
+                      dense: bool = False
+                      ) -> Tuple[TextFeatureModel, sparse.csr_matrix, np.ndarray]:
+    """
+    Обучает TF-IDF, понижение размерности и кластеризацию.
+
+    :param lemmas: Лемматизированные тексты; читаются за один проход,
+        поэтому подходит генератор строк из файла
+    :param n_components: Число компонент
+    :param n_clusters: Число кластеров
+    :param random_state: Seed понижения размерности и кластеризации
+    :param dense: PCA + KMeans на плотной матрице, как в ноутбуке
+    :return: (модель, TF-IDF матрица, компоненты)
+    """
+    if dense:
+        vectorizer = TfidfVectorizer()
+        reducer = PCA(n_components=n_components)
+        clusterer = KMeans(n_clusters=n_clusters, random_state=random_state)
+    else:
+        # float32 вдвое уменьшает матрицу; точности хватает для SVD и кластеров
+        vectorizer = TfidfVectorizer(dtype=np.float32)
+        reducer = TruncatedSVD(n_components=n_components, random_state=random_state)
+        clusterer = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state,
+                                    batch_size=KMEANS_BATCH_SIZE)
+
+    tfidf_matrix = vectorizer.fit_transform(lemmas)
+    components = reducer.fit_transform(tfidf_matrix.toarray() if dense else tfidf_matrix)
+    clusterer.fit(components)
+    return TextFeatureModel(vectorizer, reducer, clusterer), tfidf_matrix, components
@@ -0,0 +1,187 @@
+"""
+Предрассчитанная таблица ответов: топ-N постов для каждого пользователя
+и каждого часа горизонта.
+
+Формат каталога:
+    header.json     - параметры таблицы, контрольная сумма, версия снапшота
+                      данных и sha256 модели, которой таблица посчитана
+    user_ids.npy    - id пользователей в порядке строк таблицы
+    top_posts.bin   - int32 (n_users, horizon_hours, top_n), -1 - пусто
+"""
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from src.utils.id_index import IdIndex
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+USER_IDS_FILE = "user_ids.npy"
+TABLE_FILE = "top_posts.bin"
+EMPTY = -1
+
+
+def hour_bucket(request_time: datetime) -> datetime:
+    """
+    Час запроса без часового пояса.
+
+    Временные фичи модели считаются по локальным полям datetime,
+    поэтому и корзина определяется по ним.
+    """
+    return request_time.replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+
+def table_checksum(path: Union[str, Path]) -> str:
+    """sha256 файла таблицы"""
+    digest = hashlib.sha256()
+    with open(Path(path) / TABLE_FILE, "rb") as f:
+        for block in iter(lambda: f.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AnswerTable:
+    """Таблица ответов, открытая через mmap только на чтение"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / HEADER_FILE) as f:
+            self.header = json.load(f)
+
+        if self.header["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported answer table format version: {self.header['format_version']}"
+            )
+
+        self.start_hour = datetime.fromisoformat(self.header["start_hour"])
+        self.horizon_hours = self.header["horizon_hours"]
+        self.top_n = self.header["top_n"]
+        self.user_index = IdIndex(np.load(self.path / USER_IDS_FILE))
+        self.table = np.memmap(
+            self.path / TABLE_FILE, dtype=np.int32, mode="r",
+            shape=(len(self.user_index), self.horizon_hours, self.top_n)
+        )
+        self.hits = 0
+        self.misses = 0
+        # lookup вызывается из потоков пула скоринга
+        self._lock = threading.Lock()
+
+    @property
+    def model_checksum(self) -> Optional[str]:
+        return self.header.get("model_checksum")
+
+    def mismatch(self, snapshot_version: Optional[int],
+                 model_checksum: Optional[str]) -> Optional[str]:
+        """
+        Причина, по которой таблица не подходит к данным и модели, или None.
+        Без версии снапшота или контрольной суммы модели соответствие
+        проверить нельзя, и таблица тоже отклоняется.
+        """
+        table_version = self.header.get("snapshot_version")
+        if snapshot_version is None:
+            return "loaded data has no snapshot version"
+        if table_version is None:
+            return "table has no snapshot version"
+        if table_version != snapshot_version:
+            return f"table was built for snapshot {table_version}, data is {snapshot_version}"
+        if model_checksum is None or self.model_checksum is None:
+            return "model checksum is unknown"
+        if self.model_checksum != model_checksum:
+            return (f"table was built with model {self.header.get('model_path')} "
+                    f"({self.model_checksum[:12]}), served model is {model_checksum[:12]}")
+        return None
+
+    def bucket(self, request_time: datetime) -> int:
+        """Номер часа горизонта или -1, если запрос вне горизонта"""
+        hours = (hour_bucket(request_time) - self.start_hour) // timedelta(hours=1)
+        return hours if 0 <= hours < self.horizon_hours else -1
+
+    def lookup(self, user_id: int, request_time: datetime,
+               limit: int) -> Optional[np.ndarray]:
+        """
+        id постов из таблицы или None, если запрос в таблицу не попадает
+        (неизвестный пользователь, час вне горизонта, limit > top_n).
+        """
+        row = self.user_index.lookup(user_id)
+        bucket = self.bucket(request_time)
+        if limit > self.top_n or row < 0 or bucket < 0:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        post_ids = self.table[row, bucket, :limit]
+        return post_ids[post_ids != EMPTY]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class AnswerTableWriter:
+    """
+    Создание таблицы ответов.
+
+    Таблица пишется во временный каталог; процессы-воркеры открывают файл
+    через open_table() и заполняют непересекающиеся части. finalize()
+    записывает заголовок с контрольной суммой и атомарно переносит каталог.
+    """
+
+    def __init__(self, path: Union[str, Path], user_ids: np.ndarray,
+                 start_hour: datetime, horizon_hours: int, top_n: int,
+                 metadata: Optional[Dict] = None):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(f".tmp-{self.path.name}")
+        self.user_ids = np.asarray(user_ids, dtype=np.int32)
+        self.start_hour = hour_bucket(start_hour)
+        self.horizon_hours = horizon_hours
+        self.top_n = top_n
+        self.metadata = metadata or {}
+
+    @property
+    def shape(self):
+        return len(self.user_ids), self.horizon_hours, self.top_n
+
+    def create(self):
+        """Создаёт временный каталог и заполненный EMPTY файл таблицы"""
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        self.tmp_path.mkdir(parents=True)
+        np.save(self.tmp_path / USER_IDS_FILE, self.user_ids)
+        table = np.memmap(self.tmp_path / TABLE_FILE, dtype=np.int32, mode="w+", shape=self.shape)
+        table[:] = EMPTY
+        table.flush()
+        del table
+
+    def open_table(self) -> np.memmap:
+        """Открывает файл таблицы на запись (в том числе из воркера)"""
+        return np.memmap(self.tmp_path / TABLE_FILE, dtype=np.int32, mode="r+", shape=self.shape)
+
+    def finalize(self) -> Path:
+        """Пишет заголовок и переносит таблицу на место"""
+        header = {
+            "format_version": FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "start_hour": self.start_hour.isoformat(),
+            "horizon_hours": self.horizon_hours,
+            "top_n": self.top_n,
+            "n_users": len(self.user_ids),
+            "checksum": table_checksum(self.tmp_path),
+            **self.metadata
+        }
+        with open(self.tmp_path / HEADER_FILE, "w") as f:
+            json.dump(header, f, indent=2)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.tmp_path.rename(self.path)
+        logger.info("Answer table written to %s", self.path)
+        return self.path
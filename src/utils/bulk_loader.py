@@ -0,0 +1,259 @@
+"""
+Потоковая загрузка таблиц из БД в заранее выделенные колонки
+с понижением типов.
+
+Чанки из серверного курсора не накапливаются и не склеиваются через
+pd.concat: каждый чанк сразу дописывается в типизированные буферы
+(int32 для целых, float32 для вещественных, коды категорий для
+строковых категориальных колонок), после чего освобождается.
+
+Тип колонки определяется по первому чанку и расширяется по следующим
+без потери значений: целая колонка, в чанке которой встретился NULL
+(pandas отдаёт такой чанк как float64 с NaN), становится float64 с NaN -
+он хранит целые до 2^53 точно и понятен UserFeatureStore, матрице
+признаков и снапшоту; вещественная колонка с целыми значениями за
+пределами точности float32 (id больше 2^24) тоже переходит на float64.
+Дата-время с часовым поясом приводится к UTC и хранится без пояса.
+"""
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import psutil
+
+logger = logging.getLogger(__name__)
+
+CHUNKSIZE = 200000
+INT_DTYPE = np.int32
+FLOAT_DTYPE = np.float32
+GROWTH_FACTOR = 1.5
+
+# Целые до 2^24 представимы в float32 точно
+FLOAT32_EXACT_INT = 2 ** 24
+
+
+@dataclass
+class TableLoadReport:
+    """
+    Статистика загрузки одной таблицы.
+
+    peak_rss_bytes - пиковый RSS процесса за время загрузки таблицы;
+    при параллельной загрузке включает память соседних таблиц.
+    """
+    name: str
+    rows: int
+    seconds: float
+    nbytes: int
+    peak_rss_bytes: int
+
+    def __str__(self) -> str:
+        return (f"{self.name}: {self.rows} rows in {self.seconds:.2f}s, "
+                f"{self.nbytes / 2 ** 20:.1f} MB in memory, "
+                f"peak RSS {self.peak_rss_bytes / 2 ** 20:.1f} MB")
+
+
+class _NumericColumn:
+    """Числовая колонка в предвыделенном буфере с геометрическим ростом"""
+
+    def __init__(self, dtype, capacity: int):
+        self.values = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def _reserve(self, n: int):
+        required = self.size + n
+        if required <= len(self.values):
+            return
+        capacity = max(required, int(len(self.values) * GROWTH_FACTOR))
+        values = np.empty(capacity, dtype=self.values.dtype)
+        values[:self.size] = self.values[:self.size]
+        self.values = values
+
+    def _fit_dtype(self, chunk: np.ndarray):
+        """Расширяет тип буфера, если значения чанка в него не помещаются"""
+        dtype = self.values.dtype
+        if dtype.kind == "i" and chunk.dtype.kind == "f":
+            # NULL в целой колонке: float64 хранит целые до 2^53 точно
+            logger.warning("Integer column received NULL or non-integer values, "
+                           "upcasting to float64")
+            self.values = self.values.astype(np.float64)
+        elif dtype.kind == "i" and chunk.dtype.kind in "iu" and len(chunk):
+            info = np.iinfo(dtype)
+            if chunk.min() < info.min or chunk.max() > info.max:
+                logger.warning("Values do not fit into %s, upcasting to int64", dtype)
+                self.values = self.values.astype(np.int64)
+        elif dtype == FLOAT_DTYPE and chunk.dtype.kind in "iuf" and len(chunk):
+            # Целые за пределами точности float32 (например, id) не округляются
+            large = np.abs(chunk) > FLOAT32_EXACT_INT
+            if large.any() and np.array_equal(chunk[large], np.round(chunk[large])):
+                logger.warning("Integer values above 2^24 in a float32 column, "
+                               "upcasting to float64")
+                self.values = self.values.astype(np.float64)
+
+    def append(self, chunk: np.ndarray):
+        self._fit_dtype(chunk)
+        self._reserve(len(chunk))
+        self.values[self.size:self.size + len(chunk)] = chunk
+        self.size += len(chunk)
+
+    def finish(self) -> np.ndarray:
+        if self.size == len(self.values):
+            return self.values
+        return self.values[:self.size].copy()
+
+
+class _DatetimeColumn:
+    """
+    Дата-время в наивном datetime64[ns]. Значения с часовым поясом
+    переводятся в UTC и хранятся без пояса, поэтому чанки с разными
+    поясами складываются в одну колонку.
+    """
+
+    def __init__(self, capacity: int):
+        self.values = _NumericColumn(np.dtype("datetime64[ns]"), capacity)
+        self.has_tz = False
+
+    def append(self, chunk: pd.Series):
+        if getattr(chunk.dtype, "tz", None) is not None:
+            if not self.has_tz:
+                logger.info("Datetime column %s has time zone %s, stored as naive UTC",
+                            chunk.name, chunk.dtype.tz)
+                self.has_tz = True
+            values = chunk.dt.tz_convert("UTC").dt.tz_localize(None)
+        else:
+            # Чанк из одних NULL приходит как object
+            values = pd.to_datetime(chunk)
+        self.values.append(values.to_numpy(dtype="datetime64[ns]"))
+
+    def finish(self) -> np.ndarray:
+        return self.values.finish()
+
+
+class _CategoricalColumn:
+    """Строковая колонка, закодированная глобальным словарём"""
+
+    def __init__(self, capacity: int):
+        self.codes = _NumericColumn(INT_DTYPE, capacity)
+        self.vocabulary: Dict[object, int] = {}
+
+    def append(self, chunk: pd.Series):
+        local_codes, uniques = pd.factorize(chunk)
+        mapping = np.array(
+            [self.vocabulary.setdefault(value, len(self.vocabulary)) for value in uniques],
+            dtype=INT_DTYPE
+        )
+        # NULL остаётся кодом -1
+        codes = np.full(len(local_codes), -1, dtype=INT_DTYPE)
+        valid = local_codes >= 0
+        codes[valid] = mapping[local_codes[valid]]
+        self.codes.append(codes)
+
+    def finish(self) -> pd.Categorical:
+        return pd.Categorical.from_codes(self.codes.finish(),
+                                         categories=list(self.vocabulary))
+
+
+class _ObjectColumn:
+    """Колонка произвольных python-объектов (тексты)"""
+
+    def __init__(self):
+        self.values: List = []
+
+    def append(self, chunk: pd.Series):
+        self.values.extend(chunk.tolist())
+
+    def finish(self) -> np.ndarray:
+        result = np.empty(len(self.values), dtype=object)
+        result[:] = self.values
+        return result
+
+
+class ColumnarTableBuilder:
+    """Собирает таблицу из потока чанков в типизированные колонки"""
+
+    def __init__(self, categorical: Iterable[str] = (), capacity: int = CHUNKSIZE):
+        self.categorical = set(categorical)
+        self.capacity = capacity
+        self.columns: Dict[str, object] = {}
+        self.rows = 0
+
+    def _make_column(self, name: str, series: pd.Series):
+        kind = series.dtype.kind
+        if kind in "iu":
+            return _NumericColumn(INT_DTYPE, self.capacity)
+        if kind == "f":
+            return _NumericColumn(FLOAT_DTYPE, self.capacity)
+        if kind == "M":
+            return _DatetimeColumn(self.capacity)
+        if kind == "b":
+            return _NumericColumn(series.dtype, self.capacity)
+        if name in self.categorical:
+            return _CategoricalColumn(self.capacity)
+        return _ObjectColumn()
+
+    def append(self, chunk: pd.DataFrame):
+        if not self.columns:
+            self.columns = {
+                name: self._make_column(name, chunk[name]) for name in chunk.columns
+            }
+
+        for name, column in self.columns.items():
+            if isinstance(column, _NumericColumn):
+                column.append(chunk[name].to_numpy())
+            else:
+                column.append(chunk[name])
+        self.rows += len(chunk)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {name: column.finish() for name, column in self.columns.items()},
+            copy=False
+        )
+
+
+def stream_query(engine, query: str, chunksize: int = CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Отдаёт результат запроса чанками через серверный курсор"""
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(query, conn, chunksize=chunksize):
+            yield chunk
+
+
+def load_table(engine, name: str, query: str,
+               categorical: Iterable[str] = (),
+               chunksize: int = CHUNKSIZE,
+               expected_rows: Optional[int] = None):
+    """
+    Загружает таблицу потоково в типизированные колонки.
+
+    :param engine: SQLAlchemy engine
+    :param name: Имя таблицы для отчёта
+    :param query: SQL-запрос
+    :param categorical: Строковые колонки, кодируемые словарём
+    :param chunksize: Размер чанка
+    :param expected_rows: Ожидаемое число строк для точного предвыделения буферов
+    :return: (DataFrame, TableLoadReport)
+    """
+    process = psutil.Process()
+    peak_rss = process.memory_info().rss
+    started = time.perf_counter()
+
+    builder = ColumnarTableBuilder(categorical, capacity=expected_rows or chunksize)
+    for chunk in stream_query(engine, query, chunksize):
+        builder.append(chunk)
+        del chunk
+        peak_rss = max(peak_rss, process.memory_info().rss)
+
+    df = builder.to_frame()
+    peak_rss = max(peak_rss, process.memory_info().rss)
+
+    report = TableLoadReport(
+        name=name,
+        rows=len(df),
+        seconds=time.perf_counter() - started,
+        nbytes=int(df.memory_usage(deep=False).sum()),
+        peak_rss_bytes=peak_rss
+    )
+    logger.info("Loaded %s", report)
+    return df, report
@@ -0,0 +1,175 @@
+"""
+Отбор кандидатов по верхним границам скора перед полным скорингом.
+
+Скор поста в нативном оценщике - статическая часть (деревья без
+признаков пользователя и времени) плюс по одному листу каждого
+динамического дерева, номер которого складывается из постовых битов
+и битов запроса. Посты сортируются по постовым битам динамических
+деревьев и по статической части - ключи упорядочены по тому, насколько
+сильно они меняют скор, - и режутся на блоки по block_size. Так в блок
+попадают посты с одинаковыми сплитами модели по признакам постов
+(topic, TextCluster и прочим, если модель по ним делит). Для блока один раз запоминаются максимум
+статической части и множество постовых битов каждого динамического
+дерева. На запрос по таблицам листов (leaf_tables) граница блока -
+максимум статики плюс сумма по деревьям максимума листа по битам
+блока: ни один пост блока не может набрать больше.
+
+Блоки скорятся в порядке убывания границы, пока k-й лучший скор не
+станет строго больше границы следующего блока: тогда остальные посты
+не попадут в топ даже при равенстве скоров, и результат совпадает с
+полным скорингом. В приближённом режиме скоринг заканчивается после
+budget постов.
+"""
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.utils.oblivious_scorer import PreparedObliviousScorer, _sigmoid
+
+logger = logging.getLogger(__name__)
+
+# Запас к границе на порядок сложения float64 (суммы считаются в разном порядке)
+RELATIVE_TOLERANCE = 1e-9
+
+# Число интервалов статической части как ключа сортировки постов
+STATIC_BINS = 16
+
+
+class CandidateIndex:
+    """Блоки постов с данными для верхних границ скора"""
+
+    def __init__(self, scorer: PreparedObliviousScorer, block_size: int = 64,
+                 batch_posts: int = 1024):
+        """
+        :param block_size: Максимум постов в блоке
+        :param batch_posts: Сколько постов скорится за первый шаг отбора
+        """
+        if scorer.scorer.scale <= 0:
+            raise ValueError("Score bounds require a positive model scale")
+        self.scorer = scorer
+        self.batch_posts = batch_posts
+        n_posts = scorer.n_posts
+        static = scorer.static_scores
+
+        # Ключи по убыванию влияния на скор, затем убывание статической
+        # части и номер строки
+        keys = self._sort_keys()
+        self.rows = np.lexsort([np.arange(n_posts), -static] + keys[::-1]).astype(np.int64)
+        starts = np.arange(0, n_posts, block_size)
+        self.block_starts = starts.astype(np.int64)
+        self.block_ends = np.r_[starts[1:], n_posts].astype(np.int64)
+        self.n_blocks = len(starts)
+        self.block_sizes = self.block_ends - self.block_starts
+
+        self.static_max = (np.maximum.reduceat(static[self.rows], starts)
+                           if n_posts else np.empty(0))
+
+        # Варианты постовых битов каждого динамического дерева в блоке:
+        # тройки (блок, дерево, биты) по порядку и начала отрезков (блок, дерево)
+        n_dynamic = len(scorer.dynamic_trees)
+        n_leaves = scorer.scorer.leaf_values.shape[1]
+        block_of = np.repeat(np.arange(self.n_blocks), self.block_sizes)
+        present = np.zeros((self.n_blocks, n_dynamic, n_leaves), dtype=bool)
+        present[block_of[None, :], np.arange(n_dynamic)[:, None],
+                scorer.post_bits[:, self.rows]] = True
+        blocks, self._bound_trees, self._bound_leaves = np.nonzero(present)
+        self._segments = np.flatnonzero(np.r_[
+            True, (blocks[1:] != blocks[:-1]) | (self._bound_trees[1:] != self._bound_trees[:-1])
+        ]) if len(blocks) else np.empty(0, dtype=np.int64)
+        self.n_dynamic = n_dynamic
+
+        self.tolerance = RELATIVE_TOLERANCE * (
+            (np.abs(static).max() if n_posts else 0.0)
+            + np.abs(scorer.scorer.leaf_values).max(axis=1).sum()
+        )
+        logger.info("Candidate index: %d posts in %d blocks, %d bound terms",
+                    n_posts, self.n_blocks, len(self._bound_leaves))
+
+    def _sort_keys(self) -> list:
+        """
+        Ключи сортировки постов по убыванию влияния на скор.
+
+        Ключ динамического дерева - постовые биты, влияние - наибольший
+        по битам запроса размах листов между вариантами постовых битов.
+        Статическая часть входит интервалом STATIC_BINS с влиянием,
+        равным её размаху.
+        """
+        scorer = self.scorer
+        leaf_values = scorer.scorer.leaf_values
+        n_leaves = leaf_values.shape[1]
+        keys, spreads = [], []
+        for k, tree in enumerate(scorer.dynamic_trees):
+            patterns = np.unique(scorer.post_bits[k])
+            post_mask = np.bitwise_or.reduce(patterns)
+            request_bits = [d for d in range(n_leaves) if d & post_mask == 0]
+            spread = max(np.ptp(leaf_values[tree, patterns | d]) for d in request_bits)
+            keys.append(scorer.post_bits[k])
+            spreads.append(spread)
+
+        static = scorer.static_scores
+        if len(static):
+            edges = np.quantile(static, np.linspace(0, 1, STATIC_BINS + 1)[1:-1])
+            keys.append(-np.searchsorted(edges, static))
+            spreads.append(np.ptp(static))
+        return [keys[i] for i in np.argsort(spreads, kind="stable")[::-1]]
+
+    def bounds(self, tables: np.ndarray) -> np.ndarray:
+        """Верхние границы сырого скора блоков для таблиц leaf_tables"""
+        if self.n_dynamic == 0:
+            return self.static_max + self.tolerance
+        values = tables[self._bound_trees, self._bound_leaves]
+        dynamic = np.maximum.reduceat(values, self._segments).reshape(self.n_blocks, -1)
+        return self.static_max + dynamic.sum(axis=1) + self.tolerance
+
+    def top_k(self, tables: np.ndarray, k: int, excluded: np.ndarray,
+              budget: Optional[int] = None) -> Tuple[np.ndarray, int]:
+        """
+        Строки k лучших постов по убыванию скора без excluded.
+
+        Результат совпадает с top_k_indices по полному вектору скоров
+        (float32, -inf у исключённых), если budget не задан.
+
+        :param excluded: Отсортированные номера строк исключённых постов
+        :param budget: Максимум постов для скоринга (приближённый режим)
+        :return: Строки постов и число посчитанных постов
+        """
+        if k <= 0 or self.n_blocks == 0:
+            return np.empty(0, dtype=np.int64), 0
+
+        bounds = self.bounds(tables)
+        order = np.argsort(-bounds, kind="stable")
+        scorer = self.scorer.scorer
+        # Граница в тех же единицах, что и скоры: float32 вероятности
+        upper = _sigmoid(scorer.bias + scorer.scale * bounds[order]).astype(np.float32)
+        scored_before = np.cumsum(self.block_sizes[order])
+
+        rows = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=np.float32)
+        scored, i = 0, 0
+        while i < self.n_blocks:
+            # Следующие блоки, в которых вместе не меньше batch_posts постов и
+            # не меньше уже посчитанных: при большом k шагов логарифмически мало
+            step = max(self.batch_posts, scored)
+            j = min(int(np.searchsorted(scored_before, scored + step)) + 1, self.n_blocks)
+            batch = np.concatenate([
+                self.rows[self.block_starts[b]:self.block_ends[b]] for b in order[i:j]
+            ])
+            batch_scores = self.scorer.predict_rows(tables, batch).astype(np.float32)
+            if len(excluded):
+                batch_scores[np.isin(batch, excluded, assume_unique=True)] = -np.inf
+            scored += len(batch)
+            i = j
+
+            rows = np.concatenate([rows, batch])
+            scores = np.concatenate([scores, batch_scores])
+            best = np.lexsort((rows, -scores))[:k]
+            rows, scores = rows[best], scores[best]
+
+            if budget is not None and scored >= budget:
+                break
+            if i < self.n_blocks and len(rows) == k and scores[-1] > upper[i]:
+                break
+
+        keep = scores > -np.inf
+        return rows[keep], scored
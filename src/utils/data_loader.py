@@ -1,55 +1,168 @@
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Union
 import os
 import logging
+from src.utils.id_index import IdIndex
+from src.utils.like_index import LikeIndex, LiveLikeIndex
+from src.utils.post_metadata import PostMetadataStore
+from src.utils.post_payloads import PostPayloadStore
+from src.utils.user_store import UserFeatureStore
+from src.utils.bulk_loader import CHUNKSIZE, TableLoadReport, load_table
+from src.utils.snapshot import open_snapshot, write_snapshot
 
 logger = logging.getLogger(__name__)
 
 class DataLoader:
-    def __init__(self, db_url: str):
+    # Строковые колонки, которые хранятся как категории
+    CATEGORICAL_COLUMNS = ('topic', 'country', 'city')
+
+    def __init__(self, db_url: str,
+                 post_features_table: str = "d_okulova_post_features_lesson_22",
+                 user_features_table: str = "d_okulova_user_features_lesson_22",
+                 feed_table: str = "public.feed_data"):
         self.engine = create_engine(db_url)
+        self.post_features_table = post_features_table
+        self.user_features_table = user_features_table
+        self.feed_table = feed_table
         self.user_features = None
         self.post_features = None
-        self.liked_posts = None
-        self.post_details = {}  # Кэш для быстрого доступа
+        self.like_index: Optional[LiveLikeIndex] = None
+        # Время последнего загруженного лайка, с него продолжает LikeIngester
+        self.like_watermark: Optional[datetime] = None
+        self.post_index: Optional[IdIndex] = None
+        self.user_store: Optional[UserFeatureStore] = None
+        self.post_metadata: Optional[PostMetadataStore] = None  # Текст и тема постов
+        self.post_payloads: Optional[PostPayloadStore] = None
+        self.snapshot = None  # Открытый снапшот, если данные загружены с диска
+        self.load_reports: Dict[str, TableLoadReport] = {}
     
-    def batch_load_sql(self, query: str) -> pd.DataFrame:
-        """Загружает данные из PostgreSQL с пакетной обработкой"""
-        CHUNKSIZE = 200000
-        chunks = []
-        with self.engine.connect().execution_options(stream_results=True) as conn:
-            for chunk in pd.read_sql(query, conn, chunksize=CHUNKSIZE):
-                chunks.append(chunk)
-                return pd.concat(chunks, ignore_index=True)
+    def batch_load_sql(self, query: str, name: str = "query") -> pd.DataFrame:
+        """Загружает данные из БД потоково, с понижением типов колонок"""
+        df, report = load_table(self.engine, name, query,
+                                categorical=self.CATEGORICAL_COLUMNS,
+                                chunksize=CHUNKSIZE)
+        self.load_reports[name] = report
+        return df
     
     def load_features(self):
         """Загружает все необходимые данные для рекомендаций"""
-        try:            
-            # Загрузка фичей постов
-            self.post_features = self.batch_load_sql(
-                "SELECT * FROM d_okulova_post_features_lesson_22"
-            )
-            if self.post_features.empty:
-                raise ValueError("Post features are empty")
+        queries = {
+            # Фичи постов
+            "post_features": f"SELECT * FROM {self.post_features_table}",
+            # Фичи пользователей
+            "user_features": f"SELECT * FROM {self.user_features_table}",
+            # Лайки
+            "liked_posts": f"SELECT DISTINCT post_id, user_id FROM {self.feed_table} WHERE action='like'"
+        }
+        try:
+            # Водяной знак берётся до загрузки лайков: события между ним
+            # и загрузкой будут перечитаны, но не потеряны
+            self.like_watermark = self.query_like_watermark()
             
-            # Загрузка фичей пользователей
-            self.user_features = self.batch_load_sql(
-                "SELECT * FROM d_okulova_user_features_lesson_22"
-            )
-            if self.user_features.empty:
-                raise ValueError("User features are empty")
-                
-            # Загрузка лайков
-            self.liked_posts = self.batch_load_sql(
-                "SELECT DISTINCT post_id, user_id FROM public.feed_data WHERE action='like'"
-            )
+            # Таблицы грузятся параллельно через пул соединений engine
+            with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+                futures = {
+                    name: executor.submit(self.batch_load_sql, query, name)
+                    for name, query in queries.items()
+                }
+                tables = {name: future.result() for name, future in futures.items()}
             
-            # Создаем кэш постов
-            self.post_details = self.post_features.set_index('post_id').to_dict('index')
+            self.load_frames(**tables)
             
             logger.info("Data loading completed successfully")
             return True
             
         except Exception:
             logger.exception("Data loading failed")
-            raise
\ No newline at end of file
+            raise
+
+    def query_like_watermark(self) -> Optional[datetime]:
+        """Время последнего лайка в feed_data"""
+        df = pd.read_sql(
+            f"SELECT MAX(timestamp) AS watermark FROM {self.feed_table} WHERE action='like'",
+            self.engine, parse_dates=["watermark"]
+        )
+        watermark = df['watermark'].iloc[0]
+        return None if pd.isna(watermark) else watermark.to_pydatetime()
+
+    def load_frames(self, post_features: pd.DataFrame,
+                    user_features: pd.DataFrame,
+                    liked_posts: pd.DataFrame):
+        """Устанавливает загруженные таблицы и строит кэши поверх них"""
+        if post_features.empty:
+            raise ValueError("Post features are empty")
+        if user_features.empty:
+            raise ValueError("User features are empty")
+
+        self.user_features = user_features
+        
+        # Атрибуты пользователей с поиском по id за O(1)
+        self.user_store = UserFeatureStore(user_features)
+        
+        # Индекс post_id -> строка post_features
+        self.post_index = IdIndex(post_features['post_id'].to_numpy())
+        
+        # Лайки хранятся только в CSR-индексе, таблица пар не сохраняется;
+        # новые лайки добавляются в его дельту без полной перезагрузки
+        if liked_posts.empty:
+            like_index = LikeIndex.from_pairs(np.array([]), np.array([]))
+        else:
+            like_index = LikeIndex.from_pairs(
+                liked_posts['user_id'].to_numpy(), liked_posts['post_id'].to_numpy()
+            )
+        self.like_index = LiveLikeIndex(like_index)
+        
+        # JSON-фрагменты постов для ответа API сериализуются один раз;
+        # текст и тема для to_posts декодируются из них же, без второй копии
+        self.post_payloads = PostPayloadStore.from_frame(post_features, self.post_index)
+        self.post_metadata = PostMetadataStore(self.post_payloads)
+        logger.info("Post texts: %.1f MB for %d posts",
+                    self.post_metadata.nbytes / 2 ** 20, len(self.post_payloads))
+        
+        # Тексты хранятся только в хранилищах выше; поверхностная копия
+        # не трогает таблицу вызывающего и не копирует остальные колонки
+        self.post_features = post_features.copy(deep=False)
+        del self.post_features['text']
+
+    def load_snapshot(self, path: Union[str, Path]):
+        """Загружает данные из колоночного снапшота на диске вместо БД"""
+        try:
+            snapshot = open_snapshot(path)
+            self.load_frames(
+                snapshot.table("post_features").to_frame(),
+                snapshot.table("user_features").to_frame(),
+                snapshot.table("liked_posts").to_frame()
+            )
+            self.snapshot = snapshot
+            watermark = snapshot.metadata.get("like_watermark")
+            self.like_watermark = datetime.fromisoformat(watermark) if watermark else None
+            
+            logger.info("Data loaded from snapshot %s", snapshot.version)
+            return True
+            
+        except Exception:
+            logger.exception("Snapshot loading failed")
+            raise
+
+    def save_snapshot(self, path: Union[str, Path], keep: int = 3,
+                      metadata: Optional[Dict] = None) -> Path:
+        """
+        Записывает загруженные таблицы в новую версию снапшота.
+
+        :param metadata: Дополнительные поля манифеста
+        """
+        post_features = self.post_features.copy(deep=False)
+        post_features['text'] = self.post_metadata.texts_for(post_features['post_id'].to_numpy())
+        return write_snapshot(path, {
+            "post_features": post_features,
+            "user_features": self.user_features,
+            "liked_posts": self.like_index.to_frame()
+        }, keep=keep, metadata={
+            "like_watermark": self.like_watermark.isoformat() if self.like_watermark else None,
+            **(metadata or {})
+        })
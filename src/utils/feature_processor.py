@@ -1,10 +1,120 @@
 import pandas as pd
 import numpy as np
 import logging
+import threading
 from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Признаки пользователя и запроса - единственные, что меняются между запросами
+USER_FEATURES = ['country', 'gender', 'age', 'city', 'exp_group']
+TIME_FEATURES = ['request_hour', 'request_day_of_week', 'request_month',
+                 'request_week', 'is_weekend', 'time_of_day']
+TIME_OF_DAY = ['night', 'morning', 'afternoon', 'evening']
+
+
+def time_of_day(hour: int) -> str:
+    """Время суток по часу, как pd.cut по [0, 6, 12, 18, 24)"""
+    if hour < 6:
+        return 'night'
+    if hour < 12:
+        return 'morning'
+    if hour < 18:
+        return 'afternoon'
+    return 'evening'
+
+
+def time_feature_columns(timestamps) -> Dict[str, np.ndarray]:
+    """
+    Временные фичи массива моментов времени, как FeatureProcessor.time_features.
+
+    :param timestamps: Значения, приводимые к datetime64
+    :return: Колонки TIME_FEATURES; time_of_day - pd.Categorical
+    """
+    index = pd.DatetimeIndex(timestamps)
+    hour = index.hour.to_numpy()
+    day_of_week = index.weekday.to_numpy()
+    return {
+        'request_hour': hour,
+        'request_day_of_week': day_of_week,
+        'request_month': index.month.to_numpy(),
+        'request_week': index.isocalendar().week.to_numpy(dtype=np.int64),
+        'is_weekend': (day_of_week >= 5).astype(np.int64),
+        # Границы [0, 6, 12, 18, 24) дают номер интервала hour // 6
+        'time_of_day': pd.Categorical.from_codes(hour // 6, categories=TIME_OF_DAY),
+    }
+
+
+class PostFeatureMatrix:
+    """
+    Матрица признаков модели с заранее заполненными признаками постов.
+
+    Постовая часть строится один раз при загрузке данных. На запрос
+    в буфер потока записываются только 5 колонок пользователя и 6 колонок
+    времени, поэтому копий таблицы постов на запрос не создаётся.
+    Возвращаемый буфер переиспользуется следующим запросом того же потока.
+    """
+
+    def __init__(self, features: List[str], posts_data: pd.DataFrame):
+        self.features = features
+        self.n_posts = len(posts_data)
+        self.user_columns = [features.index(name) for name in USER_FEATURES]
+        self.time_columns = [features.index(name) for name in TIME_FEATURES]
+
+        dynamic = set(USER_FEATURES) | set(TIME_FEATURES)
+        self.template = np.empty((self.n_posts, len(features)), dtype=object)
+        for j, name in enumerate(features):
+            if name in dynamic:
+                continue
+            if name in posts_data.columns:
+                self.template[:, j] = posts_data[name].to_numpy(dtype=object)
+            else:
+                self.template[:, j] = 0  # Значение по умолчанию
+
+        self._local = threading.local()
+
+    def _buffer(self) -> np.ndarray:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self.template.copy()
+            self._local.buffer = buffer
+        return buffer
+
+    def fill(self, user_values: Sequence, time_values: Sequence) -> np.ndarray:
+        """
+        Записывает признаки пользователя и времени в буфер потока.
+
+        :param user_values: Значения в порядке USER_FEATURES
+        :param time_values: Значения в порядке TIME_FEATURES
+        :return: Матрица (n_posts, len(features)) для predict_proba
+        """
+        buffer = self._buffer()
+        self._fill_block(buffer, user_values, time_values)
+        return buffer
+
+    def fill_many(self, user_values: Sequence[Sequence],
+                  time_values: Sequence[Sequence]) -> np.ndarray:
+        """
+        Собирает матрицу для нескольких запросов, блоками по n_posts строк.
+
+        :return: Матрица (len(user_values) * n_posts, len(features))
+        """
+        n = self.n_posts
+        result = np.empty((len(user_values) * n, len(self.features)), dtype=object)
+        for i, (user, request_time) in enumerate(zip(user_values, time_values)):
+            block = result[i * n:(i + 1) * n]
+            block[:] = self.template
+            self._fill_block(block, user, request_time)
+        return result
+
+    def _fill_block(self, block: np.ndarray, user_values: Sequence, time_values: Sequence):
+        for j, value in zip(self.user_columns, user_values):
+            block[:, j] = value
+        for j, value in zip(self.time_columns, time_values):
+            block[:, j] = value
+
+
 class FeatureProcessor:
     def __init__(self):
         # Основные фичи
@@ -24,6 +134,23 @@ class FeatureProcessor:
             'time_of_day', 'is_weekend', 'request_week', 'request_month',
             'request_day_of_week', 'request_hour'
         ]
+
+    @staticmethod
+    def time_features(request_time: datetime) -> Tuple:
+        """Временные фичи запроса в порядке TIME_FEATURES"""
+        day_of_week = request_time.weekday()
+        return (
+            request_time.hour,
+            day_of_week,
+            request_time.month,
+            request_time.isocalendar()[1],
+            int(day_of_week >= 5),
+            time_of_day(request_time.hour)
+        )
+
+    def prepare_posts(self, posts_data: pd.DataFrame) -> PostFeatureMatrix:
+        """Строит матрицу признаков с постовой частью для повторного использования"""
+        return PostFeatureMatrix(self.features, posts_data)
     
     def prepare_features(self, user_data: pd.Series,
                          posts_data: pd.DataFrame,
@@ -32,29 +159,15 @@ class FeatureProcessor:
         try:
             # Копируем данные для безопасности
             df = posts_data.copy()
-            request_time = pd.Timestamp(request_time)
             
-            # Добавляем временнЫе фичи
-            time_features = {
-                'request_hour': request_time.hour,
-                'request_day_of_week': request_time.dayofweek,
-                'request_month': request_time.month,
-                'request_week': request_time.isocalendar()[1],
-                'is_weekend': int(request_time.dayofweek >= 5)
-            }
+            # Добавляем временнЫе фичи, включая время суток
+            time_features = dict(zip(TIME_FEATURES, self.time_features(request_time)))
             df = df.assign(**time_features)
             
             # Добавляем пользовательские фичи
-            user_features = ['country', 'gender', 'age', 'city', 'exp_group']            
-            for feature in user_features:
+            for feature in USER_FEATURES:
                 df[feature] = user_data.get(feature, None)
             
-            # Добавляем время суток
-            time_bins = [0, 6, 12, 18, 24]
-            time_labels = ['night', 'morning', 'afternoon', 'evening']
-            df['time_of_day'] = pd.cut(df['request_hour'], bins=time_bins,
-                                       labels=time_labels, right=False).fillna('night')
-            
             # Гарантируем наличие всех фичей
             for feature in self.features:
                 if feature not in df.columns:
@@ -64,4 +177,4 @@ class FeatureProcessor:
         
         except Exception:
             logger.exception("Feature preparation error")
-            raise
\ No newline at end of file
+            raise
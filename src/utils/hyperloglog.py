@@ -0,0 +1,105 @@
+"""
+Массив HyperLogLog-скетчей для подсчёта уникальных значений по строкам.
+
+Все скетчи лежат в одной матрице регистров uint8 (n_rows, 2 ** precision),
+поэтому добавление пачки пар (строка, значение) и оценка всех строк
+векторизованы. Относительная ошибка оценки около 1.04 / sqrt(2 ** precision):
+3.3% при precision=10 (1 КБ на строку).
+"""
+import logging
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRECISION = 10
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def hash64(values) -> np.ndarray:
+    """Финализатор splitmix64: равномерный 64-битный хэш целых значений"""
+    with np.errstate(over="ignore"):
+        x = np.asarray(values).astype(np.int64).view(np.uint64)
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (x ^ (x >> np.uint64(31))) & _MASK64
+
+
+def leading_zeros(x: np.ndarray) -> np.ndarray:
+    """Число ведущих нулевых бит 64-битных значений; для нуля 64"""
+    x = x.copy()
+    zeros = np.zeros(x.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        small = x < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[small] += shift
+        x[small] <<= np.uint64(shift)
+    zeros[x == 0] = 64
+    return zeros
+
+
+class HyperLogLogArray:
+    """HyperLogLog-скетчи для n_rows строк"""
+
+    def __init__(self, n_rows: int, precision: int = DEFAULT_PRECISION,
+                 registers: Optional[np.ndarray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            registers = np.zeros((n_rows, self.m), dtype=np.uint8)
+        elif registers.shape != (n_rows, self.m):
+            raise ValueError(f"Registers shape {registers.shape} != {(n_rows, self.m)}")
+        self.registers = registers
+
+        if self.m >= 128:
+            self.alpha = 0.7213 / (1 + 1.079 / self.m)
+        else:
+            self.alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.m]
+
+    def __len__(self) -> int:
+        return len(self.registers)
+
+    def grow(self, n_rows: int):
+        """Добавляет пустые скетчи до n_rows строк"""
+        if n_rows > len(self.registers):
+            extra = np.zeros((n_rows - len(self.registers), self.m), dtype=np.uint8)
+            self.registers = np.vstack([self.registers, extra])
+
+    def add(self, rows, values):
+        """Добавляет values[i] в скетч строки rows[i]"""
+        hashes = hash64(values)
+        buckets = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # Ранг - позиция первой единицы в оставшихся битах хэша
+        rest = hashes << np.uint64(self.precision)
+        ranks = (np.minimum(leading_zeros(rest), 64 - self.precision) + 1).astype(np.uint8)
+
+        # Максимум ранга на регистр через сортировку: np.maximum.at медленный
+        cells = np.asarray(rows, dtype=np.intp) * self.m + buckets
+        order = np.lexsort((ranks, cells))
+        cells, ranks = cells[order], ranks[order]
+        last = np.ones(len(cells), dtype=bool)
+        last[:-1] = cells[1:] != cells[:-1]
+        cells, ranks = cells[last], ranks[last]
+
+        flat = self.registers.reshape(-1)
+        flat[cells] = np.maximum(flat[cells], ranks)
+
+    def estimate(self, rows=None) -> np.ndarray:
+        """Оценка числа уникальных значений по строкам (по всем, если rows=None)"""
+        registers = self.registers if rows is None else self.registers[np.asarray(rows)]
+        inverse_sum = np.ldexp(1.0, -registers.astype(np.int32)).sum(axis=1)
+        raw = self.alpha * self.m * self.m / inverse_sum
+
+        # Малые мощности: линейный подсчёт по пустым регистрам
+        empty = (registers == 0).sum(axis=1)
+        small = (raw <= 2.5 * self.m) & (empty > 0)
+        linear = self.m * np.log(self.m / np.maximum(empty, 1))
+        return np.where(small, linear, raw)
+
+    @property
+    def nbytes(self) -> int:
+        return self.registers.nbytes
@@ -0,0 +1,77 @@
+import numpy as np
+from typing import Union
+
+# Во сколько раз диапазон id может превышать число id для плотной таблицы
+DENSE_RATIO = 4
+
+
+class IdIndex:
+    """
+    Отображение id сущности в номер строки таблицы.
+
+    Для компактных id используется плотный массив row_of[id], поиск O(1);
+    для разреженных - отсортированный массив id и бинарный поиск.
+    Отсутствующим id соответствует -1.
+    """
+
+    def __init__(self, ids: np.ndarray):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("Ids must be unique")
+
+        self.size = len(ids)
+        self.min_id = int(ids.min()) if len(ids) else 0
+        max_id = int(ids.max()) if len(ids) else -1
+        span = max_id - self.min_id + 1
+
+        self.dense = span <= DENSE_RATIO * max(len(ids), 1)
+        if self.dense:
+            self._row_of = np.full(max(span, 0), -1, dtype=np.int32)
+            self._row_of[ids - self.min_id] = np.arange(len(ids), dtype=np.int32)
+        else:
+            order = np.argsort(ids, kind="stable")
+            self._sorted_ids = ids[order]
+            self._sorted_rows = order.astype(np.int32)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, entity_id: int) -> bool:
+        return self.lookup(entity_id) >= 0
+
+    def lookup(self, entity_id: int) -> int:
+        """Номер строки для одного id или -1"""
+        if self.dense:
+            position = entity_id - self.min_id
+            if 0 <= position < len(self._row_of):
+                return int(self._row_of[position])
+            return -1
+
+        position = int(np.searchsorted(self._sorted_ids, entity_id))
+        if position < self.size and self._sorted_ids[position] == entity_id:
+            return int(self._sorted_rows[position])
+        return -1
+
+    def lookup_many(self, ids: Union[np.ndarray, list]) -> np.ndarray:
+        """Номера строк для массива id; отсутствующим соответствует -1"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.dense:
+            positions = ids - self.min_id
+            valid = (positions >= 0) & (positions < len(self._row_of))
+            rows = np.full(len(ids), -1, dtype=np.int32)
+            rows[valid] = self._row_of[positions[valid]]
+            return rows
+
+        positions = np.searchsorted(self._sorted_ids, ids)
+        positions = np.minimum(positions, max(self.size - 1, 0))
+        rows = np.full(len(ids), -1, dtype=np.int32)
+        if self.size:
+            found = self._sorted_ids[positions] == ids
+            rows[found] = self._sorted_rows[positions[found]]
+        return rows
+
+    @property
+    def nbytes(self) -> int:
+        if self.dense:
+            return self._row_of.nbytes
+        return self._sorted_ids.nbytes + self._sorted_rows.nbytes
@@ -0,0 +1,176 @@
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class LikeIndex:
+    """
+    CSR-индекс лайков.
+
+    user_ids - отсортированные id пользователей, у которых есть лайки;
+    offsets - границы срезов пользователей в post_ids (len(user_ids) + 1);
+    post_ids - отсортированные внутри каждого среза id лайкнутых постов.
+
+    Лайки пользователя - непрерывный срез post_ids, поэтому стоимость
+    исключения растёт с историей пользователя, а не с общим числом
+    лайков. Память - около 4 байт на лайк.
+    """
+
+    def __init__(self, user_ids: np.ndarray, offsets: np.ndarray, post_ids: np.ndarray):
+        self.user_ids = user_ids
+        self.offsets = offsets
+        self.post_ids = post_ids
+
+    @classmethod
+    def from_pairs(cls, user_ids: np.ndarray, post_ids: np.ndarray) -> "LikeIndex":
+        """Строит индекс из пар (user_id, post_id), дубликаты отбрасываются"""
+        user_ids = np.asarray(user_ids, dtype=np.int32)
+        post_ids = np.asarray(post_ids, dtype=np.int32)
+
+        order = np.lexsort((post_ids, user_ids))
+        user_ids = user_ids[order]
+        post_ids = post_ids[order]
+
+        if len(user_ids):
+            keep = np.ones(len(user_ids), dtype=bool)
+            keep[1:] = (user_ids[1:] != user_ids[:-1]) | (post_ids[1:] != post_ids[:-1])
+            user_ids = user_ids[keep]
+            post_ids = post_ids[keep]
+
+        unique_users, starts = np.unique(user_ids, return_index=True)
+        offsets = np.append(starts, len(user_ids)).astype(np.int64)
+        return cls(unique_users, offsets, post_ids)
+
+    def __len__(self) -> int:
+        return len(self.post_ids)
+
+    def liked_posts(self, user_id: int) -> np.ndarray:
+        """Отсортированные id постов, лайкнутых пользователем (срез без копии)"""
+        position = int(np.searchsorted(self.user_ids, user_id))
+        if position == len(self.user_ids) or self.user_ids[position] != user_id:
+            return self.post_ids[:0]
+        return self.post_ids[self.offsets[position]:self.offsets[position + 1]]
+
+    def counts(self) -> Tuple[np.ndarray, np.ndarray]:
+        """id пользователей с лайками и число лайков каждого"""
+        return self.user_ids, np.diff(self.offsets)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Разворачивает индекс обратно в пары post_id, user_id"""
+        counts = np.diff(self.offsets)
+        return pd.DataFrame({
+            'post_id': self.post_ids,
+            'user_id': np.repeat(self.user_ids, counts)
+        }, copy=False)
+
+    @property
+    def nbytes(self) -> int:
+        return self.user_ids.nbytes + self.offsets.nbytes + self.post_ids.nbytes
+
+
+class LiveLikeIndex:
+    """
+    LikeIndex с дельтой новых лайков поверх него.
+
+    Новые лайки попадают в небольшой словарь user_id -> отсортированные
+    post_ids, и liked_posts объединяет срез базы с дельтой пользователя.
+    compact() периодически вливает дельту в новый CSR-индекс. База
+    и дельта читаются по одной ссылке, поэтому чтение не блокируется,
+    а запись и сжатие сериализуются между собой.
+    """
+
+    def __init__(self, base: LikeIndex):
+        self._state: Tuple[LikeIndex, Dict[int, np.ndarray]] = (base, {})
+        self._write_lock = threading.Lock()
+        self.delta_size = 0
+
+    @property
+    def base(self) -> LikeIndex:
+        return self._state[0]
+
+    def __len__(self) -> int:
+        return len(self.base) + self.delta_size
+
+    def liked_posts(self, user_id: int) -> np.ndarray:
+        """Отсортированные id постов, лайкнутых пользователем, с учётом дельты"""
+        base, delta = self._state
+        liked = base.liked_posts(user_id)
+        extra = delta.get(user_id)
+        return liked if extra is None else np.union1d(liked, extra)
+
+    def add(self, user_ids: np.ndarray, post_ids: np.ndarray) -> int:
+        """
+        Добавляет пары (user_id, post_id) в дельту.
+
+        Уже известные пары пропускаются, поэтому повторная загрузка тех же
+        событий ничего не меняет.
+
+        :return: Число новых пар
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int32)
+        post_ids = np.asarray(post_ids, dtype=np.int32)
+        order = np.argsort(user_ids, kind="stable")
+        user_ids, post_ids = user_ids[order], post_ids[order]
+        users, starts = np.unique(user_ids, return_index=True)
+        bounds = np.append(starts, len(user_ids))
+
+        added = 0
+        with self._write_lock:
+            delta = self._state[1]
+            for user_id, start, end in zip(users.tolist(), bounds[:-1], bounds[1:]):
+                known = self.liked_posts(user_id)
+                fresh = np.setdiff1d(post_ids[start:end], known)
+                if len(fresh):
+                    # Присваивание целого массива атомарно для читателей
+                    delta[user_id] = np.union1d(delta.get(user_id, fresh[:0]), fresh)
+                    added += len(fresh)
+            self.delta_size += added
+        return added
+
+    @staticmethod
+    def _merge(base: LikeIndex, delta: Dict[int, np.ndarray]) -> LikeIndex:
+        if not delta:
+            return base
+        base_users, base_counts = base.counts()
+        delta_users = np.array(list(delta), dtype=np.int32)
+        delta_counts = np.array([len(posts) for posts in delta.values()])
+        return LikeIndex.from_pairs(
+            np.concatenate([np.repeat(base_users, base_counts),
+                            np.repeat(delta_users, delta_counts)]),
+            np.concatenate([base.post_ids, *delta.values()])
+        )
+
+    def compact(self) -> int:
+        """
+        Вливает дельту в новый CSR-индекс и подменяет базу.
+
+        :return: Число влитых пар
+        """
+        with self._write_lock:
+            base, delta = self._state
+            merged = self.delta_size
+            if merged:
+                self._state = (self._merge(base, delta), {})
+                self.delta_size = 0
+        return merged
+
+    def merged(self) -> LikeIndex:
+        """Неизменяемый LikeIndex базы и дельты без подмены текущего состояния"""
+        with self._write_lock:
+            return self._merge(*self._state)
+
+    def counts(self) -> Tuple[np.ndarray, np.ndarray]:
+        """id пользователей с лайками и число лайков каждого, с учётом дельты"""
+        return self.merged().counts()
+
+    def to_frame(self) -> pd.DataFrame:
+        """Пары post_id, user_id базы и дельты"""
+        return self.merged().to_frame()
+
+    @property
+    def nbytes(self) -> int:
+        with self._write_lock:
+            base, delta = self._state
+            return base.nbytes + sum(posts.nbytes for posts in delta.values())
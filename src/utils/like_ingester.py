@@ -0,0 +1,117 @@
+"""
+Инкрементальная догрузка лайков из feed_data по водяному знаку времени.
+
+Вместо полной перезагрузки liked_posts читаются только события после
+курсора FeedTail пачками ограниченного размера,
+поэтому стоимость обновления растёт с числом новых событий, а не со всей
+историей (при индексе по timestamp в feed_data). Новые лайки попадают
+в дельту LiveLikeIndex, которая периодически сжимается в CSR-индекс.
+
+События, вставленные задним числом (с timestamp раньше курсора),
+не подхватываются и попадут в данные при следующей полной загрузке.
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from src.utils.feed_tail import BATCH_SIZE, FeedTail
+from src.utils.like_index import LiveLikeIndex
+
+logger = logging.getLogger(__name__)
+
+# Пачек за один проход; остаток догружается следующим проходом
+MAX_BATCHES_PER_POLL = 20
+# Размер дельты, после которого она вливается в базу
+COMPACT_THRESHOLD = 200000
+
+
+class LikeIngester:
+    """Фоновая догрузка новых лайков в LiveLikeIndex"""
+
+    def __init__(self, engine, like_index: LiveLikeIndex, feed_table: str,
+                 watermark: datetime,
+                 batch_size: int = BATCH_SIZE,
+                 max_batches: int = MAX_BATCHES_PER_POLL,
+                 compact_threshold: int = COMPACT_THRESHOLD):
+        self.like_index = like_index
+        self.max_batches = max_batches
+        self.compact_threshold = compact_threshold
+
+        # События с временем водяного знака перечитываются: добавление идемпотентно
+        self.tail = FeedTail(engine, feed_table, "like", watermark, batch_size)
+        self._poll_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self.events = 0
+        self.new_likes = 0
+        self.compactions = 0
+        self.last_poll_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def watermark(self) -> datetime:
+        return self.tail.watermark
+
+    def poll(self) -> int:
+        """
+        Догружает новые события пачками до max_batches штук.
+
+        :return: Число новых лайков
+        """
+        with self._poll_lock:
+            started = time.perf_counter()
+            added = 0
+            for batch in self.tail.batches(self.max_batches):
+                added += self.like_index.add(batch['user_id'].to_numpy(),
+                                             batch['post_id'].to_numpy())
+                self.events += len(batch)
+
+            self.new_likes += added
+            if self.like_index.delta_size >= self.compact_threshold:
+                merged = self.like_index.compact()
+                self.compactions += 1
+                logger.info("Compacted %d new likes into the like index", merged)
+
+            self.last_poll_seconds = time.perf_counter() - started
+            if added:
+                logger.info("Ingested %d new likes up to %s in %.3fs",
+                            added, self.watermark, self.last_poll_seconds)
+            return added
+
+    def start(self, interval_seconds: float):
+        """Запускает периодическую догрузку в фоновом потоке"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop_event.wait(interval_seconds):
+                try:
+                    self.poll()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.exception("Like ingestion failed, retrying on next poll")
+
+        self._thread = threading.Thread(target=loop, name="like-ingester", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict:
+        return {
+            "watermark": self.watermark.isoformat(),
+            "events": self.events,
+            "new_likes": self.new_likes,
+            "delta_size": self.like_index.delta_size,
+            "compactions": self.compactions,
+            "last_poll_seconds": (round(self.last_poll_seconds, 4)
+                                  if self.last_poll_seconds is not None else None),
+            "last_error": self.last_error
+        }
@@ -0,0 +1,140 @@
+import threading
+import time
+from bisect import bisect_left
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм задержек в секундах, от 50 мкс до 5 с
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: наблюдение - поиск корзины и инкремент"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Согласованная копия счётчиков корзин и суммы"""
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Span:
+    """Замер стадии по монотонным часам: with metrics.span("scoring"): ..."""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class ServiceMetrics:
+    """
+    Метрики процесса: гистограммы задержек стадий и счётчики событий.
+
+    Объект общий для всех снапшотов сервиса, поэтому накопленные
+    значения переживают перезагрузку данных. Наблюдение стоит
+    поиска по 16 границам и инкремента под блокировкой.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.stages: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str, **labels: str) -> Histogram:
+        key = (stage, tuple(sorted(labels.items())) if labels else ())
+        histogram = self.stages.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(key, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, stage: str, seconds: float, **labels: str):
+        self.histogram(stage, **labels).observe(seconds)
+
+    def span(self, stage: str, **labels: str) -> Span:
+        return Span(self.histogram(stage, **labels))
+
+    def increment(self, name: str, value: int = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels: str) -> int:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self, prefix: str = "recommender") -> List[str]:
+        """Гистограммы стадий и счётчики в текстовом формате Prometheus"""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of recommendation stages",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+        for (stage, labels), histogram in stages:
+            counts, total = histogram.snapshot()
+            labels = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(metric_line(f"{prefix}_stage_seconds_bucket", cumulative,
+                                         labels + (("le", le),)))
+            lines.append(metric_line(f"{prefix}_stage_seconds_sum", total, labels))
+            lines.append(metric_line(f"{prefix}_stage_seconds_count", cumulative, labels))
+
+        for name, items in groupby(counters, key=lambda item: item[0][0]):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.extend(metric_line(f"{prefix}_{name}_total", value, labels)
+                         for (_, labels), value in items)
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def metric_line(name: str, value: float, labels: Iterable[Tuple[str, str]] = ()) -> str:
+    """Строка метрики Prometheus: name{label="value"} value"""
+    label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+    if isinstance(value, bool):
+        value = int(value)
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+
+def gauge_lines(name: str, value: Optional[float], help_text: str,
+                metric_type: str = "gauge") -> List[str]:
+    """HELP, TYPE и значение одной метрики; None - метрика не выводится"""
+    if value is None:
+        return []
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}",
+            metric_line(name, value)]
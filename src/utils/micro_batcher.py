@@ -0,0 +1,143 @@
+import queue
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from src.api.schemas import PostGet
+from src.utils.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Объединяет одиночные запросы рекомендаций в пакеты.
+
+    Запросы копятся до max_batch_size штук или до max_wait_ms миллисекунд
+    с момента прихода первого, затем считаются одним вызовом
+    RecommendationService.recommend_post_ids_batch, и результаты
+    раздаются обратно через Future. Запросы с истёкшим дедлайном и
+    отменённые ожидающей стороной перед расчётом выбрасываются.
+    Блокирующие get_recommendations(_json) повторяют интерфейс
+    RecommendationService; API ждёт Future из submit без блокировки потока.
+    """
+
+    def __init__(self, service_provider: Callable[[], RecommendationService],
+                 max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.service_provider = service_provider
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+        self.batches = 0
+        self.requests = 0
+        self.expired = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+    def submit(self, user_id: int, request_time: datetime, limit: int = 5,
+               deadline: Optional[float] = None) -> Future:
+        """
+        Ставит запрос в очередь и возвращает Future с (сервисом, id постов).
+
+        :param deadline: Момент time.monotonic(), после которого запрос
+            не считается, а Future завершается TimeoutError
+        """
+        future: Future = Future()
+        self._queue.put((user_id, request_time, limit, future, deadline, time.monotonic()))
+        return future
+
+    def get_recommendations(self, user_id: int,
+                            request_time: datetime,
+                            limit: int = 5) -> List[PostGet]:
+        """Блокирующий вызов с тем же интерфейсом, что у RecommendationService"""
+        service, post_ids = self.submit(user_id, request_time, limit).result()
+        return service.to_posts(post_ids)
+
+    def get_recommendations_json(self, user_id: int,
+                                 request_time: datetime,
+                                 limit: int = 5) -> bytes:
+        """Блокирующий вызов, возвращающий готовый JSON-ответ"""
+        service, post_ids = self.submit(user_id, request_time, limit).result()
+        return service.to_json(post_ids)
+
+    def _collect(self, first) -> tuple:
+        """Добирает пакет до лимита размера или времени ожидания"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch, stopped = self._collect(first)
+            self._process(batch)
+            if stopped:
+                return
+
+    def _live(self, batch: list, service: RecommendationService) -> list:
+        """Запросы пакета, которые ещё ждут ответа; ожидание в очереди - в метрики"""
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            future, deadline, submitted = item[3], item[4], item[5]
+            service.metrics.observe("micro_batch_wait", now - submitted)
+            if not future.set_running_or_notify_cancel():
+                self.expired += 1
+            elif deadline is not None and now >= deadline:
+                self.expired += 1
+                future.set_exception(TimeoutError("Deadline exceeded in micro-batch queue"))
+            else:
+                live.append(item)
+        return live
+
+    def _process(self, batch: list):
+        try:
+            service = self.service_provider()
+            batch = self._live(batch, service)
+            if not batch:
+                return
+            self.batches += 1
+            self.requests += len(batch)
+            results = service.recommend_post_ids_batch(
+                [(user_id, request_time, limit) for user_id, request_time, limit, *_ in batch]
+            )
+            # Посты собираются тем же снапшотом, которым посчитаны
+            for (_, _, _, future, *_), post_ids in zip(batch, results):
+                future.set_result((service, post_ids))
+        except Exception as e:
+            logger.exception("Micro-batch processing failed")
+            for _, _, _, future, *_ in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -1,7 +1,9 @@
 import os
+import hashlib
 from catboost import CatBoostClassifier
 import logging
 from typing import Union
+from src.utils.oblivious_scorer import ObliviousTreeScorer
 
 logger = logging.getLogger(__name__)
 
@@ -13,16 +15,33 @@ def get_model_path(path: str) -> str:
         return '/workdir/user_input/model'
     return path
 
-def load_model(model_path: Union[str, None] = None) -> CatBoostClassifier:
-    """Загружает CatBoost модель из указанного пути"""
+def model_checksum(model_path: str) -> str:
+    """sha256 файла модели; по нему таблица ответов сверяется с обслуживаемой моделью"""
+    digest = hashlib.sha256()
+    with open(get_model_path(model_path), "rb") as f:
+        for block in iter(lambda: f.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_model(model_path: Union[str, None] = None,
+               scorer: Union[str, None] = None) -> Union[CatBoostClassifier, ObliviousTreeScorer]:
+    """
+    Загружает CatBoost модель из указанного пути.
+
+    :param scorer: "catboost" - сама модель, "native" - NumPy-оценщик
+        ObliviousTreeScorer поверх неё; по умолчанию MODEL_SCORER
+    """
     try:
         model_path = model_path or os.getenv("MODEL_PATH", "catboost_min_features.cbm")
+        scorer = scorer or os.getenv("MODEL_SCORER", "catboost")
         final_path = get_model_path(model_path)
         
         model = CatBoostClassifier()
         model.load_model(final_path)
         
         logger.info(f"Model loaded from: {final_path}")
+        if scorer == "native":
+            return to_native_scorer(model)
         return model
     
     except FileNotFoundError:
@@ -30,4 +49,14 @@ def load_model(model_path: Union[str, None] = None) -> CatBoostClassifier:
         raise
     except Exception:
         logger.exception("Model loading failed")
-        raise
\ No newline at end of file
+        raise
+
+def to_native_scorer(model: CatBoostClassifier) -> Union[CatBoostClassifier, ObliviousTreeScorer]:
+    """Конвертирует модель в ObliviousTreeScorer; неподдерживаемая модель остаётся как есть"""
+    try:
+        scorer = ObliviousTreeScorer(model)
+    except ValueError as e:
+        logger.warning(f"Native scorer is not available for this model: {e}")
+        return model
+    logger.info(f"Native scorer: {scorer.n_trees} trees of depth {scorer.depth}")
+    return scorer
@@ -0,0 +1,366 @@
+"""
+Реестр моделей для обслуживания нескольких ранжировщиков одновременно.
+
+Запрос направляется в модель по exp_group пользователя, группы без
+маршрута - в модель по умолчанию. Все модели работают поверх одной
+PostFeatureMatrix снапшота данных: на модель добавляются только её
+собственные массивы - постовая часть нативного оценщика и блоки отбора
+кандидатов.
+
+Модель группы загружается в фоновом потоке при первом запросе к ней;
+пока загрузка идёт (или после её ошибки), группу обслуживает модель по
+умолчанию, и поток запроса не ждёт чтения файла. Замена модели (swap по
+изменению файла или через /admin/models) сначала целиком строит новый
+Ranker и только затем подменяет ссылку, поэтому запросы в процессе
+обработки дорабатывают на старой версии.
+"""
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.candidate_index import CandidateIndex
+from src.utils.feature_processor import USER_FEATURES
+from src.utils.model_loader import get_model_path, load_model, model_checksum
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "default"
+
+# Пауза перед повторной загрузкой модели после ошибки
+LOAD_RETRY_SECONDS = 30.0
+
+# Позиция exp_group в атрибутах пользователя (порядок USER_FEATURES)
+EXP_GROUP = USER_FEATURES.index("exp_group")
+
+
+def parse_mapping(text: Optional[str]) -> Dict[str, str]:
+    """Разбирает строку вида "a=x,b=y" из переменной окружения"""
+    mapping = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip() or not value.strip():
+            raise ValueError(f"Expected key=value, got {item!r}")
+        mapping[key.strip()] = value.strip()
+    return mapping
+
+
+def group_key(exp_group) -> str:
+    """
+    Ключ маршрута для значения exp_group: целые float (1.0 после
+    повышения типа колонки с NULL) и строки "1.0" дают тот же "1"
+    """
+    if isinstance(exp_group, str):
+        try:
+            number = float(exp_group)
+        except ValueError:
+            return exp_group.strip()
+        exp_group = number
+    if isinstance(exp_group, (float, np.floating)) and float(exp_group).is_integer():
+        exp_group = int(exp_group)
+    return str(exp_group)
+
+
+def _arrays_nbytes(*objects) -> int:
+    """Суммарный размер numpy-массивов в атрибутах объектов"""
+    return sum(value.nbytes for obj in objects if obj is not None
+               for value in vars(obj).values() if isinstance(value, np.ndarray))
+
+
+@dataclass(frozen=True, eq=False)
+class Ranker:
+    """
+    Загруженная версия модели, подготовленная для постов снапшота.
+    Сравнивается и хэшируется по identity.
+    """
+    name: str
+    version: int
+    model: Any
+    post_scorer: Any = None
+    candidate_index: Optional[CandidateIndex] = None
+    path: Optional[str] = None
+    mtime: Optional[float] = None
+    # sha256 файла модели; None - модель загружена не из файла
+    checksum: Optional[str] = None
+    loaded_at: float = 0.0
+    load_seconds: float = 0.0
+    # Файл модели и массивы, построенные для постов снапшота
+    model_bytes: int = 0
+    post_bytes: int = 0
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        """Версия модели для ключей кэша скоров"""
+        return self.name, self.version
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "checksum": self.checksum,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+            "native": self.post_scorer is not None,
+            "candidate_pruning": self.candidate_index is not None,
+            "model_bytes": self.model_bytes,
+            "post_bytes": self.post_bytes,
+        }
+
+
+class _ModelSlot:
+    """Текущая версия одной модели; ссылка на Ranker подменяется целиком"""
+
+    def __init__(self, name: str, path: Optional[str]):
+        self.name = name
+        self.path = path
+        self.ranker: Optional[Ranker] = None
+        self.versions = 0
+        self.last_error: Optional[str] = None
+        self.failed_at: Optional[float] = None
+        # Фоновая загрузка при первом запросе; не больше одной на слот
+        self.loading: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def retry_pending(self) -> bool:
+        """После ошибки загрузки ещё не прошло LOAD_RETRY_SECONDS"""
+        return (self.failed_at is not None
+                and time.monotonic() - self.failed_at < LOAD_RETRY_SECONDS)
+
+
+class ModelRegistry:
+    """Модели по именам с маршрутизацией по exp_group"""
+
+    def __init__(self, post_matrix, paths: Dict[str, Optional[str]],
+                 routes: Optional[Dict[str, str]] = None,
+                 default: str = DEFAULT_MODEL,
+                 scorer: Optional[str] = None,
+                 candidate_mode: Optional[str] = None,
+                 loader: Callable = load_model):
+        """
+        :param post_matrix: Общая матрица признаков постов снапшота
+        :param paths: Пути к файлам моделей по именам
+        :param routes: Имя модели по значению exp_group (строкой)
+        :param default: Модель для групп без маршрута
+        :param scorer: "catboost" или "native", как в load_model
+        :param candidate_mode: Режим отбора кандидатов: None, "exact" или "approx"
+        :param loader: Загрузка модели по (путь, scorer)
+        """
+        routes = routes or {}
+        if default not in paths:
+            raise ValueError(f"Default model {default!r} is not configured")
+        for group, name in routes.items():
+            if name not in paths:
+                raise ValueError(f"exp_group {group} is routed to unknown model {name!r}")
+        if candidate_mode not in (None, "exact", "approx"):
+            raise ValueError(f"Unknown candidate mode: {candidate_mode}")
+
+        self.post_matrix = post_matrix
+        self.routes = {group_key(group): name for group, name in routes.items()}
+        self.default = default
+        self.scorer = scorer
+        self.candidate_mode = candidate_mode
+        self.loader = loader
+        self._slots = {name: _ModelSlot(name, path) for name, path in paths.items()}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def from_model(cls, model, post_matrix, candidate_mode: Optional[str] = None,
+                   name: str = DEFAULT_MODEL) -> "ModelRegistry":
+        """Реестр из одной уже загруженной модели без файла"""
+        registry = cls(post_matrix, {name: None}, default=name, candidate_mode=candidate_mode)
+        slot = registry._slots[name]
+        slot.versions = 1
+        slot.ranker = registry._prepare(name, 1, model, time.perf_counter())
+        return registry
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._slots)
+
+    def route(self, exp_group) -> str:
+        """Имя модели для значения exp_group"""
+        return self.routes.get(group_key(exp_group), self.default)
+
+    def ranker_for(self, user_attributes: Tuple) -> Ranker:
+        """
+        Текущая версия модели для атрибутов пользователя. Незагруженная
+        модель группы загружается в фоне, а до тех пор запросы обслуживает
+        модель по умолчанию (она загружается при сборке снапшота).
+        """
+        name = self.route(user_attributes[EXP_GROUP])
+        ranker = self._slots[name].ranker
+        if ranker is not None:
+            return ranker
+        if name != self.default:
+            self._load_in_background(self._slots[name])
+        return self.get(self.default)
+
+    def get(self, name: str) -> Ranker:
+        """
+        Текущая версия модели; при первом обращении модель загружается
+        синхронно в вызывающем потоке (предзагрузка, админка, офлайн-задачи).
+        После ошибки загрузки повторная попытка - не раньше LOAD_RETRY_SECONDS.
+        """
+        slot = self._slots[name]
+        ranker = slot.ranker
+        if ranker is None:
+            with slot.lock:
+                if slot.ranker is None:
+                    if slot.retry_pending():
+                        raise RuntimeError(f"Model {name!r} is not available: {slot.last_error}")
+                    slot.ranker = self._load(slot, slot.path)
+                ranker = slot.ranker
+        return ranker
+
+    def _load_in_background(self, slot: _ModelSlot):
+        """Запускает загрузку модели в фоновом потоке, если она ещё не идёт"""
+        # Блокировку держит идущая загрузка или замена - ждать её незачем
+        if slot.loading is not None or not slot.lock.acquire(blocking=False):
+            return
+        try:
+            if slot.ranker is not None or slot.loading is not None or slot.retry_pending():
+                return
+            slot.loading = threading.Thread(target=self._background_load, args=(slot,),
+                                            name=f"model-loader-{slot.name}", daemon=True)
+            slot.loading.start()
+        finally:
+            slot.lock.release()
+
+    def _background_load(self, slot: _ModelSlot):
+        try:
+            self.get(slot.name)
+        except Exception:
+            # Ошибка уже в логе _load; следующая попытка - после LOAD_RETRY_SECONDS
+            pass
+        finally:
+            slot.loading = None
+
+    def loaded(self) -> List[Ranker]:
+        """Загруженные модели"""
+        return [slot.ranker for slot in self._slots.values() if slot.ranker is not None]
+
+    def swap(self, name: str, path: Optional[str] = None) -> Ranker:
+        """
+        Загружает модель заново (из path или прежнего файла) и атомарно
+        подменяет текущую версию. При ошибке остаётся прежняя версия.
+        """
+        slot = self._slots[name]
+        path = path or slot.path
+        if path is None:
+            raise ValueError(f"Model {name!r} has no file to load from")
+        with slot.lock:
+            ranker = self._load(slot, path)
+            slot.path = path
+            slot.ranker = ranker
+        return ranker
+
+    def _load(self, slot: _ModelSlot, path: Optional[str]) -> Ranker:
+        started = time.perf_counter()
+        try:
+            if path is None:
+                raise ValueError(f"Model {slot.name!r} has no file to load from")
+            mtime = os.path.getmtime(get_model_path(path))
+            checksum = model_checksum(path)
+            model = self.loader(path, self.scorer)
+            ranker = self._prepare(slot.name, slot.versions + 1, model, started,
+                                   path=path, mtime=mtime, checksum=checksum)
+        except Exception as e:
+            slot.last_error = str(e)
+            slot.failed_at = time.monotonic()
+            logger.exception("Model %s loading from %s failed", slot.name, path)
+            raise
+        slot.versions += 1
+        slot.last_error = None
+        slot.failed_at = None
+        logger.info("Model %s v%d loaded from %s in %.2fs",
+                    slot.name, ranker.version, path, ranker.load_seconds)
+        return ranker
+
+    def _prepare(self, name: str, version: int, model, started: float,
+                 path: Optional[str] = None, mtime: Optional[float] = None,
+                 checksum: Optional[str] = None) -> Ranker:
+        """Постовая часть модели над общей матрицей признаков"""
+        post_scorer = (model.prepare_posts(self.post_matrix)
+                       if hasattr(model, 'prepare_posts') else None)
+        candidate_index = None
+        if self.candidate_mode is not None:
+            if post_scorer is None:
+                logger.warning("Candidate pruning needs the native scorer; "
+                               "model %s scores all posts", name)
+            else:
+                try:
+                    candidate_index = CandidateIndex(post_scorer)
+                except ValueError as e:
+                    logger.warning(f"Candidate pruning is not available for model {name}: {e}")
+        return Ranker(
+            name=name,
+            version=version,
+            model=model,
+            post_scorer=post_scorer,
+            candidate_index=candidate_index,
+            path=path,
+            mtime=mtime,
+            checksum=checksum,
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - started,
+            model_bytes=(os.path.getsize(get_model_path(path)) if path
+                         else _arrays_nbytes(model)),
+            post_bytes=_arrays_nbytes(post_scorer, candidate_index),
+        )
+
+    def check_files(self) -> List[str]:
+        """Перезагружает загруженные модели, файлы которых изменились"""
+        swapped = []
+        for name, slot in self._slots.items():
+            ranker = slot.ranker
+            if ranker is None or ranker.path is None:
+                continue
+            try:
+                if os.path.getmtime(get_model_path(ranker.path)) == ranker.mtime:
+                    continue
+                self.swap(name, ranker.path)
+                swapped.append(name)
+            except Exception:
+                # Ошибка уже в логе _load; файл проверяется снова на следующем проходе
+                logger.warning("Keeping model %s v%d", name, ranker.version)
+        return swapped
+
+    def start_watching(self, interval_seconds: float):
+        """Периодически проверяет файлы загруженных моделей в фоновом потоке"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop_event.wait(interval_seconds):
+                self.check_files()
+
+        self._thread = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Dict]:
+        """Состояние моделей: версия, память, маршруты, последняя ошибка загрузки"""
+        result = {}
+        for name, slot in self._slots.items():
+            ranker = slot.ranker
+            result[name] = dict(
+                ranker.stats() if ranker is not None else {"version": None, "path": slot.path},
+                loaded=ranker is not None,
+                loading=slot.loading is not None,
+                default=name == self.default,
+                exp_groups=sorted(group for group, target in self.routes.items() if target == name),
+                last_error=slot.last_error,
+            )
+        return result
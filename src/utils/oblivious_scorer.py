@@ -0,0 +1,285 @@
+"""
+NumPy-оценщик бинарной модели CatBoost из симметричных (oblivious) деревьев.
+
+Модель конвертируется в таблицы: для каждого дерева - значения листьев
+и список сплитов (признак, глубина). Сплиты по числовым признакам
+считаются сравнением с порогом. Сплиты по категориальным признакам
+(one-hot и CTR) зависят только от значения одного признака, поэтому их
+биты для каждого значения один раз вычисляются самим CatBoost через
+calc_leaf_indexes на пробных строках и кэшируются; так хэширование
+категорий и CTR-таблицы модели воспроизводятся точно.
+
+Для рекомендаций биты сплитов по признакам постов считаются один раз
+при загрузке (PreparedObliviousScorer), и на запрос меняются только
+биты сплитов по признакам пользователя и времени: скоринг сводится
+к gather по таблице листьев и сумме.
+"""
+import os
+import json
+import logging
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier, Pool
+
+logger = logging.getLogger(__name__)
+
+
+def _sigmoid(raw: np.ndarray) -> np.ndarray:
+    return 1 / (1 + np.exp(-raw))
+
+
+class ObliviousTreeScorer:
+    """Оценщик с интерфейсом predict_proba поверх сконвертированной модели"""
+
+    def __init__(self, model: CatBoostClassifier):
+        self.model = model
+        self.feature_names = list(model.feature_names_)
+        self.cat_indices = list(model.get_cat_feature_indices())
+        self._probe_lock = threading.Lock()
+
+        model_json = self._export_json(model)
+        if "oblivious_trees" not in model_json:
+            raise ValueError("Only oblivious tree models are supported")
+        self._parse(model_json)
+
+    @staticmethod
+    def _export_json(model: CatBoostClassifier) -> Dict:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            model.save_model(path, format="json")
+            with open(path) as f:
+                return json.load(f)
+        finally:
+            os.remove(path)
+
+    def _parse(self, model_json: Dict):
+        info = model_json["features_info"]
+        float_features = info.get("float_features", [])
+        cat_features = info.get("categorical_features", [])
+        ctrs = info.get("ctrs", [])
+
+        # Бинарные признаки нумеруются так же, как split_index в CatBoost:
+        # пороги числовых признаков, затем one-hot значения, затем пороги CTR
+        binary_features = []
+        for feature in float_features:
+            for border in feature["borders"]:
+                binary_features.append(("float", feature["flat_feature_index"], border))
+        for feature in cat_features:
+            for _ in feature.get("values", []):
+                binary_features.append(("cat", feature["flat_feature_index"], None))
+        for ctr in ctrs:
+            elements = ctr["elements"]
+            if len(elements) != 1 or elements[0]["combination_element"] != "cat_feature_value":
+                raise ValueError("CTRs over feature combinations are not supported")
+            flat = cat_features[elements[0]["cat_feature_index"]]["flat_feature_index"]
+            for _ in ctr["borders"]:
+                binary_features.append(("cat", flat, None))
+
+        trees = model_json["oblivious_trees"]
+        self.depth = max(len(tree["splits"]) for tree in trees)
+        n_leaves = 2 ** self.depth
+        self.leaf_values = np.zeros((len(trees), n_leaves), dtype=np.float64)
+
+        # Сплиты: признак -> [(дерево, глубина, порог)]
+        self.float_splits: Dict[int, List[Tuple[int, int, float]]] = defaultdict(list)
+        self.cat_splits: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        self.tree_features: List[List[int]] = []
+
+        for t, tree in enumerate(trees):
+            values = tree["leaf_values"]
+            if len(values) != 2 ** len(tree["splits"]):
+                raise ValueError("Only single-dimensional leaf values are supported")
+            # Дерево меньшей глубины дополняется повторением листьев
+            self.leaf_values[t] = np.resize(values, n_leaves)
+
+            features = []
+            for d, split in enumerate(tree["splits"]):
+                kind, flat, border = binary_features[split["split_index"]]
+                if kind == "float":
+                    self.float_splits[flat].append((t, d, np.float32(border)))
+                else:
+                    self.cat_splits[flat].append((t, d))
+                features.append(flat)
+            self.tree_features.append(features)
+
+        scale, bias = model_json.get("scale_and_bias", [1.0, [0.0]])
+        self.scale = float(scale)
+        self.bias = float(bias[0] if isinstance(bias, list) else bias)
+
+        # Пробная строка и кэш битов категориальных сплитов по значениям
+        self._default_row = np.array(
+            ["0" if i in self.cat_indices else 0.0 for i in range(len(self.feature_names))],
+            dtype=object
+        )
+        self._cat_bits: Dict[int, Dict[Hashable, np.ndarray]] = defaultdict(dict)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.leaf_values)
+
+    def cat_split_bits(self, flat: int, values: Sequence) -> np.ndarray:
+        """
+        Биты сплитов по категориальному признаку для значений.
+
+        :return: Массив (len(values), len(cat_splits[flat])) из 0/1
+        """
+        cache = self._cat_bits[flat]
+        missing = [value for value in dict.fromkeys(values) if value not in cache]
+        if missing:
+            with self._probe_lock:
+                missing = [value for value in missing if value not in cache]
+                if missing:
+                    self._probe(flat, missing)
+        return np.array([cache[value] for value in values], dtype=np.uint8).reshape(
+            len(values), len(self.cat_splits[flat])
+        )
+
+    def _probe(self, flat: int, values: List):
+        """Получает биты сплитов для новых значений признака от самого CatBoost"""
+        rows = np.tile(self._default_row, (len(values), 1))
+        rows[:, flat] = values
+        leaves = self.model.calc_leaf_indexes(Pool(rows, cat_features=self.cat_indices))
+        for i, value in enumerate(values):
+            self._cat_bits[flat][value] = np.array(
+                [(leaves[i, t] >> d) & 1 for t, d in self.cat_splits[flat]], dtype=np.uint8
+            )
+
+    def leaf_indexes(self, X: np.ndarray, columns: Sequence[int] = None) -> np.ndarray:
+        """
+        Номера листьев (n, n_trees), собранные из сплитов по колонкам columns.
+
+        Сплиты по остальным признакам дают нулевые биты.
+        """
+        X = X.to_numpy(dtype=object) if isinstance(X, pd.DataFrame) else X
+        columns = range(X.shape[1]) if columns is None else columns
+        leaves = np.zeros((X.shape[0], self.n_trees), dtype=np.uint8)
+
+        for flat in columns:
+            if flat in self.float_splits:
+                values = X[:, flat].astype(np.float32)
+                for t, d, border in self.float_splits[flat]:
+                    leaves[:, t] |= (values > border).astype(np.uint8) << d
+            elif flat in self.cat_splits:
+                codes, uniques = pd.factorize(X[:, flat])
+                bits = self.cat_split_bits(flat, list(uniques))[codes]
+                for k, (t, d) in enumerate(self.cat_splits[flat]):
+                    leaves[:, t] |= bits[:, k] << d
+        return leaves
+
+    def raw_predict(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.leaf_indexes(X)
+        values = self.leaf_values[np.arange(self.n_trees), leaves]
+        return self.bias + self.scale * values.sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Вероятности классов (n, 2), как CatBoostClassifier.predict_proba"""
+        positive = _sigmoid(self.raw_predict(X))
+        return np.column_stack([1 - positive, positive])
+
+    def prepare_posts(self, post_matrix) -> "PreparedObliviousScorer":
+        """Предрасчёт постовой части для PostFeatureMatrix"""
+        return PreparedObliviousScorer(self, post_matrix)
+
+
+class PreparedObliviousScorer:
+    """
+    Скоринг всего каталога постов с предрасчитанными битами постов.
+
+    Деревья без сплитов по пользователю и времени дают постоянный
+    для поста вклад, который суммируется один раз. Для остальных деревьев
+    хранятся биты постовых сплитов, а на запрос по признакам пользователя
+    и времени строится таблица (дерево, биты постов) -> значение листа.
+    """
+
+    def __init__(self, scorer: ObliviousTreeScorer, post_matrix):
+        if list(post_matrix.features) != scorer.feature_names:
+            raise ValueError("Feature order of the post matrix differs from the model")
+
+        self.scorer = scorer
+        self.n_posts = post_matrix.n_posts
+        self.dynamic_columns = list(post_matrix.user_columns) + list(post_matrix.time_columns)
+        dynamic = set(self.dynamic_columns)
+        static_columns = [j for j in range(len(scorer.feature_names)) if j not in dynamic]
+
+        dynamic_trees = [
+            t for t, features in enumerate(scorer.tree_features) if dynamic & set(features)
+        ]
+        static_trees = [t for t in range(scorer.n_trees) if t not in set(dynamic_trees)]
+        self.dynamic_trees = np.array(dynamic_trees, dtype=np.int64)
+
+        post_leaves = scorer.leaf_indexes(post_matrix.template, static_columns)
+        self.static_scores = scorer.leaf_values[
+            static_trees, post_leaves[:, static_trees]
+        ].sum(axis=1)
+        self.post_bits = np.ascontiguousarray(post_leaves[:, dynamic_trees].T)
+        self._leaf_ids = np.arange(scorer.leaf_values.shape[1], dtype=np.uint8)
+
+        # Сплиты динамических признаков с номером дерева среди dynamic_trees
+        position = {t: k for k, t in enumerate(dynamic_trees)}
+        self._float_splits = {
+            flat: [(position[t], d, border) for t, d, border in scorer.float_splits[flat]]
+            for flat in self.dynamic_columns if flat in scorer.float_splits
+        }
+        self._cat_splits = {
+            flat: [(position[t], d) for t, d in scorer.cat_splits[flat]]
+            for flat in self.dynamic_columns if flat in scorer.cat_splits
+        }
+
+    def _dynamic_bits(self, values: Sequence) -> np.ndarray:
+        """Биты сплитов по пользователю и времени для динамических деревьев"""
+        bits = np.zeros(len(self.dynamic_trees), dtype=np.uint8)
+        for flat, value in zip(self.dynamic_columns, values):
+            if flat in self._float_splits:
+                value = np.float32(value)
+                for k, d, border in self._float_splits[flat]:
+                    if value > border:
+                        bits[k] |= 1 << d
+            elif flat in self._cat_splits:
+                value_bits = self.scorer.cat_split_bits(flat, [value])[0]
+                for (k, d), bit in zip(self._cat_splits[flat], value_bits):
+                    bits[k] |= bit << d
+        return bits
+
+    def leaf_tables(self, user_values: Sequence, time_values: Sequence) -> np.ndarray:
+        """
+        Значение листа каждого динамического дерева для каждого варианта
+        постовых битов при данных пользователе и времени.
+
+        :return: Массив (len(dynamic_trees), 2 ** depth)
+        """
+        dynamic_bits = self._dynamic_bits(tuple(user_values) + tuple(time_values))
+        return self.scorer.leaf_values[
+            self.dynamic_trees[:, None], self._leaf_ids[None, :] | dynamic_bits[:, None]
+        ]
+
+    def predict(self, user_values: Sequence, time_values: Sequence) -> np.ndarray:
+        """
+        Вероятности положительного класса для всех постов.
+
+        :param user_values: Значения в порядке USER_FEATURES
+        :param time_values: Значения в порядке TIME_FEATURES
+        """
+        tables = self.leaf_tables(user_values, time_values)
+        raw = self.static_scores.copy()
+        for k in range(len(self.dynamic_trees)):
+            raw += tables[k][self.post_bits[k]]
+        return _sigmoid(self.scorer.bias + self.scorer.scale * raw)
+
+    def predict_rows(self, tables: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        Вероятности для строк rows по таблицам leaf_tables.
+
+        Порядок сложения тот же, что в predict, поэтому значения
+        побитово совпадают с predict(...)[rows].
+        """
+        raw = self.static_scores[rows]
+        post_bits = self.post_bits[:, rows]
+        for k in range(len(self.dynamic_trees)):
+            raw += tables[k][post_bits[k]]
+        return _sigmoid(self.scorer.bias + self.scorer.scale * raw)
@@ -0,0 +1,375 @@
+"""
+Инкрементальное обновление фич постов в снапшоте.
+
+views и view_reach считаются один раз по всей истории просмотров (bootstrap),
+дальше поддерживаются по новым событиям view из feed_data через FeedTail:
+views - точный счётчик, view_reach - HyperLogLog-скетч уникальных
+зрителей на пост. Чтобы не вносить ошибку скетча во все посты,
+view_reach = точный охват на момент bootstrap + прирост оценки скетча,
+так что посты без новых зрителей сохраняют точное значение.
+
+TotalTfIdf, MaxTfIdf и MeanTfIdf пересчитываются из views и view_reach
+по формуле ноутбука (см. src.modeling.text_features). Новые посты из
+post_text_df лемматизируются и проходят через сохранённые TF-IDF, PCA
+и KMeans без переобучения. Снапшот публикуется только если в его
+метаданных записан sha256 того же файла --text-model, которым посчитаны
+кластеры таблицы (build_post_features --snapshot или snapshot --text-model):
+переобученная модель дала бы новым постам другую нумерацию кластеров.
+
+Обновлённая таблица post_features публикуется новой версией снапшота,
+остальные таблицы переносятся жёсткими ссылками. API подхватывает её
+при следующем обновлении снапшота (DATA_SNAPSHOT_PATH).
+
+    python -m src.utils.post_feature_updater --snapshot data/snapshot \\
+        --state data/processed/post_view_state.npz \\
+        --text-model models/text_features.joblib --interval 300
+"""
+import os
+import time
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from src.modeling.text_features import (
+    STAT_COLUMNS, TEXT_MODEL_CHECKSUM, TextFeatureModel, lemmatize, load_nlp,
+    view_stat_features
+)
+from src.utils.feed_tail import BATCH_SIZE, FeedTail
+from src.utils.hyperloglog import DEFAULT_PRECISION, HyperLogLogArray
+from src.utils.id_index import IdIndex
+from src.utils.snapshot import open_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_CHUNKSIZE = 1000000
+MAX_BATCHES_PER_POLL = 20
+
+
+class PostViewState:
+    """Счётчики просмотров и скетчи зрителей постов с водяным знаком feed_data"""
+
+    def __init__(self, post_ids: np.ndarray, views: np.ndarray,
+                 base_reach: np.ndarray, base_estimate: np.ndarray,
+                 sketches: HyperLogLogArray, cursor: Tuple[datetime, int, int]):
+        self.post_ids = post_ids
+        self.views = views
+        # Точный охват и оценка скетча на момент bootstrap
+        self.base_reach = base_reach
+        self.base_estimate = base_estimate
+        self.sketches = sketches
+        self.cursor = cursor
+        self.index = IdIndex(post_ids)
+
+    @classmethod
+    def bootstrap(cls, engine, feed_table: str,
+                  precision: int = DEFAULT_PRECISION,
+                  chunksize: int = BOOTSTRAP_CHUNKSIZE) -> "PostViewState":
+        """
+        Полный проход по просмотрам до последнего timestamp (не включая его).
+
+        События с последним timestamp дочитает FeedTail, поэтому они
+        не считаются дважды.
+        """
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            watermark = pd.read_sql(
+                f"SELECT MAX(timestamp) AS watermark FROM {feed_table} WHERE action='view'",
+                conn, parse_dates=["watermark"]
+            )['watermark'].iloc[0]
+        if pd.isna(watermark):
+            raise ValueError(f"No view events in {feed_table}")
+        watermark = watermark.to_pydatetime()
+        params = {"ts": watermark}
+        bound = sa.bindparam("ts", type_=sa.DateTime())
+
+        # Точный охват, как в ноутбуке, но с той же границей по времени
+        reach_query = sa.text(f"""
+            SELECT post_id, COUNT(*) AS views, COUNT(DISTINCT user_id) AS view_reach
+            FROM {feed_table}
+            WHERE action = 'view' AND timestamp < :ts
+            GROUP BY post_id
+        """).bindparams(bound)
+        with engine.connect() as conn:
+            totals = pd.read_sql(reach_query, conn, params=params)
+
+        post_ids = totals['post_id'].to_numpy(dtype=np.int64)
+        state = cls(
+            post_ids=post_ids,
+            views=totals['views'].to_numpy(dtype=np.int64),
+            base_reach=totals['view_reach'].to_numpy(dtype=np.int64),
+            base_estimate=np.zeros(len(post_ids)),
+            sketches=HyperLogLogArray(len(post_ids), precision),
+            cursor=(watermark, -1, -1)
+        )
+
+        events_query = sa.text(f"""
+            SELECT post_id, user_id FROM {feed_table}
+            WHERE action = 'view' AND timestamp < :ts
+        """).bindparams(bound)
+        events = 0
+        with engine.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(events_query, conn, params=params, chunksize=chunksize):
+                rows = state.index.lookup_many(chunk['post_id'].to_numpy())
+                state.sketches.add(rows, chunk['user_id'].to_numpy())
+                events += len(chunk)
+
+        state.base_estimate = state.sketches.estimate()
+        logger.info("Bootstrapped view state for %d posts from %d events in %.1fs",
+                    len(post_ids), events, time.perf_counter() - started)
+        return state
+
+    @property
+    def watermark(self) -> datetime:
+        return self.cursor[0]
+
+    def _rows(self, post_ids: np.ndarray) -> np.ndarray:
+        """Строки постов; для новых id состояние расширяется"""
+        rows = self.index.lookup_many(post_ids)
+        missing = rows < 0
+        if missing.any():
+            new_ids = np.unique(post_ids[missing])
+            n_new = len(new_ids)
+            self.post_ids = np.concatenate([self.post_ids, new_ids])
+            self.views = np.concatenate([self.views, np.zeros(n_new, dtype=np.int64)])
+            self.base_reach = np.concatenate([self.base_reach, np.zeros(n_new, dtype=np.int64)])
+            self.base_estimate = np.concatenate([self.base_estimate, np.zeros(n_new)])
+            self.sketches.grow(len(self.post_ids))
+            self.index = IdIndex(self.post_ids)
+            rows = self.index.lookup_many(post_ids)
+        return rows
+
+    def add_views(self, post_ids, user_ids):
+        """Учитывает пачку событий view"""
+        rows = self._rows(np.asarray(post_ids, dtype=np.int64))
+        self.views += np.bincount(rows, minlength=len(self.views))
+        self.sketches.add(rows, user_ids)
+
+    def view_reach(self) -> np.ndarray:
+        """Охват по строкам состояния: точная база + прирост оценки скетча"""
+        growth = np.maximum(self.sketches.estimate() - self.base_estimate, 0)
+        return self.base_reach + np.rint(growth).astype(np.int64)
+
+    def counts_for(self, post_ids) -> Tuple[np.ndarray, np.ndarray]:
+        """views и view_reach постов; 0 для постов без просмотров"""
+        rows = self.index.lookup_many(post_ids)
+        found = rows >= 0
+        views = np.zeros(len(rows), dtype=np.int64)
+        reach = np.zeros(len(rows), dtype=np.int64)
+        views[found] = self.views[rows[found]]
+        reach[found] = self.view_reach()[rows[found]]
+        return views, reach
+
+    def save(self, path: Union[str, Path]):
+        """Атомарно сохраняет состояние в .npz"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        ts, user_id, post_id = self.cursor
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, post_ids=self.post_ids, views=self.views,
+                base_reach=self.base_reach, base_estimate=self.base_estimate,
+                registers=self.sketches.registers,
+                precision=self.sketches.precision,
+                cursor_ts=ts.isoformat(), cursor_ids=np.array([user_id, post_id])
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "PostViewState":
+        with np.load(path) as data:
+            post_ids = data['post_ids']
+            user_id, post_id = data['cursor_ids'].tolist()
+            return cls(
+                post_ids=post_ids,
+                views=data['views'],
+                base_reach=data['base_reach'],
+                base_estimate=data['base_estimate'],
+                sketches=HyperLogLogArray(len(post_ids), int(data['precision']),
+                                          registers=data['registers']),
+                cursor=(datetime.fromisoformat(str(data['cursor_ts'])), user_id, post_id)
+            )
+
+
+class PostFeatureUpdater:
+    """Догрузка просмотров и новых постов с публикацией post_features в снапшот"""
+
+    def __init__(self, engine, state: PostViewState, text_model: TextFeatureModel,
+                 feed_table: str = "public.feed_data",
+                 posts_table: str = "public.post_text_df",
+                 nlp=None,
+                 batch_size: int = BATCH_SIZE,
+                 max_batches: int = MAX_BATCHES_PER_POLL):
+        self.engine = engine
+        self.state = state
+        self.text_model = text_model
+        self.posts_table = posts_table
+        self.nlp = nlp
+        self.max_batches = max_batches
+
+        # Bootstrap не включает события с водяным знаком, поэтому курсор
+        # продолжает ровно с места остановки и просмотры не задваиваются
+        self.tail = FeedTail(engine, feed_table, "view", state.watermark, batch_size)
+        self.tail.cursor = state.cursor
+
+        self.events = 0
+        self.new_posts = 0
+
+    def poll_views(self) -> int:
+        """
+        Учитывает новые события view пачками до max_batches штук.
+
+        :return: Число событий
+        """
+        events = 0
+        for batch in self.tail.batches(self.max_batches):
+            self.state.add_views(batch['post_id'].to_numpy(), batch['user_id'].to_numpy())
+            events += len(batch)
+        self.state.cursor = self.tail.cursor
+        self.events += events
+        if events:
+            logger.info("Counted %d new views up to %s", events, self.tail.watermark)
+        return events
+
+    def fetch_new_posts(self, last_post_id: int) -> pd.DataFrame:
+        """Посты post_text_df с id больше last_post_id"""
+        query = sa.text(f"""
+            SELECT post_id, text, topic FROM {self.posts_table}
+            WHERE post_id > :post_id
+            ORDER BY post_id
+        """)
+        with self.engine.connect() as conn:
+            return pd.read_sql(query, conn, params={"post_id": int(last_post_id)})
+
+    def post_rows(self, posts: pd.DataFrame) -> pd.DataFrame:
+        """Полные строки post_features для новых постов"""
+        views, view_reach = self.state.counts_for(posts['post_id'].to_numpy())
+        stats = view_stat_features(posts['post_id'].to_numpy(), views, view_reach)
+        if self.nlp is None:
+            self.nlp = load_nlp()
+        text_features = self.text_model.transform(lemmatize(posts['text'], self.nlp))
+
+        rows = posts[['post_id', 'text', 'topic']].reset_index(drop=True)
+        rows['views'] = views
+        rows['view_reach'] = view_reach
+        return pd.concat([rows, stats, text_features], axis=1)
+
+    def update_table(self, post_features: pd.DataFrame) -> pd.DataFrame:
+        """
+        Обновляет просмотры и статистики постов и добавляет новые посты.
+
+        Типы колонок исходной таблицы сохраняются.
+        """
+        post_ids = post_features['post_id'].to_numpy()
+        views, view_reach = self.state.counts_for(post_ids)
+        stats = view_stat_features(post_ids, views, view_reach)
+
+        updated = post_features.copy(deep=False)
+        updated['views'] = views
+        updated['view_reach'] = view_reach
+        for column in STAT_COLUMNS:
+            updated[column] = stats[column].to_numpy()
+
+        new_posts = self.fetch_new_posts(post_ids.max() if len(post_ids) else 0)
+        if not new_posts.empty:
+            new_rows = self.post_rows(new_posts)[list(post_features.columns)]
+            updated = pd.concat([updated, new_rows], ignore_index=True)
+            self.new_posts += len(new_rows)
+            logger.info("Added %d new posts up to post_id %d",
+                        len(new_rows), new_rows['post_id'].iloc[-1])
+
+        dtypes = {
+            column: dtype for column, dtype in post_features.dtypes.items()
+            if not isinstance(dtype, pd.CategoricalDtype) and dtype != object
+        }
+        return updated.astype(dtypes)
+
+    def check_text_model(self, metadata: Dict):
+        """
+        Проверяет, что кластеры таблицы посчитаны той же моделью текстов.
+
+        :raises ValueError: Снапшот не записал модель или она другая
+        """
+        recorded = metadata.get(TEXT_MODEL_CHECKSUM)
+        if recorded is None:
+            raise ValueError(
+                "Snapshot does not record the text model of its post features; "
+                "publish it with build_post_features --snapshot or snapshot --text-model"
+            )
+        if recorded != self.text_model.checksum:
+            raise ValueError(
+                f"Post features were built with text model {recorded[:12]}, "
+                f"--text-model is {str(self.text_model.checksum)[:12]}; new posts would "
+                "get a different cluster numbering"
+            )
+
+    def publish(self, snapshot_root: Union[str, Path], state_path: Union[str, Path],
+                keep: int = 3) -> Path:
+        """
+        Пишет новую версию снапшота с обновлённой post_features.
+
+        Состояние сохраняется до публикации: снапшот целиком выводится
+        из состояния, поэтому после сбоя следующая публикация его догонит.
+        """
+        snapshot = open_snapshot(snapshot_root)
+        self.check_text_model(snapshot.metadata)
+        updated = self.update_table(snapshot.table("post_features").to_frame())
+        self.state.save(state_path)
+
+        tables: Dict = dict(snapshot.tables)
+        tables["post_features"] = updated
+        metadata = dict(snapshot.metadata, view_watermark=self.state.watermark.isoformat())
+        return write_snapshot(snapshot_root, tables, keep=keep, metadata=metadata)
+
+    def stats(self) -> Dict:
+        return {
+            "view_watermark": self.state.watermark.isoformat(),
+            "events": self.events,
+            "new_posts": self.new_posts,
+            "posts": len(self.state.post_ids),
+            "sketch_bytes": self.state.sketches.nbytes
+        }
+
+
+def main():
+    from src.api.dependencies import get_db_url
+
+    parser = argparse.ArgumentParser(description="Incrementally update post features")
+    parser.add_argument("--snapshot", required=True, help="Snapshot root directory")
+    parser.add_argument("--state", required=True, help="View state .npz file")
+    parser.add_argument("--text-model", required=True, help="Saved TextFeatureModel")
+    parser.add_argument("--feed-table", default="public.feed_data")
+    parser.add_argument("--posts-table", default="public.post_text_df")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="HyperLogLog precision for bootstrap")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="Seconds between updates; 0 - single update")
+    parser.add_argument("--keep", type=int, default=3, help="Snapshot versions to keep")
+    args = parser.parse_args()
+
+    engine = sa.create_engine(get_db_url())
+    if os.path.exists(args.state):
+        state = PostViewState.load(args.state)
+    else:
+        state = PostViewState.bootstrap(engine, args.feed_table, args.precision)
+
+    updater = PostFeatureUpdater(engine, state, TextFeatureModel.load(args.text_model),
+                                 feed_table=args.feed_table, posts_table=args.posts_table)
+    while True:
+        updater.poll_views()
+        path = updater.publish(args.snapshot, args.state, keep=args.keep)
+        print(f"Snapshot written to {path}: {updater.stats()}")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
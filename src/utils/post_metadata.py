@@ -0,0 +1,75 @@
+import json
+import logging
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils.id_index import IdIndex
+from src.utils.post_payloads import PostPayloadStore
+
+logger = logging.getLogger(__name__)
+
+
+class PostMetadata(NamedTuple):
+    text: str
+    topic: str
+
+
+class PostMetadataStore:
+    """
+    Текст и тема постов для ответа API в компактном виде.
+
+    Собственной копии текстов нет: хранилище читает JSON-фрагменты
+    PostPayloadStore, из которых собирается ответ API, и декодирует
+    фрагмент только при обращении к посту. Так тексты лежат в памяти
+    один раз, а не в UTF-8 буфере и во фрагментах одновременно.
+    """
+
+    def __init__(self, payloads: PostPayloadStore):
+        self.payloads = payloads
+
+    @classmethod
+    def from_frame(cls, post_features: pd.DataFrame) -> "PostMetadataStore":
+        """Строит хранилище вместе с фрагментами из колонок post_id, text и topic"""
+        post_index = IdIndex(post_features['post_id'].to_numpy())
+        return cls(PostPayloadStore.from_frame(post_features, post_index))
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def positions(self, post_ids) -> np.ndarray:
+        """Строки постов во фрагментах; -1 для неизвестных id"""
+        return self.payloads.index.lookup_many(np.asarray(post_ids, dtype=np.int64))
+
+    def __contains__(self, post_id: int) -> bool:
+        return self.positions([post_id])[0] >= 0
+
+    def get(self, post_id: int) -> Optional[PostMetadata]:
+        """Текст и тема поста или None для неизвестного id"""
+        return self.get_many([post_id])[0]
+
+    def get_many(self, post_ids) -> List[Optional[PostMetadata]]:
+        """Текст и тема постов одним поиском по id; None для неизвестных"""
+        result = []
+        for row in self.positions(post_ids).tolist():
+            if row < 0:
+                result.append(None)
+                continue
+            post = json.loads(self.payloads.fragment(row))
+            result.append(PostMetadata(text=post["text"], topic=post["topic"]))
+        return result
+
+    def texts_for(self, post_ids) -> np.ndarray:
+        """Тексты постов массивом python-строк в порядке post_ids"""
+        result = np.empty(len(post_ids), dtype=object)
+        result[:] = [
+            metadata.text if metadata is not None else ""
+            for metadata in self.get_many(post_ids)
+        ]
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        """Память текстов и тем постов (фрагменты общие с PostPayloadStore)"""
+        return self.payloads.nbytes
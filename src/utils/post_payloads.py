@@ -0,0 +1,77 @@
+import json
+import logging
+from typing import Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.utils.id_index import IdIndex
+
+logger = logging.getLogger(__name__)
+
+EMPTY_LIST = b"[]"
+
+
+def encode_post(post_id: int, text: str, topic: str) -> bytes:
+    """
+    JSON объекта PostGet в том виде, в каком его отдаёт FastAPI.
+
+    JSONResponse сериализует с ensure_ascii=False и без пробелов,
+    поэтому ответ из фрагментов побайтово совпадает с прежним.
+    """
+    return json.dumps(
+        {"id": int(post_id), "text": text, "topic": topic},
+        ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class PostPayloadStore:
+    """
+    JSON-фрагменты {id, text, topic} всех постов, сериализованные один раз
+    при загрузке данных.
+
+    Фрагменты лежат подряд в одном буфере в порядке строк post_features,
+    ответ собирается конкатенацией фрагментов без создания PostGet
+    и повторной валидации. Это единственная копия текстов постов в
+    памяти: PostMetadataStore читает их из тех же фрагментов.
+    """
+
+    def __init__(self, post_index: IdIndex, fragments: Iterable[bytes]):
+        self.index = post_index
+        fragments = list(fragments)
+        self.offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(fragment) for fragment in fragments], out=self.offsets[1:])
+        self.data = b"".join(fragments)
+
+    @classmethod
+    def from_frame(cls, post_features: pd.DataFrame, post_index: IdIndex) -> "PostPayloadStore":
+        """Строит фрагменты из колонок post_id, text и topic"""
+        texts = post_features['text'].to_numpy(dtype=object)
+        topics = post_features['topic'].to_numpy(dtype=object)
+        fragments = (
+            encode_post(post_id, "" if pd.isna(text) else str(text),
+                        "" if pd.isna(topic) else str(topic))
+            for post_id, text, topic in zip(post_features['post_id'].to_numpy(), texts, topics)
+        )
+        return cls(post_index, fragments)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.nbytes
+
+    def fragment(self, row: int) -> bytes:
+        return self.data[self.offsets[row]:self.offsets[row + 1]]
+
+    def fragments(self, post_ids: Sequence[int]) -> List[bytes]:
+        """Фрагменты постов по id; неизвестные id пропускаются"""
+        rows = self.index.lookup_many(np.asarray(post_ids, dtype=np.int64))
+        return [self.fragment(row) for row in rows.tolist() if row >= 0]
+
+    def to_json(self, post_ids: Sequence[int]) -> bytes:
+        """JSON-массив постов в порядке post_ids"""
+        if len(post_ids) == 0:
+            return EMPTY_LIST
+        return b"[" + b",".join(self.fragments(post_ids)) + b"]"
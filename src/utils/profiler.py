@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профайлер стеков потоков процесса.
+
+    Фоновый поток раз в interval секунд снимает стеки всех потоков через
+    sys._current_frames() и считает одинаковые стеки. Результат выдаётся
+    в формате collapsed stacks (строка "корень;...;лист число"), который
+    принимают flamegraph.pl и speedscope. Код потоков не трассируется,
+    поэтому накладные расходы определяются только частотой сэмплов.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_prefix: Optional[str] = None):
+        self.interval = interval
+        # Если задан, сэмплируются только потоки с таким префиксом имени
+        self.thread_prefix = thread_prefix
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Останавливает сэмплирование и возвращает накопленные стеки"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.collapsed()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, str(thread_id))
+                if thread_id == own_id or (
+                    self.thread_prefix is not None and not name.startswith(self.thread_prefix)
+                ):
+                    continue
+                stacks.append(self._collapse(name, frame))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name.split("_")[0])
+        return ";".join(reversed(frames))
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed stacks по убыванию числа сэмплов"""
+        with self._lock:
+            items = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.is_running,
+            "interval_ms": self.interval * 1000,
+            "thread_prefix": self.thread_prefix,
+            "samples": self.samples,
+            "stacks": len(self._stacks),
+            "started_at": self.started_at,
+        }
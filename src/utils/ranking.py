@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Индексы k наибольших значений по убыванию за O(n).
+
+    При равенстве значений раньше идёт меньший индекс, как в
+    DataFrame.nlargest(keep='first'). Значения -inf (исключённые
+    посты) в результат не попадают.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < n:
+        partition = np.argpartition(-scores, k - 1)[:k]
+        threshold = scores[partition].min()
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    result = candidates[order]
+    return result[scores[result] > -np.inf]
+
+
+def exclude_sorted(candidates: np.ndarray, excluded: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Первые limit кандидатов, которых нет в excluded.
+
+    Кандидаты упорядочены по убыванию скора, excluded отсортирован.
+    Если кандидатов взято с запасом limit + len(excluded), результат
+    совпадает с top_k_indices по скорам с -inf у исключённых постов.
+    """
+    if len(excluded) == 0:
+        return candidates[:limit]
+    positions = np.minimum(np.searchsorted(excluded, candidates), len(excluded) - 1)
+    return candidates[excluded[positions] != candidates][:limit]
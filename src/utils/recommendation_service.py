@@ -1,62 +1,356 @@
+import numpy as np
 import pandas as pd
 import logging
+import threading
+import time
 from datetime import datetime
 from src.utils.data_loader import DataLoader
 from src.utils.feature_processor import FeatureProcessor
-from typing import List
+from src.utils.metrics import ServiceMetrics
+from src.utils.model_registry import ModelRegistry, Ranker
+from src.utils.post_payloads import EMPTY_LIST
+from src.utils.ranking import top_k_indices
+from src.utils.score_cache import ScoreCache
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 from src.api.schemas import PostGet
 
 logger = logging.getLogger(__name__)
 
+# Запрос рекомендаций в пакете: (user_id, request_time, limit)
+RecommendationRequest = Tuple[int, datetime, int]
+
+# Ключ скоров: (атрибуты пользователя, временные фичи)
+ScoreKey = Tuple[Tuple, Tuple]
+
 class RecommendationService:
-    def __init__(self, data_loader: DataLoader, model, feature_processor: FeatureProcessor):
+    def __init__(self, data_loader: DataLoader, model, feature_processor: FeatureProcessor,
+                 score_cache: Optional[ScoreCache] = None,
+                 answer_table=None,
+                 metrics: Optional[ServiceMetrics] = None,
+                 candidate_mode: Optional[str] = None,
+                 candidate_budget: int = 2000):
+        """
+        :param model: Модель или ModelRegistry, построенный над
+            prepare_posts(data_loader.post_features); для реестра режим
+            отбора кандидатов задаётся в нём самом
+        """
         self.data = data_loader
-        self.model = model
         self.features = feature_processor
+        self.score_cache = score_cache
+        self.answer_table = answer_table
+        # Задержки стадий и счётчики; без общего объекта ведутся локально
+        self.metrics = metrics if metrics is not None else ServiceMetrics()
+        # Постовая часть признаков строится один раз на снапшот данных
+        # и общая для всех моделей реестра
+        if isinstance(model, ModelRegistry):
+            self.models = model
+            self.post_matrix = model.post_matrix
+        else:
+            self.post_matrix = feature_processor.prepare_posts(data_loader.post_features)
+            self.models = ModelRegistry.from_model(model, self.post_matrix, candidate_mode)
+        self.post_ids = data_loader.post_features['post_id'].to_numpy()
+        # Отбор кандидатов по границам скора: "exact" - тот же топ, что
+        # полный скоринг, "approx" - не больше candidate_budget постов
+        self.candidate_budget = (candidate_budget if self.models.candidate_mode == "approx"
+                                 else None)
+        self._local = threading.local()
+        # Версии модели, для которых уже залогировано, что таблица ответов не подходит
+        self._stale_answers: Set[Tuple[str, int]] = set()
+
+    @property
+    def default_ranker(self) -> Ranker:
+        return self.models.get(self.models.default)
+
+    @property
+    def model(self):
+        """Модель по умолчанию"""
+        return self.default_ranker.model
+
+    @property
+    def post_scorer(self):
+        """Нативный оценщик модели по умолчанию с предрасчитанной постовой частью"""
+        return self.default_ranker.post_scorer
+
+    @property
+    def candidate_index(self):
+        return self.default_ranker.candidate_index
     
     def get_recommendations(self, user_id: int,
                             request_time: datetime,
                             limit: int = 5) -> List[PostGet]:
         """Генерирует персонализированные рекомендации постов"""
+        started = time.perf_counter()
         try:
-            # Проверка существования пользователя
-            if user_id not in self.data.user_features['user_id'].values:
-                return []
-            
-            # Получение данных
-            user_data = self.data.user_features[
-                self.data.user_features['user_id'] == user_id
-            ].iloc[0]
-            
-            # Подготовка признаков
-            features = self.features.prepare_features(
-                user_data, self.data.post_features, request_time
-            )
+            post_ids = self.recommend_post_ids(user_id, request_time, limit)
+            with self.metrics.span("serialize"):
+                return self.to_posts(post_ids)
+        
+        except Exception as e:
+            logger.error(f"Recommendation error: {str(e)}")
+            self.metrics.increment("empty_results", reason="error")
+            return []
+        
+        finally:
+            self.metrics.observe("request", time.perf_counter() - started)
+
+    def get_recommendations_json(self, user_id: int,
+                                 request_time: datetime,
+                                 limit: int = 5) -> bytes:
+        """Рекомендации готовым JSON-ответом List[PostGet] из предсериализованных постов"""
+        started = time.perf_counter()
+        try:
+            post_ids = self.recommend_post_ids(user_id, request_time, limit)
+            with self.metrics.span("serialize"):
+                return self.to_json(post_ids)
+        
+        except Exception as e:
+            logger.error(f"Recommendation error: {str(e)}")
+            self.metrics.increment("empty_results", reason="error")
+            return EMPTY_LIST
+        
+        finally:
+            self.metrics.observe("request", time.perf_counter() - started)
+
+    def recommend_post_ids(self, user_id: int,
+                           request_time: datetime,
+                           limit: int = 5) -> List[int]:
+        """id рекомендованных постов по убыванию скора"""
+        metrics = self.metrics
+        metrics.increment("requests")
+        
+        # Проверка существования и атрибуты пользователя за O(1)
+        with metrics.span("user_lookup"):
+            user_attributes = self.data.user_store.get(user_id)
+        if user_attributes is None:
+            metrics.increment("empty_results", reason="unknown_user")
+            return []
+        
+        ranker = self.models.ranker_for(user_attributes)
+        metrics.increment("model_requests", model=ranker.name)
+        
+        # Ответ из предрассчитанной таблицы, если запрос в неё попадает
+        # и в нём нет постов, лайкнутых после расчёта таблицы
+        if self.answer_table is not None and self._answers_for(ranker):
+            with metrics.span("answer_table"):
+                post_ids = self.answer_table.lookup(user_id, request_time, limit)
+                liked = self.data.like_index.liked_posts(user_id)
+                answered = post_ids is not None and not np.isin(post_ids, liked).any()
+            if answered:
+                return post_ids.tolist()
+        
+        with metrics.span("time_features"):
+            time_values = self.features.time_features(request_time)
+        key = (user_attributes, time_values)
+        if ranker.candidate_index is not None:
+            return self._candidate_post_ids(user_id, ranker, key, limit)
+        scores = self._score_keys(ranker, [key])[0]
+        return self._top_post_ids(user_id, scores, limit)
+
+    def _answers_for(self, ranker: Ranker) -> bool:
+        """Таблица ответов посчитана той же моделью (по sha256 файла), что и ranker"""
+        if ranker.checksum is not None and ranker.checksum == self.answer_table.model_checksum:
+            return True
+        # Модель по умолчанию заменена другим файлом: таблица больше не подходит
+        if ranker.name == self.models.default and ranker.key not in self._stale_answers:
+            self._stale_answers.add(ranker.key)
+            logger.warning("Answer table is not used for model %s v%d: built with checksum %s, "
+                           "model has %s", ranker.name, ranker.version,
+                           self.answer_table.model_checksum, ranker.checksum)
+        return False
+
+    def score_posts(self, user_attributes: Tuple, time_values: Tuple) -> np.ndarray:
+        """
+        Скоры всех постов для атрибутов пользователя и временных фич.
+
+        Результат может быть общим вектором из кэша и не должен изменяться.
+        """
+        return self.score_many([(user_attributes, time_values)])[0]
+
+    def score_many(self, keys: Sequence[ScoreKey]) -> List[np.ndarray]:
+        """
+        Скоры всех постов для нескольких ключей (атрибуты, временные фичи).
+
+        Каждый ключ скорится моделью своей exp_group; ключи одной модели
+        считаются вместе (см. _score_keys).
+        """
+        by_ranker: Dict[Ranker, List[ScoreKey]] = {}
+        for key in dict.fromkeys(keys):
+            by_ranker.setdefault(self.models.ranker_for(key[0]), []).append(key)
+        scores_by_key: Dict[ScoreKey, np.ndarray] = {}
+        for ranker, ranker_keys in by_ranker.items():
+            scores_by_key.update(zip(ranker_keys, self._score_keys(ranker, ranker_keys)))
+        return [scores_by_key[key] for key in keys]
+
+    def _score_keys(self, ranker: Ranker, keys: Sequence[ScoreKey]) -> List[np.ndarray]:
+        """
+        Скоры всех постов одной моделью для нескольких ключей.
+
+        Матрицы признаков ключей, которых нет в кэше, складываются в одну,
+        и CatBoost считает их одним predict_proba, используя многопоточность
+        по батчу. Нативный оценщик (post_scorer) считает каждый ключ
+        по предрасчитанным битам постов без матрицы признаков.
+        Повторяющиеся ключи считаются один раз. В ключе кэша - версия
+        модели, поэтому после замены модели старые скоры не используются.
+        """
+        scores_by_key: Dict[ScoreKey, np.ndarray] = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            cached = (self.score_cache.get((ranker.key, key))
+                      if self.score_cache is not None else None)
+            if cached is not None:
+                scores_by_key[key] = cached
+            else:
+                missing.append(key)
+        
+        if missing and ranker.post_scorer is not None:
+            for key in missing:
+                with self.metrics.span("predict", model=ranker.name):
+                    key_scores = ranker.post_scorer.predict(*key).astype(np.float32)
+                if self.score_cache is not None:
+                    key_scores = self.score_cache.put((ranker.key, key), key_scores)
+                scores_by_key[key] = key_scores
+        elif missing:
+            # Подготовка признаков: запись колонок пользователя и времени в буфер
+            with self.metrics.span("feature_fill", model=ranker.name):
+                if len(missing) == 1:
+                    features = self.post_matrix.fill(*missing[0])
+                else:
+                    features = self.post_matrix.fill_many(
+                        [user for user, _ in missing], [time for _, time in missing]
+                    )
             
             # Предсказание
-            features['pred_proba'] = self.model.predict_proba(features.values)[:, 1]
-            features['post_id'] = self.data.post_features['post_id']
+            with self.metrics.span("predict", model=ranker.name):
+                scores = ranker.model.predict_proba(features)[:, 1].astype(np.float32)
+            
+            n_posts = self.post_matrix.n_posts
+            for block, key in enumerate(missing):
+                block_scores = scores[block * n_posts:(block + 1) * n_posts]
+                if self.score_cache is not None:
+                    block_scores = self.score_cache.put((ranker.key, key), block_scores)
+                scores_by_key[key] = block_scores
+        
+        return [scores_by_key[key] for key in keys]
+
+    def recommend_post_ids_batch(
+        self, requests: Sequence[RecommendationRequest]
+    ) -> List[List[int]]:
+        """id рекомендованных постов для нескольких запросов одним вызовом модели"""
+        results: List[List[int]] = [[] for _ in requests]
+        self.metrics.increment("requests", len(requests))
+        keys = {}
+        try:
+            for i, (user_id, request_time, limit) in enumerate(requests):
+                user_attributes = self.data.user_store.get(user_id)
+                if user_attributes is not None:
+                    keys[i] = (user_attributes, self.features.time_features(request_time))
+            if len(keys) < len(requests):
+                self.metrics.increment("empty_results", len(requests) - len(keys),
+                                       reason="unknown_user")
             
-            # Фильтрация лайкнутых постов
-            user_likes = self.data.liked_posts[
-                self.data.liked_posts['user_id'] == user_id
-                ]['post_id']
-            new_posts = features[~features['post_id'].isin(user_likes)]
-
-            # Выбор топ-N постов
-            top_posts = new_posts.nlargest(limit, 'pred_proba')['post_id'].tolist()
+            # Запросы по моделям: с отбором кандидатов - по одному,
+            # остальные - одним скорингом на модель
+            by_ranker: Dict[Ranker, List[int]] = {}
+            for i, (user_attributes, _) in keys.items():
+                ranker = self.models.ranker_for(user_attributes)
+                self.metrics.increment("model_requests", model=ranker.name)
+                by_ranker.setdefault(ranker, []).append(i)
             
-            # Формирование результата
-            return [
-                PostGet(
-                    id=post_id,
-                    text=self.data.post_details[post_id]['text'],
-                    topic=self.data.post_details[post_id]['topic']
-                )
-                for post_id in top_posts
-                if post_id in self.data.post_details
-            ]
+            for ranker, indices in by_ranker.items():
+                if ranker.candidate_index is not None:
+                    for i in indices:
+                        user_id, _, limit = requests[i]
+                        results[i] = self._candidate_post_ids(user_id, ranker, keys[i], limit)
+                    continue
+                scores = self._score_keys(ranker, [keys[i] for i in indices])
+                for i, user_scores in zip(indices, scores):
+                    user_id, _, limit = requests[i]
+                    results[i] = self._top_post_ids(user_id, user_scores, limit)
+            return results
         
         except Exception as e:
-            logger.error(f"Recommendation error: {str(e)}")
-            return []
\ No newline at end of file
+            logger.error(f"Batch recommendation error: {str(e)}")
+            self.metrics.increment("empty_results", sum(not results[i] for i in keys),
+                                   reason="error")
+            return results
+
+    def get_recommendations_batch(
+        self, requests: Sequence[RecommendationRequest]
+    ) -> List[List[PostGet]]:
+        """Генерирует рекомендации для нескольких запросов одним вызовом модели"""
+        return [self.to_posts(post_ids) for post_ids in self.recommend_post_ids_batch(requests)]
+
+    def get_recommendations_batch_json(
+        self, requests: Sequence[RecommendationRequest]
+    ) -> bytes:
+        """Пакетные рекомендации готовым JSON-ответом List[List[PostGet]]"""
+        return b"[" + b",".join(
+            self.to_json(post_ids) for post_ids in self.recommend_post_ids_batch(requests)
+        ) + b"]"
+
+    def _scores_buffer(self) -> np.ndarray:
+        """Переиспользуемый буфер потока для скоров с исключенными лайками"""
+        buffer = getattr(self._local, 'scores', None)
+        if buffer is None:
+            buffer = np.empty(len(self.post_ids), dtype=np.float32)
+            self._local.scores = buffer
+        return buffer
+
+    def _top_post_ids(self, user_id: int, scores: np.ndarray, limit: int) -> List[int]:
+        """Исключает лайкнутые посты и выбирает топ-N"""
+        started = time.perf_counter()
+        # Скоры могут быть общими из кэша, поэтому исключение идёт в копии
+        buffer = self._scores_buffer()
+        np.copyto(buffer, scores)
+        
+        # Исключение лайкнутых постов: срез CSR-индекса и scatter в скоры
+        liked_rows = self.data.post_index.lookup_many(
+            self.data.like_index.liked_posts(user_id)
+        )
+        buffer[liked_rows[liked_rows >= 0]] = -np.inf
+
+        # Выбор топ-N постов
+        top_rows = top_k_indices(buffer, limit)
+        post_ids = self.post_ids[top_rows].tolist()
+        self.metrics.observe("exclude_top_n", time.perf_counter() - started)
+        return post_ids
+
+    def _candidate_post_ids(self, user_id: int, ranker: Ranker, key: ScoreKey,
+                            limit: int) -> List[int]:
+        """
+        Топ-N через отбор кандидатов: скорятся только блоки постов,
+        граница скора которых может дать место в топе.
+        
+        Готовый вектор из кэша скоров используется как есть; частичные
+        скоры в кэш не попадают. Если топ - заметная часть каталога, отбор
+        не окупается и скорятся все посты.
+        """
+        scores = (self.score_cache.get((ranker.key, key))
+                  if self.score_cache is not None else None)
+        if scores is None and 2 * limit >= len(self.post_ids):
+            scores = self._score_keys(ranker, [key])[0]
+        if scores is not None:
+            return self._top_post_ids(user_id, scores, limit)
+        
+        with self.metrics.span("candidates", model=ranker.name):
+            liked_rows = self.data.post_index.lookup_many(
+                self.data.like_index.liked_posts(user_id)
+            )
+            excluded = np.unique(liked_rows[liked_rows >= 0]).astype(np.int64)
+            tables = ranker.post_scorer.leaf_tables(*key)
+            rows, scored = ranker.candidate_index.top_k(tables, limit, excluded,
+                                                        self.candidate_budget)
+        self.metrics.increment("candidates_scored", scored)
+        return self.post_ids[rows].tolist()
+
+    def to_json(self, post_ids: List[int]) -> bytes:
+        """JSON-массив постов из фрагментов, сериализованных при загрузке"""
+        return self.data.post_payloads.to_json(post_ids)
+
+    def to_posts(self, post_ids: List[int]) -> List[PostGet]:
+        """Формирование результата"""
+        return [
+            PostGet(id=post_id, text=metadata.text, topic=metadata.topic)
+            for post_id, metadata in zip(post_ids, self.data.post_metadata.get_many(post_ids))
+            if metadata is not None
+        ]
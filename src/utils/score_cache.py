@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+
+class ScoreCache:
+    """
+    LRU-кэш векторов скоров постов с ограничением по памяти.
+
+    Модель видит пользователя только через атрибуты (country, gender, age,
+    city, exp_group), а запрос - через временные фичи, поэтому ключ
+    (атрибуты, временные фичи) однозначно определяет скоры всех постов.
+    Векторы хранятся в float32 и доступны только на чтение.
+    """
+
+    def __init__(self, max_bytes: int = 128 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            scores = self._entries.get(key)
+            if scores is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return scores
+
+    def put(self, key: Hashable, scores: np.ndarray) -> np.ndarray:
+        """Сохраняет вектор скоров и возвращает сохранённую read-only копию"""
+        scores = np.array(scores, dtype=np.float32)
+        scores.flags.writeable = False
+        if scores.nbytes > self.max_bytes:
+            return scores
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self._entries[key] = scores
+            self.nbytes += scores.nbytes
+
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+        return scores
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4)
+        }
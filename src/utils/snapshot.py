@@ -0,0 +1,303 @@
+"""
+Версионированный колоночный снапшот таблиц DataLoader на диске.
+
+Каждая таблица хранится по колонкам:
+    - числовые колонки - .npy фиксированной ширины;
+    - категориальные - коды (.npy) и словарь категорий в manifest.json;
+    - текстовые - один UTF-8 буфер и массив смещений (n + 1).
+
+Файлы открываются только на чтение через mmap, поэтому холодный старт
+сводится к открытию файлов, а несколько воркеров uvicorn делят одну
+физическую копию данных через page cache.
+
+Структура каталога:
+    <root>/CURRENT                    - имя активной версии
+    <root>/<version>/manifest.json
+    <root>/<version>/<table>/<i>.npy  - колонки таблицы
+"""
+import os
+import json
+import shutil
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+# Доля уникальных значений, до которой object-колонка кодируется словарём
+CATEGORICAL_THRESHOLD = 0.5
+
+
+class TextColumn:
+    """Текстовая колонка поверх UTF-8 буфера и массива смещений"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.get_bytes(index).decode("utf-8")
+
+    def get_bytes(self, index: int) -> bytes:
+        """Возвращает текст строки в виде UTF-8 байтов без декодирования"""
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def to_numpy(self) -> np.ndarray:
+        """Материализует колонку в массив python-строк"""
+        result = np.empty(len(self), dtype=object)
+        for i in range(len(self)):
+            result[i] = self[i]
+        return result
+
+
+class SnapshotTable:
+    """Таблица снапшота с доступом к колонкам без копирования"""
+
+    def __init__(self, path: Path, meta: Dict):
+        self.path = path
+        self.meta = meta
+        self.name = meta["name"]
+        self.n_rows = meta["n_rows"]
+        self._columns = {column["name"]: column for column in meta["columns"]}
+        self.columns = [column["name"] for column in meta["columns"]]
+
+    def column(self, name: str) -> Union[np.ndarray, pd.Categorical, TextColumn]:
+        """Возвращает колонку: mmap-массив, Categorical или TextColumn"""
+        meta = self._columns[name]
+        base = self.path / meta["file"]
+
+        if meta["kind"] == "numeric":
+            return np.load(f"{base}.npy", mmap_mode="r")
+        if meta["kind"] == "categorical":
+            codes = np.load(f"{base}.npy", mmap_mode="r")
+            return pd.Categorical.from_codes(codes, categories=meta["categories"])
+        if meta["kind"] == "text":
+            offsets = np.load(f"{base}.offsets.npy", mmap_mode="r")
+            if offsets[-1] == 0:
+                # mmap пустого файла невозможен
+                return TextColumn(offsets, np.empty(0, dtype=np.uint8))
+            data = np.memmap(f"{base}.data.bin", dtype=np.uint8, mode="r")
+            return TextColumn(offsets, data)
+
+        raise ValueError(f"Unknown column kind: {meta['kind']}")
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Собирает DataFrame из колонок снапшота.
+
+        Числовые колонки и коды категорий остаются mmap-массивами только на
+        чтение, текстовые колонки материализуются в python-строки.
+        """
+        data = {}
+        for name in self.columns:
+            column = self.column(name)
+            data[name] = column.to_numpy() if isinstance(column, TextColumn) else column
+        return pd.DataFrame(data, copy=False)
+
+
+class Snapshot:
+    """Открытая версия снапшота"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot format version: {self.manifest['format_version']}"
+            )
+
+        self.version = self.path.name
+        self.created_at = self.manifest["created_at"]
+        self.metadata = self.manifest.get("metadata", {})
+        self.tables = {
+            name: SnapshotTable(self.path / name, meta)
+            for name, meta in self.manifest["tables"].items()
+        }
+
+    def table(self, name: str) -> SnapshotTable:
+        return self.tables[name]
+
+
+def _codes_dtype(n_categories: int) -> np.dtype:
+    """Тип кодов, который выбирает pandas, чтобы from_codes не копировал их"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _write_column(series: pd.Series, base: Path) -> Dict:
+    """Пишет одну колонку и возвращает её описание для манифеста"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categorical = series.cat
+    elif series.dtype == object:
+        n_unique = series.nunique(dropna=False)
+        if len(series) and n_unique / len(series) > CATEGORICAL_THRESHOLD:
+            return _write_text_column(series, base)
+        categorical = series.astype("category").cat
+    else:
+        np.save(f"{base}.npy", np.ascontiguousarray(series.to_numpy()))
+        return {"kind": "numeric", "dtype": series.dtype.str}
+
+    categories = categorical.categories.tolist()
+    codes = categorical.codes.to_numpy().astype(_codes_dtype(len(categories)))
+    np.save(f"{base}.npy", codes)
+    return {"kind": "categorical", "categories": categories}
+
+
+def _write_text_column(series: pd.Series, base: Path) -> Dict:
+    """Пишет текстовую колонку как UTF-8 буфер и смещения; None - пустая строка"""
+    offsets = np.zeros(len(series) + 1, dtype=np.int64)
+    with open(f"{base}.data.bin", "wb") as f:
+        for i, value in enumerate(series):
+            encoded = b"" if pd.isna(value) else str(value).encode("utf-8")
+            f.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+    np.save(f"{base}.offsets.npy", offsets)
+    return {"kind": "text"}
+
+
+def write_table(df: pd.DataFrame, path: Path, name: str) -> Dict:
+    """Пишет таблицу по колонкам в path и возвращает её описание для манифеста"""
+    path.mkdir(parents=True)
+    columns = []
+    for i, column_name in enumerate(df.columns):
+        file_name = f"{i:03d}"
+        meta = _write_column(df[column_name], path / file_name)
+        meta.update(name=column_name, file=file_name)
+        columns.append(meta)
+    return {"name": name, "n_rows": len(df), "columns": columns}
+
+
+def _link_table(table: SnapshotTable, path: Path, name: str) -> Dict:
+    """
+    Переносит неизменённую таблицу из другой версии жёсткими ссылками.
+
+    Файлы версий никогда не изменяются на месте, поэтому общие inode
+    безопасны; между файловыми системами файлы копируются.
+    """
+    path.mkdir(parents=True)
+    for source in table.path.iterdir():
+        try:
+            os.link(source, path / source.name)
+        except OSError:
+            shutil.copy2(source, path / source.name)
+    return dict(table.meta, name=name)
+
+
+def write_snapshot(root: Union[str, Path],
+                   tables: Dict[str, Union[pd.DataFrame, SnapshotTable]],
+                   keep: int = 3, metadata: Optional[Dict] = None) -> Path:
+    """
+    Пишет новую версию снапшота и атомарно делает её активной.
+
+    :param root: Каталог со всеми версиями снапшота
+    :param tables: Таблицы по именам; SnapshotTable из предыдущей версии
+        не перезаписывается, а переносится жёсткими ссылками
+    :param keep: Сколько последних версий оставлять на диске
+    :param metadata: Дополнительные JSON-сериализуемые поля манифеста
+    :return: Путь к записанной версии
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    tmp_path = root / f".tmp-{version}"
+    final_path = root / version
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "metadata": metadata or {},
+        "tables": {}
+    }
+    try:
+        tmp_path.mkdir()
+        for name, table in tables.items():
+            if isinstance(table, SnapshotTable):
+                manifest["tables"][name] = _link_table(table, tmp_path / name, name)
+            else:
+                manifest["tables"][name] = write_table(table, tmp_path / name, name)
+
+        with open(tmp_path / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        tmp_path.rename(final_path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    # Переключение на новую версию атомарно за счёт os.replace
+    current_tmp = root / f"{CURRENT_FILE}.tmp"
+    current_tmp.write_text(version)
+    os.replace(current_tmp, root / CURRENT_FILE)
+
+    logger.info("Snapshot %s written to %s", version, root)
+    _prune_versions(root, keep)
+    return final_path
+
+
+def _list_versions(root: Path) -> List[Path]:
+    return sorted(
+        path for path in root.iterdir()
+        if path.is_dir() and (path / MANIFEST_FILE).exists()
+    )
+
+
+def _prune_versions(root: Path, keep: int):
+    """Удаляет старые версии; уже открытые через mmap файлы остаются доступны"""
+    for path in _list_versions(root)[:-keep]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def open_snapshot(root: Union[str, Path]) -> Snapshot:
+    """Открывает активную версию снапшота (по файлу CURRENT)"""
+    root = Path(root)
+    current = root / CURRENT_FILE
+    if not current.exists():
+        raise FileNotFoundError(f"No snapshot found in {root}")
+    return Snapshot(root / current.read_text().strip())
+
+
+def main():
+    """Выгружает таблицы из БД в новую версию снапшота"""
+    from src.api.dependencies import get_db_url
+    from src.utils.data_loader import DataLoader
+
+    parser = argparse.ArgumentParser(description="Build a DataLoader snapshot")
+    parser.add_argument("--out", required=True, help="Snapshot root directory")
+    parser.add_argument("--keep", type=int, default=3, help="Versions to keep")
+    parser.add_argument("--text-model",
+                        help="TextFeatureModel the post features table was built with; "
+                             "its checksum lets post_feature_updater add new posts")
+    args = parser.parse_args()
+
+    # Таблицы всегда читаются из БД, даже если задан DATA_SNAPSHOT_PATH,
+    # а таблица событий - та же, что у API
+    loader = DataLoader(get_db_url(), feed_table=os.getenv("FEED_TABLE", "public.feed_data"))
+    loader.load_features()
+    metadata = {}
+    if args.text_model:
+        from src.modeling.text_features import TEXT_MODEL_CHECKSUM, file_checksum
+        metadata[TEXT_MODEL_CHECKSUM] = file_checksum(args.text_model)
+    path = loader.save_snapshot(args.out, keep=args.keep, metadata=metadata)
+    print(f"Snapshot written to {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
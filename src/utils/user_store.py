@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+from src.utils.id_index import IdIndex
+
+# Атрибуты пользователя, которые видит модель, в порядке FeatureProcessor
+USER_ATTRIBUTES = ('country', 'gender', 'age', 'city', 'exp_group')
+
+
+class UserFeatureStore:
+    """
+    Атрибуты пользователей в типизированных массивах-колонках.
+
+    Проверка существования и получение атрибутов выполняются за O(1)
+    через IdIndex и не создают объектов pandas на горячем пути.
+    Строковые атрибуты хранятся кодами и словарём значений.
+    """
+
+    def __init__(self, user_features: pd.DataFrame):
+        self.index = IdIndex(user_features['user_id'].to_numpy())
+        self._codes = {}
+        self._values = {}
+        for name in USER_ATTRIBUTES:
+            self._add_column(name, user_features[name])
+
+    def _add_column(self, name: str, column: pd.Series):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            self._codes[name] = column.cat.codes.to_numpy()
+            self._values[name] = np.asarray(column.cat.categories, dtype=object)
+        elif column.dtype == object:
+            codes, uniques = pd.factorize(column)
+            self._codes[name] = codes.astype(np.int32)
+            self._values[name] = np.asarray(uniques, dtype=object)
+        else:
+            self._codes[name] = None
+            self._values[name] = column.to_numpy()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.index.lookup(user_id) >= 0
+
+    def row(self, user_id: int) -> int:
+        """Номер строки пользователя или -1"""
+        return self.index.lookup(user_id)
+
+    def column(self, name: str) -> np.ndarray:
+        """Значения атрибута по всем пользователям"""
+        codes = self._codes[name]
+        if codes is None:
+            return self._values[name]
+        return self._values[name][codes]
+
+    def attributes(self, row: int) -> Tuple:
+        """Кортеж атрибутов пользователя в порядке USER_ATTRIBUTES"""
+        result = []
+        for name in USER_ATTRIBUTES:
+            codes = self._codes[name]
+            if codes is None:
+                result.append(self._values[name][row].item())
+            else:
+                code = codes[row]
+                result.append(self._values[name][code] if code >= 0 else None)
+        return tuple(result)
+
+    def get(self, user_id: int) -> Optional[Tuple]:
+        """Атрибуты пользователя по id или None"""
+        row = self.index.lookup(user_id)
+        if row < 0:
+            return None
+        return self.attributes(row)
+
+    @property
+    def nbytes(self) -> int:
+        total = self.index.nbytes
+        for name in USER_ATTRIBUTES:
+            codes = self._codes[name]
+            total += self._values[name].nbytes if codes is None else codes.nbytes
+        return total
@@ -0,0 +1,84 @@
+"""
+Потоковая загрузка таблиц с NULL в целых колонках и дата-временем
+с часовым поясом: колонки должны оставаться понятными UserFeatureStore,
+матрице признаков и снапшоту.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+import src.utils.data_loader as data_loader_module
+from benchmarks.synthetic import make_likes, make_post_features, make_user_features
+from config.constants import MODELS_DIR
+from src.utils.bulk_loader import ColumnarTableBuilder
+from src.utils.data_loader import DataLoader
+from src.utils.feature_processor import FeatureProcessor
+from src.utils.model_loader import load_model
+from src.utils.recommendation_service import RecommendationService
+
+MODEL_PATH = MODELS_DIR / "catboost_min_features.cbm"
+NULL_AGE_ROW = 7
+
+
+@pytest.fixture
+def loader(tmp_path, monkeypatch):
+    """DataLoader поверх SQLite; age пользователя в строке 7 - NULL, чанки по 4 строки"""
+    posts = make_post_features(40, mean_words=5)
+    users = make_user_features(20)
+    users['age'] = users['age'].astype(object)
+    users.loc[NULL_AGE_ROW, 'age'] = None
+    likes = make_likes(users, posts, n_likes=100)
+
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    posts.to_sql("posts", engine, index=False)
+    users.to_sql("users", engine, index=False)
+    likes.assign(action="like", timestamp=datetime(2021, 10, 1)).to_sql(
+        "feed_data", engine, index=False
+    )
+
+    monkeypatch.setattr(data_loader_module, "CHUNKSIZE", 4)
+    loader = DataLoader(str(engine.url), post_features_table="posts",
+                        user_features_table="users", feed_table="feed_data")
+    loader.load_features()
+    return loader
+
+
+def test_null_in_later_chunk_loads_as_float(loader):
+    ages = loader.user_features['age']
+    assert ages.dtype == np.float64
+    assert np.isnan(ages[NULL_AGE_ROW])
+    assert ages.notna().sum() == len(ages) - 1
+
+
+def test_null_in_later_chunk_serves_requests(loader):
+    service = RecommendationService(loader, load_model(str(MODEL_PATH), "catboost"),
+                                    FeatureProcessor())
+    request_time = datetime(2021, 12, 1, 12)
+    for user_id in loader.user_features['user_id'].iloc[[0, NULL_AGE_ROW]].tolist():
+        assert len(service.recommend_post_ids(user_id, request_time, 5)) == 5
+
+
+def test_null_in_later_chunk_survives_snapshot(loader, tmp_path):
+    loader.save_snapshot(tmp_path / "snapshots")
+    restored = DataLoader("sqlite://")
+    restored.load_snapshot(tmp_path / "snapshots")
+    pd.testing.assert_series_equal(restored.user_features['age'], loader.user_features['age'])
+
+
+def test_tz_aware_chunks_are_stored_as_naive_utc():
+    builder = ColumnarTableBuilder()
+    builder.append(pd.DataFrame(
+        {"ts": pd.to_datetime(["2021-01-01 10:00"]).tz_localize("Europe/Moscow")}
+    ))
+    builder.append(pd.DataFrame({"ts": [None]}))
+    builder.append(pd.DataFrame(
+        {"ts": pd.to_datetime(["2021-01-02 10:00"]).tz_localize("UTC")}
+    ))
+    ts = builder.to_frame()['ts']
+    assert ts.dtype == np.dtype("datetime64[ns]")
+    assert ts.tolist()[0] == pd.Timestamp("2021-01-01 07:00")
+    assert pd.isna(ts[1])
+    assert ts[2] == pd.Timestamp("2021-01-02 10:00")
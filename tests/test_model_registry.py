@@ -0,0 +1,17 @@
+"""Маршрутизация запросов по exp_group в ModelRegistry"""
+import numpy as np
+import pytest
+
+from src.utils.model_registry import ModelRegistry
+
+
+@pytest.mark.parametrize("exp_group", [1, 1.0, np.float64(1.0), np.int32(1), "1"])
+def test_integral_groups_match_routes(exp_group):
+    registry = ModelRegistry(None, {"default": None, "b": None}, routes={"1": "b"})
+    assert registry.route(exp_group) == "b"
+
+
+@pytest.mark.parametrize("exp_group", [1.5, float("nan"), None, 3])
+def test_other_groups_use_default(exp_group):
+    registry = ModelRegistry(None, {"default": None, "b": None}, routes={"1.0": "b"})
+    assert registry.route(exp_group) == "default"